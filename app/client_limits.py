@@ -0,0 +1,83 @@
+import hashlib
+import ipaddress
+import math
+import time
+
+from app import metrics
+from app.config import (
+    API_KEYS,
+    INBOUND_API_KEY_LIMIT,
+    INBOUND_LIMIT,
+    INBOUND_MAX_CLIENTS,
+    INBOUND_WINDOW,
+    TRUSTED_PROXIES,
+)
+from app.services.cache import create_cache
+
+# Per-client admission for the weather routes. Each client has one counter
+# per fixed INBOUND_WINDOW in the shared cache; the sliding count is the
+# current window plus the previous one weighted by how much of it still
+# overlaps, which tracks a true sliding window closely with two keys per
+# client. Rejected requests count too, so a client that keeps hammering
+# stays limited.
+
+INBOUND_REJECTED = metrics.Counter("weather_inbound_rejected_total", "Requests rejected by the per-client rate limit")
+
+_trusted = tuple(ipaddress.ip_network(proxy, strict=False) for proxy in TRUSTED_PROXIES)
+_counters = create_cache("inbound", maxsize=2 * INBOUND_MAX_CLIENTS, ttl=2 * INBOUND_WINDOW)
+
+
+def _is_trusted(address):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _trusted)
+
+
+def client_address(remote_addr, forwarded_for=None):
+    # Walks X-Forwarded-For from the nearest hop back while the hops are
+    # trusted proxies; the first address they didn't vouch for is the
+    # client. Headers from untrusted peers are ignored, they could be forged.
+    address = remote_addr
+    if forwarded_for and _is_trusted(remote_addr):
+        for hop in reversed([hop.strip() for hop in forwarded_for.split(",") if hop.strip()]):
+            address = hop
+            if not _is_trusted(hop):
+                break
+    return address
+
+
+def identify(remote_addr, api_key=None, forwarded_for=None):
+    # Returns (client id, request limit). Unknown API keys are ignored so
+    # they can't be used to dodge the per-address limit.
+    if api_key and api_key in API_KEYS:
+        return f"key:{hashlib.sha1(api_key.encode()).hexdigest()[:16]}", INBOUND_API_KEY_LIMIT
+    return f"ip:{client_address(remote_addr, forwarded_for)}", INBOUND_LIMIT
+
+
+def check(client, limit, now=None):
+    # Counts one request; returns 0 if it is allowed, otherwise the seconds
+    # the client should wait (for Retry-After)
+    if limit <= 0:
+        return 0
+    now = time.time() if now is None else now
+    window = int(now // INBOUND_WINDOW)
+    elapsed = now - window * INBOUND_WINDOW
+    current = _counters.incr(f"{client}:{window}", ttl=2 * INBOUND_WINDOW)
+    previous = _counters.get(f"{client}:{window - 1}", 0)
+    overlap = 1 - elapsed / INBOUND_WINDOW
+    if previous * overlap + current <= limit:
+        return 0
+
+    INBOUND_REJECTED.inc()
+    if current <= limit and previous:
+        # Allowed again once enough of the previous window has slid out
+        wait = (previous * overlap + current - limit) * INBOUND_WINDOW / previous
+    else:
+        wait = INBOUND_WINDOW - elapsed
+    return max(1, math.ceil(wait))
+
+
+def clear():
+    _counters.clear()
@@ -1,45 +1,236 @@
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueListener, RotatingFileHandler
+from dotenv import load_dotenv
+from app.logging_utils import ContextQueueHandler, JsonFormatter, RequestContextFilter, SamplingFilter
 
-def setup_logging():
-      # Get the project's root directory
-    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Settings below are read at import time, so pick up .env before that
+load_dotenv()
 
-    # Define the logs directory path at the root level
-    logs_dir = os.path.join(project_root, 'logs')
 
-    # Create the logs directory if it doesn't exist
-    os.makedirs(logs_dir, exist_ok=True)
-    
-    # Defines log file path
-    log_file = os.path.join(logs_dir, 'weather_app.log')
-    
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cache backend shared by the geocoding and forecast caches: "memory" is
+# per process, "sqlite" is a file every worker on the host shares and
+# "redis" talks to a Redis-compatible server (install requirements-redis.txt).
+# The upstream rate limit bucket and the prefetcher's leader election follow
+# it: per host with sqlite, across hosts with redis.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_PATH = os.getenv("CACHE_PATH", os.path.join(PROJECT_ROOT, "cache", "weather_cache.db"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+# How those caches store values: "binary" (MessagePack when installed) or
+# "json", the format used before codecs existed
+CACHE_CODEC = os.getenv("CACHE_CODEC", "binary")
+# The SQLite backend records a hit's access time only when the stored one is
+# at least this old, so most reads stay reads; LRU order is kept to within
+# this many seconds
+CACHE_TOUCH_INTERVAL = _env_float("CACHE_TOUCH_INTERVAL", 30)
+
+# Upstream endpoints, overridable to point at a local stand-in
+GEO_API_URL = os.getenv("GEO_API_URL", "https://geocoding-api.open-meteo.com/v1/search")
+FORECAST_API_URL = os.getenv("FORECAST_API_URL", "https://api.open-meteo.com/v1/forecast")
+
+# Upstream HTTP: one pooled keep-alive session per process. Idempotent GETs
+# are retried HTTP_RETRIES times with jittered exponential backoff.
+HTTP_POOL_SIZE = _env_int("HTTP_POOL_SIZE", 10)
+HTTP_CONNECT_TIMEOUT = _env_float("HTTP_CONNECT_TIMEOUT", 3.05)
+HTTP_READ_TIMEOUT = _env_float("HTTP_READ_TIMEOUT", 10)
+HTTP_RETRIES = _env_int("HTTP_RETRIES", 2)
+HTTP_BACKOFF_FACTOR = _env_float("HTTP_BACKOFF_FACTOR", 0.2)
+HTTP_BACKOFF_JITTER = _env_float("HTTP_BACKOFF_JITTER", 0.1)
+
+# Circuit breakers (one per upstream): open once at least
+# CIRCUIT_MIN_REQUESTS calls in the last CIRCUIT_WINDOW seconds failed at
+# CIRCUIT_FAILURE_RATE or more, then allow a single probe after
+# CIRCUIT_OPEN_SECONDS
+CIRCUIT_FAILURE_RATE = _env_float("CIRCUIT_FAILURE_RATE", 0.5)
+CIRCUIT_MIN_REQUESTS = _env_int("CIRCUIT_MIN_REQUESTS", 5)
+CIRCUIT_WINDOW = _env_float("CIRCUIT_WINDOW", 30)
+CIRCUIT_OPEN_SECONDS = _env_float("CIRCUIT_OPEN_SECONDS", 30)
+
+# Upstream rate limit, shared by every worker on the host when the cache
+# backend is: UPSTREAM_RATE calls per second (Open-Meteo's free tier allows
+# 5000 an hour) with bursts of UPSTREAM_BURST. Up to UPSTREAM_QUEUE_SIZE
+# calls per process wait for a token, page requests ahead of batch and
+# prefetch work, for at most UPSTREAM_MAX_WAIT (UPSTREAM_BATCH_MAX_WAIT for
+# batch work) seconds; beyond that they fail with RATE_LIMITED, a 503 with
+# Retry-After. A cold lookup costs two calls (geocode and forecast), so the
+# defaults serve a burst of about 30 uncached cities and then under one a
+# second; raise UPSTREAM_RATE and UPSTREAM_BURST to match a paid plan.
+UPSTREAM_RATE = _env_float("UPSTREAM_RATE", 1.3)
+UPSTREAM_BURST = _env_int("UPSTREAM_BURST", 60)
+UPSTREAM_QUEUE_SIZE = _env_int("UPSTREAM_QUEUE_SIZE", 32)
+UPSTREAM_MAX_WAIT = _env_float("UPSTREAM_MAX_WAIT", 2)
+UPSTREAM_BATCH_MAX_WAIT = _env_float("UPSTREAM_BATCH_MAX_WAIT", 30)
+
+# Inbound rate limit on the weather routes: at most INBOUND_LIMIT requests
+# per client over a sliding INBOUND_WINDOW seconds, counted in the cache
+# backend so all workers share the count. Clients are told apart by address,
+# or by an X-API-Key header listed in API_KEYS, whose budget is
+# INBOUND_API_KEY_LIMIT. A limit of 0 turns the check off, which is the
+# default: behind a load balancer every request comes from its address
+# until TRUSTED_PROXIES (comma-separated addresses or CIDRs) lists it, so
+# the client is read from X-Forwarded-For.
+INBOUND_WINDOW = _env_float("INBOUND_WINDOW", 60)
+INBOUND_LIMIT = _env_int("INBOUND_LIMIT", 0)
+INBOUND_API_KEY_LIMIT = _env_int("INBOUND_API_KEY_LIMIT", 600)
+INBOUND_MAX_CLIENTS = _env_int("INBOUND_MAX_CLIENTS", 10000)
+TRUSTED_PROXIES = tuple(proxy.strip() for proxy in os.getenv("TRUSTED_PROXIES", "").split(",") if proxy.strip())
+API_KEYS = frozenset(key.strip() for key in os.getenv("API_KEYS", "").split(",") if key.strip())
+
+# Geocoding cache: city names almost never move, unknown names are
+# only remembered briefly in case the upstream learns about them
+GEO_CACHE_SIZE = _env_int("GEO_CACHE_SIZE", 2048)
+GEO_CACHE_TTL = _env_int("GEO_CACHE_TTL", 7 * 24 * 60 * 60)
+GEO_NEGATIVE_CACHE_TTL = _env_int("GEO_NEGATIVE_CACHE_TTL", 5 * 60)
+
+# Geocoding results requested per lookup; the first one is used, the rest
+# feed the city suggestions
+GEO_RESULT_COUNT = _env_int("GEO_RESULT_COUNT", 5)
+
+# City suggestions: an in-memory index of every resolved place, optionally
+# seeded from a file of "name<TAB>country<TAB>lat<TAB>lon[<TAB>population]"
+# lines and, in each worker at start, from the shared geocoding cache. Past
+# SUGGEST_MAX_ENTRIES places the least looked-up ones are dropped.
+SUGGEST_SEED_PATH = os.getenv("SUGGEST_SEED_PATH", "")
+SUGGEST_MAX_RESULTS = _env_int("SUGGEST_MAX_RESULTS", 10)
+SUGGEST_MAX_ENTRIES = _env_int("SUGGEST_MAX_ENTRIES", 50000)
+
+# Optional offline gazetteer index (see app/services/gazetteer.py), consulted
+# before the geocoding API
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "")
+
+# Forecast cache: entries are shared by every lookup that falls in the same
+# grid cell and stay fresh until the next upstream model update is published
+# (every FORECAST_UPDATE_INTERVAL seconds, FORECAST_UPDATE_DELAY after the
+# boundary). Expired entries are served for FORECAST_STALE_TTL more seconds
+# while a background refresh runs.
+FORECAST_CACHE_SIZE = _env_int("FORECAST_CACHE_SIZE", 4096)
+FORECAST_GRID_DEGREES = _env_float("FORECAST_GRID_DEGREES", 0.1)
+FORECAST_UPDATE_INTERVAL = _env_int("FORECAST_UPDATE_INTERVAL", 60 * 60)
+FORECAST_UPDATE_DELAY = _env_int("FORECAST_UPDATE_DELAY", 10 * 60)
+FORECAST_STALE_TTL = _env_int("FORECAST_STALE_TTL", 30 * 60)
+
+# Rendered pages, kept per process as identity/gzip/brotli bytes
+PAGE_CACHE_SIZE = _env_int("PAGE_CACHE_SIZE", 512)
+PAGE_GZIP_LEVEL = _env_int("PAGE_GZIP_LEVEL", 6)
+PAGE_BROTLI_QUALITY = _env_int("PAGE_BROTLI_QUALITY", 5)
+
+# Batch lookups: cities accepted per API call, concurrent geocoding calls
+# and locations packed into one multi-location forecast request
+BATCH_MAX_CITIES = _env_int("BATCH_MAX_CITIES", 200)
+BATCH_GEO_CONCURRENCY = _env_int("BATCH_GEO_CONCURRENCY", 8)
+FORECAST_BATCH_SIZE = _env_int("FORECAST_BATCH_SIZE", 50)
+
+# Streaming export: cities resolved and fetched at the same time
+EXPORT_CONCURRENCY = _env_int("EXPORT_CONCURRENCY", 8)
+
+# Hot cities are kept warm by the prefetcher: a comma-separated HOT_CITIES
+# list and/or a HOT_CITIES_FILE with one city per line. They are refreshed
+# PREFETCH_LEAD_TIME seconds before they would go stale (at most
+# FORECAST_UPDATE_DELAY, so never before the model run's boundary). Failed
+# refreshes are retried after PREFETCH_RETRY_INTERVAL; workers report ready
+# once a warm-up pass succeeded, or after PREFETCH_WARMUP_TIMEOUT at the
+# latest.
+HOT_CITIES = [city.strip() for city in os.getenv("HOT_CITIES", "").split(",") if city.strip()]
+HOT_CITIES_FILE = os.getenv("HOT_CITIES_FILE", "")
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() in ("1", "true", "yes")
+PREFETCH_RETRY_INTERVAL = _env_float("PREFETCH_RETRY_INTERVAL", 60)
+PREFETCH_WARMUP_TIMEOUT = _env_float("PREFETCH_WARMUP_TIMEOUT", 120)
+PREFETCH_LEAD_TIME = _env_float("PREFETCH_LEAD_TIME", 60)
+
+
+# Logging: LOG_FORMAT is "text" or "json"; LOG_SAMPLE_RATE keeps that
+# fraction of INFO records (warnings and errors are never sampled out);
+# an empty LOG_FILE logs to the console only
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SAMPLE_RATE = _env_float("LOG_SAMPLE_RATE", 1.0)
+LOG_FILE = os.getenv("LOG_FILE", os.path.join(PROJECT_ROOT, "logs", "weather_app.log"))
+
+_log_listener = None
+
+# Metrics: directory where each worker drops its snapshot so /metrics can
+# aggregate across gunicorn workers; empty keeps metrics per process
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = _env_float("METRICS_FLUSH_INTERVAL", 1.0)
+
+
+def _restart_log_listener():
+    # Threads don't survive fork: a worker forked from a server that
+    # preloaded the app needs its own listener on the inherited queue
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener = QueueListener(_log_listener.queue, *_log_listener.handlers, respect_handler_level=True)
+        _log_listener.start()
+
+
+def _stop_log_listener():
+    if _log_listener is not None:
+        _log_listener.stop()
+
+
+def setup_logging():
+    # Idempotent: every caller shares the one queue-based pipeline
+    global _log_listener
+    root_logger = logging.getLogger()     # Get the root logger
+    if _log_listener is not None:
+        return root_logger
+
     # Formatter that defines how log messages look
     # %(asctime)s     - Timestamp
     # %(name)s        - Logger name (e.g., 'weather')
     # %(levelname)s   - Level (INFO, ERROR, etc.)
     # %(message)s     - The actual log message
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
-    # Makes sure file doesnt exceed 5MB
-    file_handler = RotatingFileHandler(
-        log_file,               # Path to log file
-        maxBytes=5*1024*1024,   # 5 MB
-        backupCount=5
-    )
-    file_handler.setFormatter(formatter)
-    
+    if LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+
     # Console handler for printing logs to terminal
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    
+    handlers = [console_handler]
+
+    if LOG_FILE:
+        # Create the logs directory if it doesn't exist
+        os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+
+        # Makes sure file doesnt exceed 5MB
+        file_handler = RotatingFileHandler(
+            LOG_FILE,               # Path to log file
+            maxBytes=5*1024*1024,   # 5 MB
+            backupCount=5
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    # Request threads only enqueue records; a background listener thread
+    # does the formatting and file/console I/O
+    log_queue = queue.SimpleQueue()
+    queue_handler = ContextQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+
+    _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_stop_log_listener)
+    os.register_at_fork(after_in_child=_restart_log_listener)
+
     # Root logger configuration
-    root_logger = logging.getLogger()     # Get the root logger
-    root_logger.setLevel(logging.INFO)    # Set minimum log level
-    root_logger.addHandler(file_handler)  # Add file output
-    root_logger.addHandler(console_handler)  # Add console output
+    root_logger.setLevel(LOG_LEVEL)       # Set minimum log level
+    root_logger.addHandler(queue_handler)
     
     return root_logger
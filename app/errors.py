@@ -7,6 +7,7 @@ class WeatherErrorType(Enum):
     NETWORK_ERROR = "NETWORK_ERROR"
     API_ERROR = "API_ERROR"
     FETCH_ERROR = "FETCH_ERROR"  # Add this line
+    RATE_LIMITED = "RATE_LIMITED"
 
 class WeatherError(Exception):
     def __init__(self, error_type, message=None):
@@ -34,9 +35,24 @@ def get_user_message(error_type: WeatherErrorType) -> dict:
         WeatherErrorType.API_ERROR: {
             "heading": "Service Unavailable",
             "message": "The weather service is currently unavailable. Please try again later."
+        },
+        WeatherErrorType.RATE_LIMITED: {
+            "heading": "Too Many Requests",
+            "message": "We're receiving more requests than we can answer right now. Please wait a moment and try again."
         }
     }
     return messages.get(error_type, {
         "heading": "Unexpected Error",
         "message": "An unexpected error occurred. Please try again later."
     })
+
+
+def get_http_status(error_type: WeatherErrorType) -> int:
+    statuses = {
+        WeatherErrorType.CITY_NOT_FOUND: 404,
+        WeatherErrorType.INVALID_DATA: 502,
+        WeatherErrorType.NETWORK_ERROR: 503,
+        WeatherErrorType.API_ERROR: 503,
+        WeatherErrorType.RATE_LIMITED: 503,
+    }
+    return statuses.get(error_type, 500)
@@ -0,0 +1,57 @@
+import platform
+from datetime import datetime, timezone
+
+from app.config import CACHE_BACKEND
+from app.services import circuit_breaker, prefetcher
+from app.services.weather_service import forecast_cache
+
+# /health is liveness: the process is up and answering. It checks nothing
+# else, so an orchestrator never restarts a worker over an upstream outage.
+#
+# /ready is readiness, whether this instance should get traffic:
+#   warming      the hot-city forecasts aren't cached yet (503)
+#   unavailable  the cache backend can't be read (503)
+#   degraded     an upstream circuit is open or a connection pool is fully
+#                checked out; cached forecasts are still served, and every
+#                instance shares the upstream, so it stays in rotation
+#   ready        everything is fine
+
+
+def liveness():
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "version": platform.python_version(),
+    }
+
+
+def _cache_reachable():
+    try:
+        forecast_cache.get("ready-probe")
+    except Exception:
+        return False
+    return True
+
+
+def readiness(pools):
+    # `pools` is the transport's pool_stats(); returns (body, status code)
+    circuits = circuit_breaker.states()
+    cache = {"backend": CACHE_BACKEND, "reachable": _cache_reachable(), "warm": prefetcher.is_ready()}
+    saturated = [name for name, pool in pools.items() if pool["in_use"] >= pool["size"]]
+
+    if not cache["warm"]:
+        status = "warming"
+    elif not cache["reachable"]:
+        status = "unavailable"
+    elif saturated or any(s != circuit_breaker.CLOSED for s in circuits.values()):
+        status = "degraded"
+    else:
+        status = "ready"
+    body = {
+        "status": status,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "cache": cache,
+        "circuits": circuits,
+        "pools": {"saturated": saturated, "hosts": pools},
+    }
+    return body, 503 if status in ("warming", "unavailable") else 200
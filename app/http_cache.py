@@ -0,0 +1,49 @@
+import hashlib
+import time
+
+from werkzeug.http import http_date, parse_date, parse_etags
+
+from app.errors import WeatherErrorType
+from app.services import rate_limiter
+
+# Validators for the GET weather routes (Flask and ASGI). A representation
+# changes only when a new forecast is stored for its location, so the ETag
+# and Last-Modified come from the forecast cache entry and max-age runs until
+# upstream is due to publish the next model run.
+
+
+def forecast_etag(kind, data, entry, variables, version=""):
+    # `version` identifies the template for rendered representations, so a
+    # deploy that changes the markup invalidates cached pages
+    source = f"{kind}|{version}|{data['name']}|{data['country']}|{variables.key}|{entry['generated_at']}"
+    return hashlib.sha1(source.encode()).hexdigest()[:20]
+
+
+def encoded_etag(etag, encoding):
+    # A strong validator must differ between content codings of one page
+    return f"{etag}-{encoding}" if encoding else etag
+
+
+def cache_headers(etag, entry):
+    return {
+        "ETag": f'"{etag}"',
+        "Last-Modified": http_date(int(entry["generated_at"])),
+        "Cache-Control": f"public, max-age={max(0, int(entry['fresh_until'] - time.time()))}",
+    }
+
+
+def is_not_modified(etag, entry, if_none_match=None, if_modified_since=None):
+    # If-None-Match wins over If-Modified-Since when both are sent
+    if if_none_match:
+        return parse_etags(if_none_match).contains_weak(etag)
+    since = parse_date(if_modified_since) if if_modified_since else None
+    return since is not None and int(entry["generated_at"]) <= since.timestamp()
+
+
+def error_headers(error_type):
+    # Errors are never cached; a lookup shed by the upstream rate limit
+    # tells the client when to come back
+    headers = {"Cache-Control": "no-store"}
+    if error_type == WeatherErrorType.RATE_LIMITED:
+        headers["Retry-After"] = str(rate_limiter.upstream.retry_after())
+    return headers
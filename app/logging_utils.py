@@ -0,0 +1,61 @@
+import copy
+import json
+import logging
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler
+
+from app import request_context
+
+
+# Adds the current request id and stage timings to each record. Runs on the
+# thread that logs, before the record crosses the queue.
+class RequestContextFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_context.request_id()
+        record.timings = request_context.timings()
+        return True
+
+
+# Keeps roughly `rate` of INFO-and-below records; warnings and errors always
+# pass
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.INFO or self.rate >= 1 or random.random() < self.rate
+
+
+class ContextQueueHandler(QueueHandler):
+    # The stock prepare() folds the traceback into the message; keep it in
+    # exc_text so the JSON formatter can report it separately
+    def prepare(self, record):
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "timings", None):
+            entry["timings_ms"] = record.timings
+        for key in ("method", "path", "status", "duration_ms"):
+            if hasattr(record, key):
+                entry[key] = getattr(record, key)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
@@ -0,0 +1,308 @@
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from app import request_context
+from app.config import METRICS_DIR, METRICS_FLUSH_INTERVAL
+
+# Minimal Prometheus-style metrics. Each process keeps its own values; when
+# METRICS_DIR is set every process also dumps a snapshot there and render()
+# merges all snapshots, so a scrape hitting any gunicorn worker sees totals
+# for the whole server. Counters and histograms are summed, gauges report
+# the highest value. A background thread writes the snapshot within
+# METRICS_FLUSH_INTERVAL of any change; scrapes and process exit flush too.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = {}
+_lock = threading.Lock()
+# Serializes snapshot writes so an older snapshot never replaces a newer one
+_write_lock = threading.Lock()
+_dirty = False
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def _label_key(labels):
+    return json.dumps(sorted(labels.items()))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.samples = {}
+        _registry[name] = self
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+        _changed()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with _lock:
+            self.samples[_label_key(labels)] = value
+        _changed()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with _lock:
+            # Per-bucket (non-cumulative) counts, then sum and count
+            sample = self.samples.get(key)
+            if sample is None:
+                sample = self.samples[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample[i] += 1
+                    break
+            else:
+                sample[len(self.buckets)] += 1
+            sample[-2] += value
+            sample[-1] += 1
+        _changed()
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+@contextmanager
+def timed(stage):
+    # Stage timer feeding both the histogram and the current request's log
+    # context
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        request_context.record_timing(stage, elapsed)
+
+
+STAGE_SECONDS = Histogram("weather_stage_seconds", "Time spent in each request stage")
+ERRORS = Counter("weather_errors_total", "Weather lookups that failed, by error type")
+CACHE_REQUESTS = Counter("weather_cache_requests_total", "Cache lookups by cache and result")
+UPSTREAM_RESPONSES = Counter("weather_upstream_responses_total", "Upstream responses by status code")
+UPSTREAM_SECONDS = Histogram("weather_upstream_request_seconds", "Upstream request latency")
+
+
+def observe_upstream(upstream, status, seconds):
+    UPSTREAM_RESPONSES.inc(upstream=upstream, status=str(status))
+    UPSTREAM_SECONDS.observe(seconds, upstream=upstream)
+
+
+def _snapshot():
+    # Call with the lock held
+    return {
+        name: {
+            "kind": metric.kind,
+            "help": metric.help,
+            "buckets": list(getattr(metric, "buckets", ())),
+            "samples": {key: (list(v) if isinstance(v, list) else v) for key, v in metric.samples.items()},
+        }
+        for name, metric in _registry.items()
+    }
+
+
+def snapshot():
+    with _lock:
+        return _snapshot()
+
+
+def _snapshot_path(pid=None):
+    return os.path.join(METRICS_DIR, f"metrics_{pid or os.getpid()}.json")
+
+
+def _write_json(path, data):
+    # Each writer gets its own temp file (not matched by metrics_*.json) so
+    # concurrent writes never interleave
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".metrics_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        os.replace(temp, path)
+    except BaseException:
+        os.remove(temp)
+        raise
+
+
+def flush():
+    global _dirty
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with _write_lock:
+        with _lock:
+            data = json.dumps(_snapshot())
+            _dirty = False
+        _write_json(_snapshot_path(), data)
+
+
+def _try_flush():
+    try:
+        flush()
+    except OSError:
+        pass
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        if _dirty:
+            _try_flush()
+
+
+def _changed():
+    # Threads don't survive fork, so each worker starts its own flusher on
+    # its first change
+    global _dirty, _flusher_pid
+    _dirty = True
+    if not METRICS_DIR or _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+
+
+atexit.register(_try_flush)
+
+
+def clear_metrics_dir():
+    # Call once when the server (not a worker) starts, so counts from a
+    # previous run don't leak into this one
+    if not METRICS_DIR:
+        return
+    for path in glob.glob(os.path.join(METRICS_DIR, "metrics_*.json")) + \
+            glob.glob(os.path.join(METRICS_DIR, ".metrics_*.tmp")):
+        os.remove(path)
+
+
+def retire_worker(pid):
+    # Call from the server when a worker exits. Its counters and histograms
+    # are folded into one "retired" snapshot, so totals survive worker
+    # recycling without a file per dead worker; its gauges are dropped, they
+    # described a process that is gone.
+    if not METRICS_DIR:
+        return
+    path = _snapshot_path(pid)
+    retired_path = os.path.join(METRICS_DIR, "metrics_retired.json")
+    try:
+        with open(path) as f:
+            worker = json.load(f)
+    except (OSError, ValueError):
+        return
+    try:
+        with open(retired_path) as f:
+            retired = json.load(f)
+    except (OSError, ValueError):
+        retired = {}
+    worker = {name: metric for name, metric in worker.items() if metric["kind"] != "gauge"}
+    _write_json(retired_path, json.dumps(_merge([retired, worker])))
+    os.remove(path)
+
+
+def _merge(snapshots):
+    merged = {}
+    for snap in snapshots:
+        for name, metric in snap.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for key, value in metric["samples"].items():
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = list(value) if isinstance(value, list) else value
+                elif metric["kind"] == "histogram":
+                    target["samples"][key] = [a + b for a, b in zip(current, value)]
+                elif metric["kind"] == "gauge":
+                    target["samples"][key] = max(current, value)
+                else:
+                    target["samples"][key] = current + value
+    return merged
+
+
+def collect():
+    if not METRICS_DIR:
+        return snapshot()
+    # Keep this process's file current for scrapes served by other workers
+    _try_flush()
+    own = snapshot()
+    snapshots = [own]
+    own_path = _snapshot_path()
+    for path in glob.glob(os.path.join(METRICS_DIR, "metrics_*.json")):
+        if path == own_path:
+            continue
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return _merge(snapshots)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key, extra=None):
+    items = json.loads(key) + (extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    # Prometheus text exposition format 0.0.4
+    lines = []
+    for name, metric in sorted(collect().items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for key, value in sorted(metric["samples"].items()):
+            if metric["kind"] != "histogram":
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric["buckets"]) + ["+Inf"], value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(key, [['le', str(bound)]])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(key)} {_format_value(value[-2])}")
+            lines.append(f"{name}_count{_format_labels(key)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        for metric in _registry.values():
+            metric.samples.clear()
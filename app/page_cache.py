@@ -0,0 +1,90 @@
+import gzip
+import hashlib
+
+from werkzeug.http import parse_accept_header
+
+from app import metrics
+from app.config import (
+    FORECAST_STALE_TTL,
+    FORECAST_UPDATE_INTERVAL,
+    PAGE_BROTLI_QUALITY,
+    PAGE_CACHE_SIZE,
+    PAGE_GZIP_LEVEL,
+)
+from app.errors import WeatherErrorType, get_user_message
+from app.services.cache import TTLCache
+from app.services.weather_service import forecast_key
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Rendered index.html output. A forecast page is a pure function of the
+# location, its cached forecast and the template, so it is rendered once per
+# forecast generation and kept compressed; the home page and the error
+# variants are rendered up front. Pages hold bytes, so the cache is always
+# in-process.
+
+ENCODINGS = ("br", "gzip", "identity") if brotli is not None else ("gzip", "identity")
+
+
+def negotiate(accept_encoding):
+    # Content coding to serve for an Accept-Encoding header, None for identity
+    if not accept_encoding:
+        return None
+    encoding = parse_accept_header(accept_encoding).best_match(ENCODINGS, default="identity")
+    return None if encoding == "identity" else encoding
+
+
+class RenderedPage:
+    def __init__(self, html):
+        body = html.encode("utf-8")
+        self.bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=PAGE_GZIP_LEVEL, mtime=0)}
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(body, quality=PAGE_BROTLI_QUALITY)
+
+    def select(self, accept_encoding):
+        # Returns (content encoding or None, body) for an Accept-Encoding header
+        encoding = negotiate(accept_encoding)
+        return encoding, self.bodies[encoding or "identity"]
+
+
+class PageCache:
+    def __init__(self, render, template_path, maxsize=PAGE_CACHE_SIZE,
+                 ttl=FORECAST_UPDATE_INTERVAL + FORECAST_STALE_TTL):
+        # `render(data=..., error=...)` returns the template output as text
+        self.render = render
+        with open(template_path, "rb") as f:
+            self.version = hashlib.sha1(f.read()).hexdigest()[:12]
+        self.pages = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.fixed = {}
+
+    def prerender(self):
+        self.fixed["home"] = RenderedPage(self.render(data=None, error=None))
+        for error_type in WeatherErrorType:
+            self.fixed[error_type] = RenderedPage(self.render(data=None, error=get_user_message(error_type)))
+
+    def home_page(self):
+        if "home" not in self.fixed:
+            self.prerender()
+        return self.fixed["home"]
+
+    def error_page(self, error_type):
+        if error_type not in self.fixed:
+            self.prerender()
+        return self.fixed[error_type]
+
+    def page_key(self, data, entry, variables):
+        location = forecast_key(data["latitude"], data["longitude"], variables)
+        return f"{self.version}|{data['name']}|{data['country']}|{location}|{entry['generated_at']}"
+
+    def weather_page(self, data, entry, variables):
+        key = self.page_key(data, entry, variables)
+        page = self.pages.get(key)
+        metrics.CACHE_REQUESTS.inc(cache="page", result="miss" if page is None else "hit")
+        if page is None:
+            with metrics.timed("render"):
+                page = RenderedPage(self.render(data=data, error=None))
+            self.pages.set(key, page)
+        return page
@@ -0,0 +1,44 @@
+import time
+import uuid
+from contextvars import ContextVar
+
+# Per-request values that logging and metrics attach to what they record.
+# Context variables follow the request across threads' own contexts and
+# asyncio tasks without being passed around explicitly.
+
+_request_id = ContextVar("request_id", default=None)
+_timings = ContextVar("timings", default=None)
+_started = ContextVar("started", default=None)
+
+
+def start_request(request_id=None):
+    request_id = request_id or uuid.uuid4().hex
+    _request_id.set(request_id)
+    _timings.set({})
+    _started.set(time.perf_counter())
+    return request_id
+
+
+def end_request():
+    _request_id.set(None)
+    _timings.set(None)
+    _started.set(None)
+
+
+def request_id():
+    return _request_id.get()
+
+
+def record_timing(stage, seconds):
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = round(timings.get(stage, 0) + seconds * 1000, 3)
+
+
+def timings():
+    return dict(_timings.get() or {})
+
+
+def elapsed_ms():
+    started = _started.get()
+    return None if started is None else round((time.perf_counter() - started) * 1000, 3)
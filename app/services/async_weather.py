@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import time
+
+import httpx
+
+from app import metrics
+from app.config import (
+    CACHE_BACKEND,
+    EXPORT_CONCURRENCY,
+    GEO_RESULT_COUNT,
+    HTTP_POOL_SIZE,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_RETRIES,
+)
+from app.errors import WeatherError, WeatherErrorType
+from app.services import circuit_breaker, geo_service, rate_limiter, suggest
+from app.services.geo_service import GeoModel
+from app.services.forecast_variables import DEFAULT_VARIABLES
+from app.services.singleflight import AsyncSingleFlight
+from app.services.weather_service import (
+    WeatherService,
+    build_weather_data,
+    count_forecast_lookup,
+    error_entry,
+    forecast_cache,
+    forecast_key,
+    get_weather_batch as get_weather_batch_sync,
+    is_stale,
+    store_forecast,
+)
+
+# asyncio counterparts of get_geo / fetch_weather / get_weather. They share
+# the caches, URL building and response handling with the sync services,
+# only the transport differs.
+
+logger = logging.getLogger(__name__)
+
+NETWORK_EXCEPTIONS = (httpx.TransportError,)
+
+_clients = {}
+geo_flight = AsyncSingleFlight()
+forecast_flight = AsyncSingleFlight()
+_refreshing = set()
+_background_tasks = set()
+
+
+def get_client():
+    # httpx pools are bound to the loop that created them
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_POOL_SIZE * 10,
+                max_keepalive_connections=HTTP_POOL_SIZE,
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=HTTP_RETRIES),
+        )
+        _clients[loop] = client
+    return client
+
+
+async def close_client():
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def pool_stats():
+    # One pool per client, shared by every upstream host up to the client's
+    # max_connections
+    in_use = idle = 0
+    for client in list(_clients.values()):
+        pool = getattr(client._transport, "_pool", None)
+        if pool is None or client.is_closed:
+            continue
+        for conn in pool.connections:
+            if conn.is_idle():
+                idle += 1
+            else:
+                in_use += 1
+    if not _clients:
+        return {}
+    return {"upstream": {"size": HTTP_POOL_SIZE * 10 * len(_clients), "in_use": in_use, "idle": idle}}
+
+
+async def _get(url, upstream, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = await get_client().get(url, **kwargs)
+    except NETWORK_EXCEPTIONS:
+        metrics.observe_upstream(upstream, "error", time.perf_counter() - start)
+        raise
+    metrics.observe_upstream(upstream, response.status_code, time.perf_counter() - start)
+    return response
+
+
+async def _offload(fn, *args):
+    # SQLite and Redis calls can block for seconds on a busy lock or a slow
+    # server; run them in a thread so they don't stall the event loop. The
+    # in-process cache is faster to call directly than to hand off.
+    if CACHE_BACKEND == "memory":
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+async def _guarded(breaker, coro_fn, *args):
+    breaker.before_call()
+    try:
+        result = await coro_fn(*args)
+    except WeatherError as e:
+        breaker.record(e)
+        raise
+    except Exception:
+        breaker.record_success()
+        raise
+    breaker.record_success()
+    return result
+
+
+async def _fetch(url):
+    await rate_limiter.upstream.acquire_async()
+    try:
+        response = await _get(url, "geocoding")
+    except NETWORK_EXCEPTIONS:
+        raise WeatherError(WeatherErrorType.NETWORK_ERROR, "Could not connect to geocoding service")
+    if response.status_code == 429:
+        await _offload(rate_limiter.upstream.throttled, response.headers.get("Retry-After"))
+    return geo_service.handle_response(response)
+
+
+async def fetch(url):
+    return await _guarded(circuit_breaker.geocoding, _fetch, url)
+
+
+async def _lookup(name, key):
+    data = await fetch(GeoModel.get_url(name, GEO_RESULT_COUNT))
+    return await _offload(geo_service.cache_lookup_result, key, data, name)
+
+
+async def get_geo(name):
+    if not name or not name.strip():
+        raise WeatherError(WeatherErrorType.CITY_NOT_FOUND, "Empty city name provided")
+
+    key = GeoModel.cache_key(name)
+    try:
+        data = await _offload(geo_service.local_lookup, name, key)
+        if data is None:
+            data = await geo_flight.do(key, _lookup, name, key)
+        suggest.get_index().record_hit(data)
+        geo = GeoModel()
+        geo.save_country_geo(data)
+        return geo
+    except WeatherError:
+        raise
+    except Exception as e:
+        raise WeatherError(WeatherErrorType.SERVER_ERROR, str(e))
+
+
+async def _request_forecast(lat, lon, variables=DEFAULT_VARIABLES):
+    return await _guarded(circuit_breaker.forecast, _send_request, lat, lon, variables)
+
+
+async def _send_request(lat, lon, variables=DEFAULT_VARIABLES):
+    service = WeatherService()
+    await rate_limiter.upstream.acquire_async()
+    try:
+        response = await _get(service.base_url, "forecast", params=service._build_params(lat, lon, variables))
+    except NETWORK_EXCEPTIONS:
+        raise WeatherError(WeatherErrorType.NETWORK_ERROR)
+    if response.status_code == 429:
+        await _offload(rate_limiter.upstream.throttled, response.headers.get("Retry-After"))
+    return service.handle_response(response)
+
+
+async def _fetch_and_store(key, lat, lon, variables=DEFAULT_VARIABLES):
+    data = await _request_forecast(lat, lon, variables)
+    return await _offload(store_forecast, key, data)
+
+
+async def _refresh(key, lat, lon, variables):
+    try:
+        with rate_limiter.priority(rate_limiter.BATCH):
+            await forecast_flight.do(key, _fetch_and_store, key, lat, lon, variables)
+    except WeatherError as e:
+        logger.warning(f"Background forecast refresh for {key} failed: {e}")
+    finally:
+        _refreshing.discard(key)
+
+
+async def fetch_weather(location, variables=DEFAULT_VARIABLES):
+    return (await fetch_weather_entry(location, variables))["data"]
+
+
+async def fetch_weather_entry(location, variables=DEFAULT_VARIABLES):
+    if isinstance(location, str):
+        location = await get_geo(location)
+    lat, lon = WeatherService._resolve_coordinates(location)
+    key = forecast_key(lat, lon, variables)
+
+    entry = await _offload(forecast_cache.get, key)
+    count_forecast_lookup(entry)
+    if entry is not None:
+        if is_stale(entry) and key not in _refreshing:
+            _refreshing.add(key)
+            # Hold a reference so the refresh task isn't garbage collected
+            task = asyncio.ensure_future(_refresh(key, lat, lon, variables))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        return entry
+
+    return await forecast_flight.do(key, _fetch_and_store, key, lat, lon, variables)
+
+
+async def get_weather(city, variables=DEFAULT_VARIABLES):
+    return (await get_weather_entry(city, variables))[0]
+
+
+async def get_weather_entry(city, variables=DEFAULT_VARIABLES):
+    if not city or len(city.strip()) == 0:
+        raise WeatherError(WeatherErrorType.CITY_NOT_FOUND)
+
+    try:
+        with metrics.timed("geocode"):
+            geo = await get_geo(city)
+        with metrics.timed("forecast"):
+            entry = await fetch_weather_entry(geo, variables)
+        return build_weather_data(geo, entry["data"], variables), entry
+    except WeatherError:
+        raise
+    except Exception as e:
+        raise WeatherError(WeatherErrorType.SERVER_ERROR, str(e))
+
+
+async def get_weather_batch(cities, variables=DEFAULT_VARIABLES):
+    # The sync batch already overlaps its geocoding in threads and fetches
+    # the forecasts with multi-location requests; run it in one thread
+    return await asyncio.to_thread(get_weather_batch_sync, cities, variables)
+
+
+async def weather_entry(city, variables=DEFAULT_VARIABLES):
+    entry = {"city": city}
+    try:
+        with rate_limiter.priority(rate_limiter.BATCH):
+            entry["data"] = await get_weather(city, variables)
+    except WeatherError as e:
+        entry["error"] = error_entry(e)
+    except Exception as e:
+        logger.error(f"Unexpected error exporting {city}: {str(e)}", exc_info=True)
+        entry["error"] = error_entry(WeatherError(WeatherErrorType.SERVER_ERROR, str(e)))
+    return entry
+
+
+async def iter_weather(cities, variables=DEFAULT_VARIABLES, concurrency=EXPORT_CONCURRENCY):
+    # asyncio counterpart of weather_service.iter_weather over an async
+    # iterable of cities: entries in completion order, at most `concurrency`
+    # lookups in flight
+    cities = cities.__aiter__()
+    pending = set()
+    exhausted = False
+    try:
+        while pending or not exhausted:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    city = await cities.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                else:
+                    pending.add(asyncio.ensure_future(weather_entry(city, variables)))
+            if pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+    finally:
+        # The client went away mid-stream
+        for task in pending:
+            task.cancel()
+
+
+if __name__ == "__main__":
+    print("today", asyncio.run(get_weather("haifa"))["name"])
@@ -0,0 +1,389 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import CACHE_BACKEND, CACHE_CODEC, CACHE_PATH, CACHE_REDIS_URL, CACHE_TOUCH_INTERVAL
+from app.services.codec import JSONCodec, get_codec
+
+
+# Interface shared by every cache backend. Values must be JSON-serializable
+# so that out-of-process backends can store them; a backend's codec turns
+# them into bytes or text. A value its codec can't read is a miss.
+class CacheBackend:
+    def get(self, key, default=None):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def incr(self, key, amount=1, ttl=None):
+        # Atomic counter: a missing or expired key starts from 0 and expires
+        # after `ttl`, an existing one keeps its expiry. Returns the new value.
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def values(self):
+        # Every live value, skipping any the codec can't read. Doesn't count
+        # as hits or refresh recency.
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+
+# Thread-safe LRU cache whose entries also expire after a TTL. Values are
+# kept as-is unless a codec is given, in which case they are stored encoded:
+# a cached forecast is ~4x smaller as bytes than as Python objects, and every
+# get() returns a fresh copy.
+class TTLCache(CacheBackend):
+    def __init__(self, maxsize=1024, ttl=300, clock=time.monotonic, codec=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.codec = codec
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] <= self._clock():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+        return entry[0] if self.codec is None else self.codec.loads(entry[0])
+
+    def set(self, key, value, ttl=None):
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        if self.codec is not None:
+            value = self.codec.dumps(value)
+        with self._lock:
+            self._store(key, value, expires_at)
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            now = self._clock()
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= now:
+                value, expires_at = 0, now + (self.ttl if ttl is None else ttl)
+            else:
+                value = entry[0] if self.codec is None else self.codec.loads(entry[0])
+                expires_at = entry[1]
+            value += amount
+            self._store(key, value if self.codec is None else self.codec.dumps(value), expires_at)
+        return value
+
+    def _store(self, key, value, expires_at):
+        # Call with the lock held
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def values(self):
+        with self._lock:
+            now = self._clock()
+            live = [value for value, expires_at in self._data.values() if expires_at > now]
+        return live if self.codec is None else [self.codec.loads(value) for value in live]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+# LRU + TTL cache stored in a SQLite file, so every gunicorn worker on the
+# host shares the same entries and they survive worker restarts. Hit, miss
+# and eviction counters are per process. The row count is kept by triggers
+# in cache_counts so writes never scan the table.
+class SQLiteCache(CacheBackend):
+    def __init__(self, path, namespace, maxsize=1024, ttl=300, clock=time.time, codec=JSONCodec,
+                 touch_interval=CACHE_TOUCH_INTERVAL):
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", namespace):
+            raise ValueError(f"Invalid cache namespace: {namespace}")
+        self.path = path
+        self.table = f"cache_{namespace}"
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.codec = codec
+        self.touch_interval = touch_interval
+        self._clock = clock
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _connection(self):
+        # sqlite3 connections can't cross threads or forks, keep one per
+        # thread and reopen it in a forked worker
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # One transaction, so the initial count and the triggers that
+            # maintain it can't miss a concurrent write
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {self.table}_accessed "
+                    f"ON {self.table} (accessed_at)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache_counts (name TEXT PRIMARY KEY, rows INTEGER NOT NULL)"
+                )
+                conn.execute(
+                    f"INSERT OR IGNORE INTO cache_counts (name, rows) "
+                    f"SELECT ?, COUNT(*) FROM {self.table}", (self.table,)
+                )
+                conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {self.table}_inserted AFTER INSERT ON {self.table} BEGIN "
+                    f"UPDATE cache_counts SET rows = rows + 1 WHERE name = '{self.table}'; END"
+                )
+                conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {self.table}_deleted AFTER DELETE ON {self.table} BEGIN "
+                    f"UPDATE cache_counts SET rows = rows - 1 WHERE name = '{self.table}'; END"
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, default=None):
+        conn = self._connection()
+        now = self._clock()
+        row = conn.execute(
+            f"SELECT value, expires_at, accessed_at FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None:
+            if row[1] > now:
+                try:
+                    value = self.codec.loads(row[0])
+                except ValueError:
+                    value = default
+                else:
+                    if now - row[2] >= self.touch_interval:
+                        conn.execute(
+                            f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key)
+                        )
+                    self.hits += 1
+                    return value
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ? AND expires_at <= ?", (key, now))
+        self.misses += 1
+        return default
+
+    def set(self, key, value, ttl=None):
+        conn = self._connection()
+        now = self._clock()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._store(conn, key, self.codec.dumps(value), expires_at, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def incr(self, key, amount=1, ttl=None):
+        conn = self._connection()
+        now = self._clock()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                value, expires_at = 0, now + (self.ttl if ttl is None else ttl)
+            else:
+                value, expires_at = self.codec.loads(row[0]), row[1]
+            value += amount
+            self._store(conn, key, self.codec.dumps(value), expires_at, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def _size(self, conn):
+        return conn.execute("SELECT rows FROM cache_counts WHERE name = ?", (self.table,)).fetchone()[0]
+
+    def _store(self, conn, key, encoded, expires_at, now):
+        # Call inside a write transaction. An upsert rather than INSERT OR
+        # REPLACE, whose implicit delete wouldn't fire the count trigger.
+        conn.execute(
+            f"INSERT INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+            "expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+            (key, encoded, expires_at, now),
+        )
+        overflow = self._size(conn) - self.maxsize
+        if overflow > 0:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def delete(self, key):
+        self._connection().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def values(self):
+        rows = self._connection().execute(
+            f"SELECT value FROM {self.table} WHERE expires_at > ?", (self._clock(),)
+        ).fetchall()
+        return _decoded(self.codec, (row[0] for row in rows))
+
+    def clear(self):
+        self._connection().execute(f"DELETE FROM {self.table}")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": self._size(self._connection()),
+            "maxsize": self.maxsize,
+        }
+
+
+def redis_client(url=CACHE_REDIS_URL):
+    # Shared by the Redis cache, rate limit bucket and prefetch lease
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package (requirements-redis.txt)")
+    return redis.Redis.from_url(url)
+
+
+# Cache stored in Redis or any server speaking its protocol (KeyDB, Valkey,
+# a local stand-in, ...). Expiry is native, eviction is left to the
+# server's maxmemory policy.
+class RedisCache(CacheBackend):
+    def __init__(self, url, namespace, maxsize=None, ttl=300, codec=JSONCodec, client=None):
+        self._client = redis_client(url) if client is None else client
+        self.prefix = f"weather:{namespace}:"
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.codec = codec
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        raw = self._client.get(self.prefix + key)
+        if raw is not None:
+            try:
+                value = self.codec.loads(raw)
+            except ValueError:
+                pass
+            else:
+                self.hits += 1
+                return value
+        self.misses += 1
+        return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._client.set(self.prefix + key, self.codec.dumps(value), px=max(1, int(ttl * 1000)))
+
+    def incr(self, key, amount=1, ttl=None):
+        # Plain integer strings, which both codecs read back as JSON
+        ttl = self.ttl if ttl is None else ttl
+        pipe = self._client.pipeline()
+        pipe.set(self.prefix + key, 0, nx=True, px=max(1, int(ttl * 1000)))
+        pipe.incrby(self.prefix + key, amount)
+        return pipe.execute()[1]
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def values(self):
+        keys = list(self._client.scan_iter(match=self.prefix + "*"))
+        # Keys that expired between the scan and the read come back as None
+        raw = self._client.mget(keys) if keys else []
+        return _decoded(self.codec, (value for value in raw if value is not None))
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self.prefix + "*"):
+            self._client.delete(key)
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": 0,
+            "size": sum(1 for _ in self._client.scan_iter(match=self.prefix + "*")),
+            "maxsize": self.maxsize,
+        }
+
+
+def _decoded(codec, raw_values):
+    values = []
+    for raw in raw_values:
+        try:
+            values.append(codec.loads(raw))
+        except ValueError:
+            pass
+    return values
+
+
+def create_cache(namespace, maxsize, ttl, backend=None, codec=None):
+    backend = backend or CACHE_BACKEND
+    codec = get_codec(codec or CACHE_CODEC)
+    if backend == "memory":
+        return TTLCache(maxsize=maxsize, ttl=ttl, codec=codec)
+    if backend == "sqlite":
+        return SQLiteCache(CACHE_PATH, namespace, maxsize=maxsize, ttl=ttl, codec=codec)
+    if backend == "redis":
+        return RedisCache(CACHE_REDIS_URL, namespace, maxsize=maxsize, ttl=ttl, codec=codec)
+    raise ValueError(f"Unknown cache backend: {backend}")
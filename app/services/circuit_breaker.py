@@ -0,0 +1,148 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from app import metrics
+from app.config import (
+    CIRCUIT_FAILURE_RATE,
+    CIRCUIT_MIN_REQUESTS,
+    CIRCUIT_WINDOW,
+    CIRCUIT_OPEN_SECONDS,
+)
+from app.errors import WeatherError, WeatherErrorType
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Gauge values; metrics merge gauges with max(), so a scrape reports the
+# worst state across workers
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Only errors that say the upstream itself is unhealthy count as failures
+TRIPPING_ERRORS = (WeatherErrorType.NETWORK_ERROR, WeatherErrorType.API_ERROR)
+# Calls we never sent (or that upstream throttled) say nothing either way
+NEUTRAL_ERRORS = (WeatherErrorType.RATE_LIMITED,)
+
+CIRCUIT_STATE = metrics.Gauge("weather_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)")
+CIRCUIT_REJECTED = metrics.Counter("weather_circuit_rejected_total", "Upstream calls failed fast by an open circuit")
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_rate=CIRCUIT_FAILURE_RATE, min_requests=CIRCUIT_MIN_REQUESTS,
+                 window=CIRCUIT_WINDOW, open_seconds=CIRCUIT_OPEN_SECONDS, clock=time.monotonic):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._outcomes = deque()
+            self._opened_at = None
+            self._probing = False
+            self._error_type = WeatherErrorType.NETWORK_ERROR
+            self._set_state(CLOSED)
+
+    def _set_state(self, state):
+        if getattr(self, "_state", None) not in (None, state):
+            logger.warning(f"Circuit for {self.name} is now {state}")
+        self._state = state
+        CIRCUIT_STATE.set(STATE_VALUES[state], upstream=self.name)
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def before_call(self):
+        # Raises instead of letting the call through while the circuit is
+        # open; once the open period is over exactly one probe may pass
+        with self._lock:
+            if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+                self._set_state(HALF_OPEN)
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+        CIRCUIT_REJECTED.inc(upstream=self.name)
+        raise WeatherError(self._error_type, f"{self.name} circuit is open")
+
+    def record_success(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probing = False
+                self._outcomes.clear()
+                self._set_state(CLOSED)
+            else:
+                self._record(True)
+
+    def record_failure(self, error_type):
+        with self._lock:
+            self._error_type = error_type
+            if self._state == HALF_OPEN:
+                self._open()
+                return
+            self._record(False)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if (self._state == CLOSED and len(self._outcomes) >= self.min_requests
+                    and failures / len(self._outcomes) >= self.failure_rate):
+                self._open()
+
+    def release(self):
+        # Neutral outcome: a half-open probe slot is given back
+        with self._lock:
+            self._probing = False
+
+    def record(self, error):
+        # Classifies the outcome of a call: None or a non-tripping error means
+        # the upstream answered
+        if error is not None and error.error_type in TRIPPING_ERRORS:
+            self.record_failure(error.error_type)
+        elif error is not None and error.error_type in NEUTRAL_ERRORS:
+            self.release()
+        else:
+            self.record_success()
+
+    def _record(self, ok):
+        now = self.clock()
+        self._outcomes.append((now, ok))
+        while self._outcomes and self._outcomes[0][0] <= now - self.window:
+            self._outcomes.popleft()
+
+    def _open(self):
+        self._probing = False
+        self._opened_at = self.clock()
+        self._outcomes.clear()
+        self._set_state(OPEN)
+
+    def call(self, fn, *args, **kwargs):
+        self.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except WeatherError as e:
+            self.record(e)
+            raise
+        except Exception:
+            self.record_success()
+            raise
+        self.record_success()
+        return result
+
+
+geocoding = CircuitBreaker("geocoding")
+forecast = CircuitBreaker("forecast")
+
+
+def states():
+    return {breaker.name: breaker.state for breaker in (geocoding, forecast)}
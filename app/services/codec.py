@@ -0,0 +1,49 @@
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Serialization of cached values. BinaryCodec writes MessagePack behind a
+# short MAGIC prefix: forecast entries are mostly float columns, which
+# MessagePack stores as fixed 9-byte values without number formatting or
+# parsing. Anything without the prefix is read as JSON, so entries written
+# by older versions (or by a worker without msgpack) stay readable.
+
+MAGIC = b"WC1"
+
+
+class JSONCodec:
+    # What every backend used before codecs existed
+    @staticmethod
+    def dumps(value):
+        return json.dumps(value)
+
+    @staticmethod
+    def loads(data):
+        return json.loads(data)
+
+
+class BinaryCodec:
+    @staticmethod
+    def dumps(value):
+        if msgpack is None:
+            return json.dumps(value).encode("utf-8")
+        return MAGIC + msgpack.packb(value, use_bin_type=True)
+
+    @staticmethod
+    def loads(data):
+        if isinstance(data, str) or bytes(data[:len(MAGIC)]) != MAGIC:
+            return json.loads(data)
+        if msgpack is None:
+            raise ValueError("Cached value is MessagePack but msgpack is not installed")
+        return msgpack.unpackb(memoryview(data)[len(MAGIC):], raw=False, strict_map_key=False)
+
+
+def get_codec(name):
+    if name == "json":
+        return JSONCodec
+    if name == "binary":
+        return BinaryCodec
+    raise ValueError(f"Unknown cache codec: {name}")
@@ -0,0 +1,135 @@
+from datetime import datetime
+from enum import Enum
+from functools import lru_cache
+from typing import NamedTuple
+
+# Which forecast variables a request asks the upstream for, and how each
+# one is exposed to callers.
+
+
+class WeatherColumn(Enum):
+    TEMP_MAX = "temperature_2m_max"
+    TEMP_MIN = "temperature_2m_min"
+    SUNRISE = "sunrise"
+    SUNSET = "sunset"
+    SHOWERS = "showers_sum"
+    SNOWFALL = "snowfall_sum"
+    PRECIP_PROB = "precipitation_probability_max"
+    PRECIP_SUM = "precipitation_sum"
+    WIND_SPEED_MAX = "wind_speed_10m_max"
+
+
+class HourlyColumn(Enum):
+    TEMPERATURE = "temperature_2m"
+    WIND_SPEED = "wind_speed_10m"
+    PRECIPITATION = "precipitation"
+    PRECIP_PROB = "precipitation_probability"
+
+
+@lru_cache(maxsize=1024)
+def format_date(value):
+    # Forecast dates repeat across every response of the week, so the
+    # parse/format round trip is done once per distinct date
+    return datetime.strptime(value, '%Y-%m-%d').strftime('%B %d')
+
+
+# Upstream column -> (field name in parsed results, per-value conversion)
+DAILY_FIELDS = {
+    WeatherColumn.TEMP_MAX.value: ('temp_max', round),
+    WeatherColumn.TEMP_MIN.value: ('temp_min', round),
+    WeatherColumn.SUNRISE.value: ('sunrise', None),
+    WeatherColumn.SUNSET.value: ('sunset', None),
+    WeatherColumn.SHOWERS.value: ('showers', None),
+    WeatherColumn.SNOWFALL.value: ('snowfall', None),
+    WeatherColumn.PRECIP_PROB.value: ('precipitation_prob', None),
+    WeatherColumn.PRECIP_SUM.value: ('precipitation', None),
+    WeatherColumn.WIND_SPEED_MAX.value: ('wind_speed_max', None),
+}
+
+HOURLY_FIELDS = {
+    HourlyColumn.TEMPERATURE.value: ('temperature', None),
+    HourlyColumn.WIND_SPEED.value: ('wind_speed', None),
+    HourlyColumn.PRECIPITATION.value: ('precipitation', None),
+    HourlyColumn.PRECIP_PROB.value: ('precipitation_prob', None),
+}
+
+# What the page has always shown
+DEFAULT_DAILY = (
+    WeatherColumn.TEMP_MAX.value,
+    WeatherColumn.TEMP_MIN.value,
+    WeatherColumn.SUNRISE.value,
+    WeatherColumn.SUNSET.value,
+    WeatherColumn.SHOWERS.value,
+    WeatherColumn.SNOWFALL.value,
+    WeatherColumn.PRECIP_PROB.value,
+)
+DEFAULT_FORECAST_DAYS = 7
+MAX_FORECAST_DAYS = 16
+
+
+def _canonical(names, allowed, kind):
+    unknown = set(names) - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown {kind} variables: {', '.join(sorted(unknown))}")
+    # Schema order, no duplicates, so equal requests share cache entries
+    return tuple(name for name in allowed if name in set(names))
+
+
+class VariableSet(NamedTuple):
+    daily: tuple = DEFAULT_DAILY
+    hourly: tuple = ()
+    forecast_days: int = DEFAULT_FORECAST_DAYS
+
+    @classmethod
+    def create(cls, daily=None, hourly=None, forecast_days=None):
+        # Validates and canonicalizes a request; raises ValueError
+        daily = DEFAULT_DAILY if daily is None else _canonical(daily, DAILY_FIELDS, "daily")
+        hourly = () if hourly is None else _canonical(hourly, HOURLY_FIELDS, "hourly")
+        if not daily and not hourly:
+            raise ValueError("At least one daily or hourly variable is required")
+        days = DEFAULT_FORECAST_DAYS if forecast_days is None else forecast_days
+        if not isinstance(days, int) or isinstance(days, bool) or not 1 <= days <= MAX_FORECAST_DAYS:
+            raise ValueError(f"forecast_days must be between 1 and {MAX_FORECAST_DAYS}")
+        return cls(daily, hourly, days)
+
+    @classmethod
+    def from_query(cls, args):
+        # Query-string form: ?daily=a,b&hourly=c&forecast_days=3
+        def names(param):
+            value = args.get(param)
+            return None if value is None else [name for name in value.split(",") if name]
+
+        days = args.get("forecast_days")
+        if days is not None:
+            try:
+                days = int(days)
+            except ValueError:
+                raise ValueError("forecast_days must be an integer")
+        return cls.create(names("daily"), names("hourly"), days)
+
+    @property
+    def params(self):
+        return variable_params(self)
+
+    @property
+    def key(self):
+        return variable_key(self)
+
+
+@lru_cache(maxsize=256)
+def variable_params(variables):
+    # Upstream query parameters, joined once per distinct variable set
+    params = {"forecast_days": variables.forecast_days}
+    if variables.daily:
+        params["daily"] = ",".join(variables.daily)
+    if variables.hourly:
+        params["hourly"] = ",".join(variables.hourly)
+    return params
+
+
+@lru_cache(maxsize=256)
+def variable_key(variables):
+    return f"{','.join(variables.daily)}|{','.join(variables.hourly)}|{variables.forecast_days}"
+
+
+DEFAULT_VARIABLES = VariableSet()
@@ -0,0 +1,186 @@
+import mmap
+import struct
+import sys
+import unicodedata
+from array import array
+
+# Offline city index built from a GeoNames-style dump (cities15000.txt and
+# friends). The index file is
+#
+#   b"GZT1" | uint32 count | count * uint32 record offsets | records
+#
+# where each record is a UTF-8 line "key\tname\tcountry\tlat\tlon\tpopulation"
+# and records are sorted by key bytes, most populous first. Lookups binary
+# search the offsets against the mmapped file, so opening an index costs one
+# read of the offset table and nothing is parsed until it is needed.
+
+MAGIC = b"GZT1"
+HEADER = struct.Struct("<4sI")
+
+# GeoNames dump columns
+NAME, ASCIINAME, ALTERNATENAMES, LATITUDE, LONGITUDE = 1, 2, 3, 4, 5
+FEATURE_CLASS, COUNTRY_CODE, POPULATION = 6, 8, 14
+
+
+def normalize(name):
+    # Case- and accent-insensitive form: "  São   Paulo" -> "sao paulo"
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+def load_country_names(path):
+    # countryInfo.txt: ISO code in column 0, country name in column 4
+    names = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            columns = line.rstrip("\n").split("\t")
+            names[columns[0]] = columns[4]
+    return names
+
+
+def build_index(dump_path, index_path, country_names=None, alternate_names=False):
+    country_names = country_names or {}
+    entries = []
+    with open(dump_path, encoding="utf-8") as f:
+        for line in f:
+            columns = line.rstrip("\n").split("\t")
+            if len(columns) <= POPULATION or columns[FEATURE_CLASS] != "P":
+                continue
+            name = columns[NAME]
+            country = country_names.get(columns[COUNTRY_CODE], columns[COUNTRY_CODE])
+            population = int(columns[POPULATION] or 0)
+            record = f"{name}\t{country}\t{columns[LATITUDE]}\t{columns[LONGITUDE]}\t{population}"
+
+            names = {name, columns[ASCIINAME]}
+            if alternate_names and columns[ALTERNATENAMES]:
+                names.update(columns[ALTERNATENAMES].split(","))
+            for key in {normalize(n) for n in names if n}:
+                if "\t" not in key:
+                    entries.append((key.encode(), -population, record))
+
+    entries.sort()
+    offsets = array("I")
+    records = bytearray()
+    for key, _, record in entries:
+        offsets.append(len(records))
+        records += key + b"\t" + record.encode() + b"\n"
+    if sys.byteorder != "little":
+        offsets.byteswap()
+
+    with open(index_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(entries)))
+        f.write(offsets.tobytes())
+        f.write(records)
+    return len(entries)
+
+
+class Gazetteer:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a gazetteer index")
+        table_end = HEADER.size + 4 * self.count
+        self._offsets = array("I")
+        self._offsets.frombytes(self._mm[HEADER.size:table_end])
+        if sys.byteorder != "little":
+            self._offsets.byteswap()
+        self._base = table_end
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._mm.close()
+
+    def _key(self, i):
+        start = self._base + self._offsets[i]
+        return self._mm[start:self._mm.find(b"\t", start)]
+
+    def _record(self, i):
+        start = self._base + self._offsets[i]
+        line = self._mm[start:self._mm.find(b"\n", start)].decode()
+        _, name, country, lat, lon, population = line.split("\t")
+        return {
+            "name": name,
+            "country": country,
+            "latitude": float(lat),
+            "longitude": float(lon),
+            "population": int(population),
+        }
+
+    def _lower_bound(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lookup(self, name):
+        # Most populous place whose name matches exactly, or None
+        key = normalize(name).encode()
+        i = self._lower_bound(key)
+        if i < self.count and self._key(i) == key:
+            return self._record(i)
+        return None
+
+    def prefix(self, query, limit=10, scan=200):
+        # Places whose name starts with query, most populous first. Only the
+        # first `scan` matching keys are considered to bound the work.
+        key = normalize(query).encode()
+        if not key:
+            return []
+        matches = []
+        i = self._lower_bound(key)
+        while i < self.count and len(matches) < scan and self._key(i).startswith(key):
+            matches.append(self._record(i))
+            i += 1
+        matches.sort(key=lambda record: -record["population"])
+
+        results = []
+        seen = set()
+        for record in matches:
+            identity = (record["name"], record["country"], record["latitude"], record["longitude"])
+            if identity not in seen:
+                seen.add(identity)
+                results.append(record)
+                if len(results) == limit:
+                    break
+        return results
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Build or query an offline city gazetteer")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="build an index from a GeoNames dump")
+    build.add_argument("dump", help="GeoNames dump, e.g. cities15000.txt")
+    build.add_argument("index", help="output index path")
+    build.add_argument("--countries", help="GeoNames countryInfo.txt for full country names")
+    build.add_argument("--alternate-names", action="store_true", help="also index alternate names")
+
+    query = commands.add_parser("lookup", help="prefix lookup against an index")
+    query.add_argument("index")
+    query.add_argument("query")
+    query.add_argument("--limit", type=int, default=10)
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        countries = load_country_names(args.countries) if args.countries else None
+        count = build_index(args.dump, args.index, countries, args.alternate_names)
+        print(f"Indexed {count} names into {args.index}")
+    else:
+        for record in Gazetteer(args.index).prefix(args.query, args.limit):
+            print(f"{record['name']}, {record['country']} ({record['latitude']}, {record['longitude']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,42 @@
-import requests
 import json
+import logging
+from app import metrics
 from app.errors import WeatherError, WeatherErrorType
+from app.config import (
+    GEO_API_URL,
+    GEO_CACHE_SIZE,
+    GEO_CACHE_TTL,
+    GEO_NEGATIVE_CACHE_TTL,
+    GEO_RESULT_COUNT,
+    GAZETTEER_PATH,
+    SUGGEST_MAX_RESULTS,
+)
+from app.services import circuit_breaker, http_client, rate_limiter, suggest
+from app.services.cache import create_cache
+from app.services.gazetteer import Gazetteer
+from app.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+geo_cache = create_cache("geo", maxsize=GEO_CACHE_SIZE, ttl=GEO_CACHE_TTL)
+geo_flight = SingleFlight()
+_gazetteer = None
+_gazetteer_loaded = False
+
+def get_gazetteer():
+    global _gazetteer, _gazetteer_loaded
+    if not _gazetteer_loaded:
+        _gazetteer_loaded = True
+        if GAZETTEER_PATH:
+            try:
+                _gazetteer = Gazetteer(GAZETTEER_PATH)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Gazetteer {GAZETTEER_PATH} unavailable: {e}")
+    return _gazetteer
 
 class GeoModel:
+    __slots__ = ("name", "country", "latitude", "longitude")
+
     def __init__(self):
         self.name = None
         self.country = None
@@ -13,10 +47,18 @@ class GeoModel:
         return f"name: {self.name}, country: {self.country}"
 
     @staticmethod
-    def get_url(name):
-        formatted = name.strip()
+    def normalize_name(name):
+        return " ".join(name.split())
+
+    @staticmethod
+    def cache_key(name):
+        return GeoModel.normalize_name(name).casefold()
+
+    @staticmethod
+    def get_url(name, count=1):
+        formatted = GeoModel.normalize_name(name)
         formatted = formatted.replace(" ", "+")
-        return f"https://geocoding-api.open-meteo.com/v1/search?name={formatted}&count=1&language=en&format=json"
+        return f"{GEO_API_URL}?name={formatted}&count={count}&language=en&format=json"
 
     def save_country_geo(self, data):
         self.name = data["name"]
@@ -24,37 +66,140 @@ class GeoModel:
         self.latitude = data["latitude"]
         self.longitude = data["longitude"]
 
-def fetch(url):
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "country": self.country,
+            "latitude": self.latitude,
+            "longitude": self.longitude
+        }
+
+def handle_response(response):
+    if response.status_code == 200:
+        try:
+            return response.json()
+        except (json.JSONDecodeError, ValueError) as e:  # Add ValueError to catch exceptions
+            raise WeatherError(WeatherErrorType.INVALID_DATA, f"Invalid response from geocoding service: {str(e)}")
+    elif response.status_code == 404:
+        raise WeatherError(WeatherErrorType.CITY_NOT_FOUND, "City not found in geocoding service")
+    elif response.status_code == 429:
+        raise WeatherError(WeatherErrorType.RATE_LIMITED, "Geocoding API rate limit exceeded")
+    else:
+        raise WeatherError(WeatherErrorType.API_ERROR, 
+                         f"Geocoding API error: {response.status_code}")
+
+def _fetch(url):
+    rate_limiter.upstream.acquire()
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            try:
-                return response.json()
-            except (json.JSONDecodeError, ValueError) as e:  # Add ValueError to catch exceptions
-                raise WeatherError(WeatherErrorType.INVALID_DATA, f"Invalid response from geocoding service: {str(e)}")
-        elif response.status_code == 404:
-            raise WeatherError(WeatherErrorType.CITY_NOT_FOUND, "City not found in geocoding service")
-        else:
-            raise WeatherError(WeatherErrorType.API_ERROR, 
-                             f"Geocoding API error: {response.status_code}")
-    except requests.exceptions.ConnectionError:
+        response = http_client.get(url, upstream="geocoding")
+    except http_client.NETWORK_EXCEPTIONS:
         raise WeatherError(WeatherErrorType.NETWORK_ERROR, "Could not connect to geocoding service")
+    if response.status_code == 429:
+        rate_limiter.upstream.throttled(response.headers.get("Retry-After"))
+    return handle_response(response)
+
+def fetch(url):
+    # Fails fast while the geocoding upstream is known to be down
+    return circuit_breaker.geocoding.call(_fetch, url)
+
+def cache_lookup_result(key, json_data, name):
+    if not json_data.get("results"):
+        # Short-lived negative entry so repeated typos skip the upstream
+        geo_cache.set(key, {"error": WeatherErrorType.CITY_NOT_FOUND.value},
+                      ttl=GEO_NEGATIVE_CACHE_TTL)
+        raise WeatherError(WeatherErrorType.CITY_NOT_FOUND, f"No results found for {name}")
+    # Every result is remembered for suggestions, the first one is the answer
+    index = suggest.get_index()
+    for result in json_data["results"]:
+        index.add(result)
+    geo = GeoModel()
+    geo.save_country_geo(json_data["results"][0])
+    data = geo.to_dict()
+    geo_cache.set(key, data)
+    return data
+
+def local_lookup(name, key):
+    # Resolves a name without the network: the offline gazetteer first, then
+    # the cache. Returns a location dict, None on a miss, or raises for a
+    # negatively cached name.
+    gazetteer = get_gazetteer()
+    if gazetteer is not None:
+        data = gazetteer.lookup(name)
+        if data is not None:
+            metrics.CACHE_REQUESTS.inc(cache="gazetteer", result="hit")
+            return data
+    data = geo_cache.get(key)
+    metrics.CACHE_REQUESTS.inc(cache="geo", result="miss" if data is None else "hit")
+    if data is not None and data.get("error"):
+        raise WeatherError(WeatherErrorType(data["error"]), f"No results found for {name}")
+    return data
+
+def _lookup(name, key):
+    return cache_lookup_result(key, fetch(GeoModel.get_url(name, GEO_RESULT_COUNT)), name)
 
 def get_geo(name):
     if not name or not name.strip():
         raise WeatherError(WeatherErrorType.CITY_NOT_FOUND, "Empty city name provided")
     
-    geo = GeoModel()
+    key = GeoModel.cache_key(name)
     try:
-        json_data = fetch(geo.get_url(name))
-        if not json_data.get("results"):
-            raise WeatherError(WeatherErrorType.CITY_NOT_FOUND, f"No results found for {name}")
-        geo.save_country_geo(json_data["results"][0])
+        data = local_lookup(name, key)
+        if data is None:
+            # Concurrent lookups of the same city share one upstream call
+            data = geo_flight.do(key, _lookup, name, key)
+        suggest.get_index().record_hit(data)
+        geo = GeoModel()
+        geo.save_country_geo(data)
         return geo
     except WeatherError:
         raise
     except Exception as e:
         raise WeatherError(WeatherErrorType.SERVER_ERROR, str(e))
 
+def refresh_geo(name):
+    # Like get_geo but skips the cache so an entry about to expire is
+    # replaced; names the offline gazetteer knows never need refreshing
+    key = GeoModel.cache_key(name)
+    gazetteer = get_gazetteer()
+    data = gazetteer.lookup(name) if gazetteer is not None else None
+    if data is None:
+        data = geo_flight.do(key, _lookup, name, key)
+    geo = GeoModel()
+    geo.save_country_geo(data)
+    return geo
+
+def warm_suggestions():
+    # A worker's suggestion index starts empty; fill it with every place the
+    # instance has already resolved so a recycled worker suggests the same
+    # cities as its siblings. Returns the number of places added.
+    try:
+        cached = geo_cache.values()
+    except Exception as e:
+        logger.warning(f"Could not read the geocoding cache for suggestions: {e}")
+        return 0
+    index = suggest.get_index()
+    count = 0
+    for data in cached:
+        if not data.get("error"):
+            index.add(data)
+            count += 1
+    logger.info(f"Loaded {count} cached places into the suggestion index")
+    return count
+
+def suggest_cities(query, limit=SUGGEST_MAX_RESULTS):
+    # Never calls the upstream: the suggestion index first, topped up from
+    # the offline gazetteer when one is configured
+    results = suggest.get_index().suggest(query, limit)
+    gazetteer = get_gazetteer()
+    if gazetteer is not None and len(results) < limit:
+        seen = {(r["name"], r["country"]) for r in results}
+        for record in gazetteer.prefix(query, limit):
+            if (record["name"], record["country"]) not in seen:
+                seen.add((record["name"], record["country"]))
+                results.append({k: record[k] for k in ("name", "country", "latitude", "longitude")})
+                if len(results) == limit:
+                    break
+    return results
+
 if __name__ == "__main__":
     print(get_geo("haifa"))
@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app import metrics
+from app.config import (
+    HTTP_POOL_SIZE,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_RETRIES,
+    HTTP_BACKOFF_FACTOR,
+    HTTP_BACKOFF_JITTER,
+)
+
+# Errors callers should report as NETWORK_ERROR: refused/reset connections,
+# exhausted retries and connect/read timeouts
+NETWORK_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    retry = Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=HTTP_RETRIES,
+        status=HTTP_RETRIES,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        backoff_jitter=HTTP_BACKOFF_JITTER,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    # One keep-alive pool per process; gunicorn forks workers after import,
+    # and sockets inherited from the parent must not be shared
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+def get(url, upstream="upstream", **kwargs):
+    # `upstream` names the service in metrics
+    kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    start = time.perf_counter()
+    try:
+        response = get_session().get(url, **kwargs)
+    except NETWORK_EXCEPTIONS:
+        metrics.observe_upstream(upstream, "error", time.perf_counter() - start)
+        raise
+    metrics.observe_upstream(upstream, response.status_code, time.perf_counter() - start)
+    return response
+
+
+def pool_stats():
+    # Keep-alive pools of this process's session, one per upstream host
+    session = _session if _session_pid == os.getpid() else None
+    if session is None:
+        return {}
+    pools = session.get_adapter("https://").poolmanager.pools
+    stats = {}
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        # The queue holds idle connections and None for unopened slots;
+        # whatever is missing from it is checked out
+        idle = sum(conn is not None for conn in list(pool.pool.queue))
+        stats[pool.host] = {
+            "size": pool.pool.maxsize,
+            "in_use": pool.pool.maxsize - pool.pool.qsize(),
+            "idle": idle,
+        }
+    return stats
@@ -0,0 +1,263 @@
+import fcntl
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from app import metrics
+from app.config import (
+    CACHE_BACKEND,
+    CACHE_PATH,
+    FORECAST_UPDATE_DELAY,
+    FORECAST_UPDATE_INTERVAL,
+    FORECAST_STALE_TTL,
+    GEO_CACHE_TTL,
+    HOT_CITIES,
+    HOT_CITIES_FILE,
+    PREFETCH_ENABLED,
+    PREFETCH_LEAD_TIME,
+    PREFETCH_RETRY_INTERVAL,
+    PREFETCH_WARMUP_TIMEOUT,
+)
+from app.errors import WeatherError, WeatherErrorType
+from app.services import circuit_breaker, geo_service, rate_limiter
+from app.services.cache import create_cache, redis_client
+from app.services.forecast_variables import DEFAULT_VARIABLES
+from app.services.geo_service import GeoModel
+from app.services.weather_service import (
+    WeatherService,
+    forecast_cache,
+    forecast_key,
+    next_forecast_update,
+    read_cities,
+)
+
+# Keeps the forecasts (and geocodes) of a configured hot-city list in the
+# cache so requests for them never wait on the upstream. A scheduler thread
+# wakes shortly before the cached forecasts go stale and refreshes every hot
+# forecast due by then with multi-location requests. FORECAST_UPDATE_DELAY
+# is a conservative estimate of when a model run is published, so the lead
+# never reaches back before the run's boundary.
+#
+# With a shared cache backend only one process runs the refresh loop: per
+# host with sqlite (the holder of an flock next to the cache), across every
+# host with redis (the holder of a lease key it renews while alive). The
+# other workers wait for its warm-up marker and take over if the leader
+# goes away.
+
+logger = logging.getLogger(__name__)
+
+LEAD_TIME = min(PREFETCH_LEAD_TIME, FORECAST_UPDATE_DELAY)
+
+# Failures worth retrying before the next scheduled pass
+RETRY_ERRORS = circuit_breaker.TRIPPING_ERRORS + (WeatherErrorType.RATE_LIMITED,)
+
+PREFETCH_REFRESHES = metrics.Counter("weather_prefetch_refreshes_total", "Hot-city refreshes by kind and result")
+
+_state_cache = create_cache("prefetch", maxsize=16, ttl=FORECAST_UPDATE_INTERVAL + FORECAST_STALE_TTL)
+_WARM_KEY = "warm"
+
+LEASE_KEY = "weather:prefetch_leader"
+LEASE_SECONDS = 30
+
+
+def hot_cities():
+    cities = list(HOT_CITIES)
+    if HOT_CITIES_FILE:
+        try:
+            with open(HOT_CITIES_FILE) as f:
+                cities.extend(read_cities(f))
+        except OSError as e:
+            logger.warning(f"Hot city list {HOT_CITIES_FILE} unavailable: {e}")
+    return list(dict.fromkeys(cities))
+
+
+class Prefetcher:
+    def __init__(self, cities, variables=DEFAULT_VARIABLES, shared=None, lock_path=None, client=None):
+        # `client` is a Redis client to hold the lease with instead of the
+        # flock; the redis backend's own by default
+        self.cities = cities
+        self.variables = variables
+        self.shared = CACHE_BACKEND != "memory" if shared is None else shared
+        self.lock_path = lock_path or f"{CACHE_PATH}.prefetch.lock"
+        if client is None and self.shared and CACHE_BACKEND == "redis":
+            client = redis_client()
+        self._client = client
+        self._lease_token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        self.warm = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+        self._geo_due = {}
+        # Set by run_once when a refresh failed in a way worth retrying
+        self.retrying = False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="prefetcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        if self._client is not None:
+            self._release_lease()
+
+    def _acquire_leadership(self):
+        # Also renews it for the current leader
+        if not self.shared:
+            return True
+        if self._client is not None:
+            return self._acquire_lease()
+        if self._lock_file is None:
+            os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+            self._lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def _acquire_lease(self):
+        from redis.exceptions import RedisError, WatchError
+        try:
+            with self._client.pipeline() as pipe:
+                pipe.watch(LEASE_KEY)
+                holder = pipe.get(LEASE_KEY)
+                if holder is not None and holder.decode() != self._lease_token:
+                    return False
+                pipe.multi()
+                pipe.set(LEASE_KEY, self._lease_token, px=LEASE_SECONDS * 1000)
+                pipe.execute()
+                return True
+        except WatchError:
+            return False
+        except RedisError as e:
+            logger.warning(f"Prefetch lease unavailable: {e}")
+            return False
+
+    def _release_lease(self):
+        # Lets a follower take over at once instead of after the lease expires
+        from redis.exceptions import RedisError, WatchError
+        try:
+            with self._client.pipeline() as pipe:
+                pipe.watch(LEASE_KEY)
+                if pipe.get(LEASE_KEY) == self._lease_token.encode():
+                    pipe.multi()
+                    pipe.delete(LEASE_KEY)
+                    pipe.execute()
+        except (WatchError, RedisError):
+            pass
+
+    def _run(self):
+        deadline = time.monotonic() + PREFETCH_WARMUP_TIMEOUT
+        next_pass = 0
+        while not self._stop.is_set():
+            if not self._acquire_leadership():
+                next_pass = 0
+                if not self.warm.is_set() and (_state_cache.get(_WARM_KEY) or time.monotonic() >= deadline):
+                    self.warm.set()
+                self._stop.wait(1 if not self.warm.is_set() else PREFETCH_RETRY_INTERVAL)
+                continue
+            if time.monotonic() >= next_pass:
+                next_pass = time.monotonic() + self._refresh(deadline)
+            # Wake up in time to renew the lease
+            self._stop.wait(max(min(next_pass - time.monotonic(), LEASE_SECONDS / 3), 0))
+
+    def _refresh(self, deadline):
+        # One pass as the leader; returns the seconds until the next one
+        try:
+            with rate_limiter.priority(rate_limiter.BATCH):
+                delay = self.run_once()
+            succeeded = not self.retrying
+        except Exception as e:
+            logger.error(f"Hot city refresh failed: {e}", exc_info=True)
+            delay = PREFETCH_RETRY_INTERVAL
+            succeeded = False
+        if not self.warm.is_set():
+            if succeeded:
+                _state_cache.set(_WARM_KEY, time.time())
+                self.warm.set()
+                logger.info(f"Warm-up of {len(self.cities)} hot cities finished")
+            elif time.monotonic() >= deadline:
+                self.warm.set()
+                logger.warning(f"Warm-up of hot cities incomplete after {PREFETCH_WARMUP_TIMEOUT}s, reporting ready")
+            else:
+                delay = min(delay, max(deadline - time.monotonic(), 0.1))
+        return delay
+
+    def _resolve(self, city, now):
+        # Geocodes are re-fetched ahead of their cache expiry, leaving a
+        # couple of refresh cycles of margin
+        key = GeoModel.cache_key(city)
+        if now < self._geo_due.get(key, 0):
+            return geo_service.get_geo(city)
+        geo = geo_service.refresh_geo(city)
+        self._geo_due[key] = now + max(GEO_CACHE_TTL - 2 * FORECAST_UPDATE_INTERVAL, 0)
+        PREFETCH_REFRESHES.inc(kind="geocode", result="ok")
+        return geo
+
+    def run_once(self):
+        # One refresh pass over every forecast that is missing or goes stale
+        # within the lead time; returns the seconds until the next one is due
+        now = time.time()
+        horizon = now + LEAD_TIME
+        retry = False
+        due = {}
+        for city in self.cities:
+            try:
+                geo = self._resolve(city, now)
+            except WeatherError as e:
+                PREFETCH_REFRESHES.inc(kind="geocode", result="error")
+                logger.warning(f"Could not resolve hot city {city}: {e}")
+                retry = retry or e.error_type in RETRY_ERRORS
+                continue
+            key = forecast_key(geo.latitude, geo.longitude, self.variables)
+            entry = forecast_cache.get(key)
+            if entry is None or entry["fresh_until"] <= horizon:
+                due.setdefault(key, geo)
+
+        if due:
+            results = WeatherService().refresh_batch(list(due.values()), self.variables, as_of=horizon)
+            for key, result in results.items():
+                if isinstance(result, WeatherError):
+                    PREFETCH_REFRESHES.inc(kind="forecast", result="error")
+                    logger.warning(f"Could not refresh hot forecast {key}: {result}")
+                    retry = retry or result.error_type in RETRY_ERRORS
+                else:
+                    PREFETCH_REFRESHES.inc(kind="forecast", result="ok")
+
+        self.retrying = retry
+        now = time.time()
+        delay = next_forecast_update(now + LEAD_TIME) - LEAD_TIME - now
+        if retry:
+            delay = min(delay, PREFETCH_RETRY_INTERVAL)
+        return max(delay, 1)
+
+
+_prefetcher = None
+_prefetcher_pid = None
+
+
+def start():
+    # Called from wsgi.py (once per gunicorn worker) and the ASGI lifespan.
+    # Threads don't survive fork, so a child gets its own prefetcher.
+    global _prefetcher, _prefetcher_pid
+    if _prefetcher is not None and _prefetcher_pid == os.getpid():
+        return _prefetcher
+    cities = hot_cities()
+    if not PREFETCH_ENABLED or not cities:
+        return None
+    _prefetcher = Prefetcher(cities)
+    _prefetcher_pid = os.getpid()
+    _prefetcher.start()
+    return _prefetcher
+
+
+def is_ready():
+    return _prefetcher is None or _prefetcher.warm.is_set()
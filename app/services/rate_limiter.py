@@ -0,0 +1,349 @@
+import heapq
+import itertools
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app import metrics
+from app.config import (
+    CACHE_BACKEND,
+    CACHE_PATH,
+    UPSTREAM_BATCH_MAX_WAIT,
+    UPSTREAM_BURST,
+    UPSTREAM_MAX_WAIT,
+    UPSTREAM_QUEUE_SIZE,
+    UPSTREAM_RATE,
+)
+from app.errors import WeatherError, WeatherErrorType
+from app.services.cache import redis_client
+
+# Admission control in front of the upstream APIs. Every geocoding or
+# forecast call takes a token from a bucket refilled at UPSTREAM_RATE per
+# second. With the sqlite cache backend the bucket lives in the cache's
+# SQLite file, so all workers on the host draw from one quota; with redis it
+# is a key on the server, shared by every host using it. Callers that find it
+# empty wait in a bounded per-process queue where page requests go ahead of
+# batch and prefetch work. Once the queue is full, or the next token won't
+# come within the caller's wait budget, the call fails at once with
+# RATE_LIMITED instead of piling onto a throttled upstream.
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# Async waiters can't be notified by the thread condition, they poll
+ASYNC_POLL_INTERVAL = 0.02
+
+UPSTREAM_QUEUED = metrics.Gauge("weather_upstream_queue_depth", "Upstream calls waiting for a rate-limit token")
+UPSTREAM_SHED = metrics.Counter("weather_upstream_shed_total", "Upstream calls rejected by the rate limiter")
+
+_priority = ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level):
+    # Upstream calls made inside the block (in this thread or task) queue
+    # with the given priority
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    # Per-process bucket
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._tokens = float(self.capacity)
+            self._updated_at = self.clock()
+
+    def take(self):
+        # Takes a token and returns 0, or returns the seconds until one is due
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def wait_time(self):
+        # Seconds until a token is due, without taking it
+        with self._lock:
+            tokens = min(self.capacity, self._tokens + (self.clock() - self._updated_at) * self.rate)
+            return max(0, (1 - tokens) / self.rate)
+
+    def drain(self, seconds):
+        # Upstream throttled us: no tokens for `seconds`
+        with self._lock:
+            self._tokens = min(self._tokens, -seconds * self.rate)
+            self._updated_at = self.clock()
+
+
+class SQLiteTokenBucket:
+    # Bucket shared by every process using the same SQLite file
+    def __init__(self, path, name, rate, capacity, clock=time.time):
+        self.path = path
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _update(self, change):
+        # Runs change(tokens, now) -> (tokens, result) in one write transaction
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = self.clock()
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + (now - row[1]) * self.rate)
+            tokens, result = change(tokens, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (self.name, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def reset(self):
+        self._connection().execute("DELETE FROM rate_buckets WHERE name = ?", (self.name,))
+
+    def take(self):
+        def change(tokens, now):
+            if tokens >= 1:
+                return tokens - 1, 0
+            return tokens, (1 - tokens) / self.rate
+        return self._update(change)
+
+    def wait_time(self):
+        return self._update(lambda tokens, now: (tokens, max(0, (1 - tokens) / self.rate)))
+
+    def drain(self, seconds):
+        self._update(lambda tokens, now: (min(tokens, -seconds * self.rate), None))
+
+
+class RedisTokenBucket:
+    # Bucket shared by every process using the same Redis server. Updates
+    # are optimistic transactions on one hash, retried when another process
+    # got there first. Hosts' clocks are assumed to be NTP-synced.
+    def __init__(self, client, name, rate, capacity, clock=time.time):
+        self.key = f"weather:rate_buckets:{name}"
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._client = client
+
+    def _update(self, change):
+        from redis.exceptions import WatchError
+        with self._client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.key)
+                    tokens, updated_at = pipe.hmget(self.key, "tokens", "updated_at")
+                    now = self.clock()
+                    if tokens is None:
+                        tokens = self.capacity
+                    else:
+                        tokens = min(self.capacity, float(tokens) + (now - float(updated_at)) * self.rate)
+                    tokens, result = change(tokens, now)
+                    pipe.multi()
+                    pipe.hset(self.key, mapping={"tokens": tokens, "updated_at": now})
+                    # A bucket left alone refills completely; let it go then
+                    pipe.expire(self.key, int((self.capacity - tokens) / self.rate) + 60)
+                    pipe.execute()
+                    return result
+                except WatchError:
+                    continue
+
+    def reset(self):
+        self._client.delete(self.key)
+
+    def take(self):
+        def change(tokens, now):
+            if tokens >= 1:
+                return tokens - 1, 0
+            return tokens, (1 - tokens) / self.rate
+        return self._update(change)
+
+    def wait_time(self):
+        return self._update(lambda tokens, now: (tokens, max(0, (1 - tokens) / self.rate)))
+
+    def drain(self, seconds):
+        self._update(lambda tokens, now: (min(tokens, -seconds * self.rate), None))
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "shed")
+
+    def __init__(self, priority, seq):
+        self.priority = priority
+        self.seq = seq
+        self.shed = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class RateLimiter:
+    def __init__(self, bucket, max_queue=UPSTREAM_QUEUE_SIZE,
+                 max_wait=(UPSTREAM_MAX_WAIT, UPSTREAM_BATCH_MAX_WAIT), clock=time.monotonic):
+        # `max_wait` is indexed by priority
+        self.bucket = bucket
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+
+    def reset(self):
+        # Refills the bucket and wakes the queue
+        self.bucket.reset()
+        with self._cond:
+            self._cond.notify_all()
+
+    def _shed(self, level, reason):
+        UPSTREAM_SHED.inc(priority=PRIORITY_NAMES[level], reason=reason)
+        raise WeatherError(WeatherErrorType.RATE_LIMITED, f"Upstream rate limit: {reason}")
+
+    def _enter(self, level):
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                # A full queue first sheds its last lower-priority waiter
+                victim = max(self._queue)
+                if victim.priority <= level:
+                    self._shed(level, "queue_full")
+                victim.shed = True
+                self._queue.remove(victim)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+            waiter = _Waiter(level, next(self._seq))
+            heapq.heappush(self._queue, waiter)
+            UPSTREAM_QUEUED.set(len(self._queue))
+            return waiter, self.clock() + self.max_wait[level]
+
+    def _poll(self, waiter, deadline):
+        # Call with the condition held. Returns 0 once admitted, otherwise
+        # the seconds to wait before polling again.
+        if waiter.shed:
+            self._shed(waiter.priority, "queue_full")
+        remaining = deadline - self.clock()
+        if self._queue[0] is waiter:
+            wait = self.bucket.take()
+            if not wait:
+                return 0
+            if wait > remaining:
+                self._shed(waiter.priority, "timeout")
+            return wait
+        if remaining <= 0:
+            self._shed(waiter.priority, "timeout")
+        return remaining
+
+    def _poll_locked(self, waiter, deadline):
+        with self._cond:
+            return self._poll(waiter, deadline)
+
+    def _leave(self, waiter):
+        with self._cond:
+            if waiter in self._queue:
+                self._queue.remove(waiter)
+                heapq.heapify(self._queue)
+            UPSTREAM_QUEUED.set(len(self._queue))
+            self._cond.notify_all()
+
+    def acquire(self, level=None):
+        level = _priority.get() if level is None else level
+        waiter, deadline = self._enter(level)
+        try:
+            with self._cond:
+                while True:
+                    wait = self._poll(waiter, deadline)
+                    if not wait:
+                        return
+                    self._cond.wait(wait)
+        finally:
+            self._leave(waiter)
+
+    async def _offload(self, fn, *args):
+        # A shared bucket is a SQLite write or a Redis round trip, and a sync
+        # caller may hold the condition while it waits on either; keep both
+        # off the event loop
+        import asyncio
+        if isinstance(self.bucket, TokenBucket):
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    async def acquire_async(self, level=None):
+        import asyncio
+        level = _priority.get() if level is None else level
+        waiter, deadline = await self._offload(self._enter, level)
+        try:
+            while True:
+                wait = await self._offload(self._poll_locked, waiter, deadline)
+                if not wait:
+                    return
+                await asyncio.sleep(min(wait, ASYNC_POLL_INTERVAL))
+        finally:
+            await self._offload(self._leave, waiter)
+
+    def retry_after(self):
+        # Whole seconds a shed caller should wait: until the bucket refills
+        # and the calls queued here have had their tokens
+        with self._cond:
+            queued = len(self._queue)
+        return max(1, math.ceil(self.bucket.wait_time() + queued / self.bucket.rate))
+
+    def throttled(self, retry_after=None):
+        # The upstream answered 429: stop spending tokens until it allows
+        # requests again (Retry-After seconds, or one full refill)
+        try:
+            seconds = float(retry_after)
+        except (TypeError, ValueError):
+            seconds = self.bucket.capacity / self.bucket.rate
+        self.bucket.drain(seconds)
+
+
+def create_bucket(name, rate=UPSTREAM_RATE, capacity=UPSTREAM_BURST):
+    if CACHE_BACKEND == "memory":
+        return TokenBucket(rate, capacity)
+    if CACHE_BACKEND == "redis":
+        return RedisTokenBucket(redis_client(), name, rate, capacity)
+    return SQLiteTokenBucket(CACHE_PATH, name, rate, capacity)
+
+
+# Open-Meteo counts geocoding and forecast calls against one quota
+upstream = RateLimiter(create_bucket("open_meteo"))
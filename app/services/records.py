@@ -0,0 +1,63 @@
+from functools import lru_cache
+
+# Compact row types for parsed forecasts. A forecast day or hour is a
+# slotted object instead of a dict, one class per field layout. Rows read
+# like dicts (row["temp_max"]), which is all the templates need; JSON
+# responses turn them into plain dicts through json_default().
+
+
+class Record:
+    __slots__ = ()
+    _fields = ()
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self._fields else default
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def keys(self):
+        return self._fields
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self._fields}
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return self._fields == other._fields and self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+@lru_cache(maxsize=256)
+def record_type(fields):
+    # One class per distinct field tuple, e.g. the default daily columns.
+    # Like namedtuple, __init__ is generated so building a row is a plain
+    # positional call.
+    if not all(field.isidentifier() for field in fields):
+        raise ValueError(f"Invalid record fields: {fields}")
+    arguments = ", ".join(fields)
+    body = "".join(f"    self.{field} = {field}\n" for field in fields) or "    pass\n"
+    namespace = {}
+    exec(f"def __init__(self, {arguments}):\n{body}", namespace)
+    return type("ForecastRecord", (Record,), {
+        "__slots__": fields,
+        "_fields": fields,
+        "__init__": namespace["__init__"],
+    })
+
+
+def json_default(value):
+    # `default=` hook for json.dumps and the Flask JSON provider
+    if isinstance(value, Record):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
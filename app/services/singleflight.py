@@ -0,0 +1,80 @@
+import threading
+
+from app.errors import WeatherError
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished = False
+
+
+# Collapses concurrent calls for the same key into one: the first caller
+# runs the function, everyone arriving while it is in flight waits for it
+# and gets the same result or error. If the leader is killed before the
+# function returns or raises (GreenletExit, a worker timeout), the waiters
+# try again rather than return a result that was never set.
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+            if leader:
+                break
+
+            call.done.wait()
+            if not call.finished:
+                continue
+            if call.error is not None:
+                if isinstance(call.error, WeatherError):
+                    # Fresh instance so waiters don't share one traceback
+                    raise WeatherError(call.error.error_type, str(call.error))
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            call.finished = True
+            return call.result
+        except Exception as e:
+            call.error = e
+            call.finished = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+# asyncio flavour of SingleFlight: waiters await the leader's task. Must be
+# used from a single event loop. asyncio is imported on first use so the
+# WSGI app doesn't load it at startup.
+class AsyncSingleFlight:
+    def __init__(self):
+        self._tasks = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        import asyncio
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        # Shield so one cancelled waiter doesn't cancel the shared call
+        return await asyncio.shield(task)
+
+    def in_flight(self):
+        return len(self._tasks)
@@ -0,0 +1,196 @@
+import logging
+import threading
+
+from app.config import SUGGEST_MAX_ENTRIES, SUGGEST_MAX_RESULTS, SUGGEST_SEED_PATH
+from app.services.gazetteer import normalize
+
+# In-memory prefix trie over every place we have resolved, for city
+# suggestions. Each node keeps its best `max_results` places already ranked
+# (most looked up, then most populous), so a query costs one walk down the
+# trie. Multi-word names are also indexed from each later word ("york" finds
+# "New York"). When a prefix finds too little, places within one edit of the
+# query are added, which catches most typos.
+
+logger = logging.getLogger(__name__)
+
+
+class _Node:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.top = []
+
+
+def _rank(entry):
+    return (-entry["hits"], -entry["population"], entry["name"])
+
+
+def _public(entry):
+    return {
+        "name": entry["name"],
+        "country": entry["country"],
+        "latitude": entry["latitude"],
+        "longitude": entry["longitude"],
+    }
+
+
+class SuggestIndex:
+    def __init__(self, max_results=SUGGEST_MAX_RESULTS, max_entries=SUGGEST_MAX_ENTRIES):
+        self.max_results = max_results
+        self.max_entries = max_entries
+        self.root = _Node()
+        self.entries = {}
+        # Writers serialize; readers never lock since node lists are
+        # replaced, not mutated
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _keys(name):
+        words = normalize(name).split(" ")
+        return {" ".join(words[i:]) for i in range(len(words))} - {""}
+
+    def add(self, record, hits=0):
+        # `record` is a geocoding result (name, country, latitude, longitude
+        # and optionally population); `hits` counts lookups that chose it
+        identity = (normalize(record["name"]), record.get("country"),
+                    round(record["latitude"], 2), round(record["longitude"], 2))
+        with self._lock:
+            entry = self.entries.get(identity)
+            if entry is None:
+                entry = self.entries[identity] = {
+                    "name": record["name"],
+                    "country": record.get("country"),
+                    "latitude": record["latitude"],
+                    "longitude": record["longitude"],
+                    "population": int(record.get("population") or 0),
+                    "hits": 0,
+                }
+            elif not hits:
+                return
+            entry["hits"] += hits
+            self._insert(self.root, entry)
+            if len(self.entries) > self.max_entries:
+                self._evict()
+
+    def _insert(self, root, entry):
+        for key in self._keys(entry["name"]):
+            node = root
+            for char in key:
+                node = node.children.setdefault(char, _Node())
+                self._promote(node, entry)
+
+    def _promote(self, node, entry):
+        # Most hits leave a node's order as it was; only re-rank when the
+        # entry moves up or newly makes the list
+        rank = _rank(entry)
+        top = node.top
+        for i, current in enumerate(top):
+            if current is entry:
+                if i == 0 or _rank(top[i - 1]) <= rank:
+                    return
+                break
+        else:
+            if len(top) >= self.max_results and _rank(top[-1]) <= rank:
+                return
+            top = top + [entry]
+        node.top = sorted(top, key=_rank)[:self.max_results]
+
+    def _evict(self):
+        # Call with the lock held. Drops the lowest-ranked tenth in one go
+        # and builds a new trie from the rest, since a node's list can't be
+        # refilled without its cut-off candidates; readers keep the old trie
+        # until the swap.
+        keep = sorted(self.entries.items(), key=lambda item: _rank(item[1]))[:self.max_entries * 9 // 10]
+        root = _Node()
+        for _, entry in keep:
+            self._insert(root, entry)
+        self.entries = dict(keep)
+        self.root = root
+
+    def record_hit(self, record):
+        self.add(record, hits=1)
+
+    def _find(self, key):
+        node = self.root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def _fuzzy(self, key, max_distance=1):
+        # Levenshtein rows carried down the trie; a node whose path is
+        # within max_distance of the whole query contributes its top places
+        matches = []
+        stack = [(child, char, list(range(len(key) + 1))) for char, child in self.root.children.items()]
+        while stack:
+            node, char, previous = stack.pop()
+            row = [previous[0] + 1]
+            for i in range(1, len(key) + 1):
+                row.append(min(row[i - 1] + 1, previous[i] + 1, previous[i - 1] + (key[i - 1] != char)))
+            if row[-1] <= max_distance:
+                matches.extend(node.top)
+            elif min(row) <= max_distance:
+                stack.extend((grandchild, c, row) for c, grandchild in node.children.items())
+        return sorted(matches, key=_rank)
+
+    def suggest(self, query, limit=None):
+        limit = min(limit or self.max_results, self.max_results)
+        key = normalize(query)
+        if not key:
+            return []
+        node = self._find(key)
+        candidates = list(node.top) if node is not None else []
+        if len(candidates) < limit and len(key) >= 3:
+            candidates += self._fuzzy(key)
+
+        results = []
+        seen = set()
+        for entry in candidates:
+            if id(entry) not in seen:
+                seen.add(id(entry))
+                results.append(_public(entry))
+                if len(results) == limit:
+                    break
+        return results
+
+
+def load_seed(index, path):
+    count = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            columns = line.rstrip("\n").split("\t")
+            if len(columns) < 4 or line.startswith("#"):
+                continue
+            index.add({
+                "name": columns[0],
+                "country": columns[1],
+                "latitude": float(columns[2]),
+                "longitude": float(columns[3]),
+                "population": int(columns[4]) if len(columns) > 4 and columns[4] else 0,
+            })
+            count += 1
+    return count
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = SuggestIndex()
+                if SUGGEST_SEED_PATH:
+                    try:
+                        logger.info(f"Loaded {load_seed(index, SUGGEST_SEED_PATH)} suggestion seeds")
+                    except (OSError, ValueError) as e:
+                        logger.warning(f"Suggestion seed {SUGGEST_SEED_PATH} unavailable: {e}")
+                _index = index
+    return _index
@@ -1,117 +1,446 @@
-import requests
 import json
-from datetime import datetime
-from enum import Enum
-from app.errors import WeatherError, WeatherErrorType
-from app.services.geo_service import get_geo
-
-class WeatherColumn(Enum):
-    TEMP_MAX = "temperature_2m_max"
-    TEMP_MIN = "temperature_2m_min"
-    SUNRISE = "sunrise"
-    SUNSET = "sunset"
-    SHOWERS = "showers_sum"
-    SNOWFALL = "snowfall_sum"
-    PRECIP_PROB = "precipitation_probability_max"
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from app import metrics
+from app.errors import WeatherError, WeatherErrorType, get_user_message
+from app.config import (
+    BATCH_GEO_CONCURRENCY,
+    EXPORT_CONCURRENCY,
+    FORECAST_BATCH_SIZE,
+    FORECAST_API_URL,
+    FORECAST_CACHE_SIZE,
+    FORECAST_GRID_DEGREES,
+    FORECAST_UPDATE_INTERVAL,
+    FORECAST_UPDATE_DELAY,
+    FORECAST_STALE_TTL,
+)
+from app.services import circuit_breaker, geo_service, http_client, rate_limiter
+from app.services.cache import create_cache
+from app.services.forecast_variables import (
+    DAILY_FIELDS,
+    DEFAULT_VARIABLES,
+    HOURLY_FIELDS,
+    format_date,
+)
+from app.services.geo_service import GeoModel
+from app.services.records import json_default, record_type
+from app.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+forecast_cache = create_cache("forecast", maxsize=FORECAST_CACHE_SIZE, ttl=FORECAST_UPDATE_INTERVAL)
+forecast_flight = SingleFlight()
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def forecast_key(lat, lon, variables=DEFAULT_VARIABLES, grid=FORECAST_GRID_DEGREES):
+    # Nearby coordinates share a forecast; snap them to the configured grid.
+    # The variable set is part of the key so narrow requests stay narrow.
+    return f"{round(lat / grid) * grid:.4f},{round(lon / grid) * grid:.4f}|{variables.key}"
+
+
+def next_forecast_update(now):
+    # Upstream publishes new model runs on a fixed cadence, a little after
+    # each boundary, so a forecast stays current until the next publication
+    boundary = (now - FORECAST_UPDATE_DELAY) // FORECAST_UPDATE_INTERVAL + 1
+    return boundary * FORECAST_UPDATE_INTERVAL + FORECAST_UPDATE_DELAY
+
+
+def store_forecast(key, data, as_of=None):
+    # `as_of` dates data fetched ahead of time: it stays fresh until the
+    # publication after that moment
+    now = time.time()
+    fresh_until = next_forecast_update(now if as_of is None else max(now, as_of))
+    entry = {"data": data, "generated_at": now, "fresh_until": fresh_until}
+    forecast_cache.set(key, entry, ttl=fresh_until - now + FORECAST_STALE_TTL)
+    return entry
+
+
+def is_stale(entry):
+    return time.time() >= entry["fresh_until"]
+
+
+def count_forecast_lookup(entry):
+    if entry is None:
+        result = "miss"
+    else:
+        result = "stale" if is_stale(entry) else "hit"
+    metrics.CACHE_REQUESTS.inc(cache="forecast", result=result)
 
 class WeatherModel:
     def __init__(self):
         self.daily_data = {}
         
-    def parse_response(self, data):
+    def parse_response(self, data, columnar=False, variables=DEFAULT_VARIABLES):
+        # Converts whole columns at once. Returns a list with one dict per
+        # day, or with columnar=True a dict of equally long lists keyed like
+        # the per-day dicts.
+        return self._parse_block(data, 'daily', variables.daily, DAILY_FIELDS, columnar)
+
+    def parse_hourly(self, data, columnar=False, variables=DEFAULT_VARIABLES):
+        # Same as parse_response for the hourly block; 'time' is kept as the
+        # upstream ISO timestamp
+        return self._parse_block(data, 'hourly', variables.hourly, HOURLY_FIELDS, columnar)
+
+    @staticmethod
+    def _parse_block(data, block_name, requested, fields, columnar):
         try:
-            daily = data.get('daily', {})
-            if not isinstance(daily, dict):
-                raise WeatherError(WeatherErrorType.INVALID_DATA, "Invalid daily data format")
+            block = data.get(block_name, {})
+            if not isinstance(block, dict):
+                raise WeatherError(WeatherErrorType.INVALID_DATA, f"Invalid {block_name} data format")
                 
-            time = daily.get('time', [])
+            time = block.get('time', [])
             
-            # Validate that all required fields exist
-            for col in WeatherColumn:
-                if col.value not in daily:
-                    raise WeatherError(WeatherErrorType.INVALID_DATA, f"Missing {col.value} in response")
+            # Validate that all required fields exist and line up with time
+            for column in requested:
+                if column not in block:
+                    raise WeatherError(WeatherErrorType.INVALID_DATA, f"Missing {column} in response")
+                if len(block[column]) < len(time):
+                    raise WeatherError(WeatherErrorType.INVALID_DATA, f"Too few values for {column}")
             
-            formatted_data = []
-            for i in range(len(time)):
-                day_data = {
-                    'date': datetime.strptime(time[i], '%Y-%m-%d').strftime('%B %d'),
-                    'temp_max': round(daily[WeatherColumn.TEMP_MAX.value][i]),
-                    'temp_min': round(daily[WeatherColumn.TEMP_MIN.value][i]),
-                    'sunrise': daily[WeatherColumn.SUNRISE.value][i],
-                    'sunset': daily[WeatherColumn.SUNSET.value][i],
-                    'showers': daily[WeatherColumn.SHOWERS.value][i],
-                    'snowfall': daily[WeatherColumn.SNOWFALL.value][i],
-                    'precipitation_prob': daily[WeatherColumn.PRECIP_PROB.value][i]
-                }
-                formatted_data.append(day_data)
-                
-            return formatted_data
+            rows = len(time)
+            if block_name == 'daily':
+                keys = ['date']
+                columns = [list(map(format_date, time))]
+            else:
+                keys = ['time']
+                columns = [list(time)]
+            for column in requested:
+                field, convert = fields[column]
+                values = block[column][:rows]
+                keys.append(field)
+                columns.append(list(map(convert, values)) if convert else values)
+
+            if columnar:
+                return dict(zip(keys, columns))
+            record = record_type(tuple(keys))
+            return [record(*row) for row in zip(*columns)]
             
         except (TypeError, ValueError) as e:
             raise WeatherError(WeatherErrorType.INVALID_DATA, str(e))
 
+    @staticmethod
+    def split_response(data, count):
+        # A multi-location request returns a list with one forecast per
+        # location, in request order; a single location returns a dict
+        if isinstance(data, dict) and count == 1:
+            return [data]
+        if not isinstance(data, list) or len(data) != count:
+            raise WeatherError(WeatherErrorType.INVALID_DATA, "Unexpected multi-location response")
+        return data
+
 class WeatherService:
     def __init__(self):
-        self.base_url = "https://api.open-meteo.com/v1/forecast"
+        self.base_url = FORECAST_API_URL
     
-    def _build_params(self, lat, lon):
-        daily_params = ",".join([col.value for col in WeatherColumn])
+    def _build_params(self, lat, lon, variables=DEFAULT_VARIABLES):
         return {
             "latitude": lat,
             "longitude": lon,
-            "daily": daily_params,
+            **variables.params,
             "timezone": "auto"
         }
     
-    def fetch_weather(self, city):
-        coordinates = get_geo(city)
-        params = self._build_params(coordinates.latitude, coordinates.longitude)
-        
-        try:
-            response = requests.get(self.base_url, params=params)
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    if not isinstance(data, dict):
-                        raise WeatherError(WeatherErrorType.INVALID_DATA, "Invalid JSON response format")
-                    return data
-                except json.JSONDecodeError:
-                    raise WeatherError(WeatherErrorType.INVALID_DATA, "Invalid JSON response")
-            elif response.status_code == 404:
-                raise WeatherError(WeatherErrorType.CITY_NOT_FOUND)
-            else:
-                raise WeatherError(
-                    WeatherErrorType.API_ERROR,
-                    f"Weather API error: {response.status_code}"
+    @staticmethod
+    def _resolve_coordinates(location):
+        # Accepts an already resolved GeoModel or a (lat, lon) pair; a plain
+        # city name is still geocoded here for backwards compatibility
+        if isinstance(location, str):
+            location = geo_service.get_geo(location)
+        if isinstance(location, GeoModel):
+            return location.latitude, location.longitude
+        lat, lon = location
+        return lat, lon
+
+    def fetch_weather(self, location, variables=DEFAULT_VARIABLES):
+        return self.fetch_weather_entry(location, variables)["data"]
+
+    def fetch_weather_entry(self, location, variables=DEFAULT_VARIABLES):
+        # The cache entry itself: {"data", "generated_at", "fresh_until"}
+        lat, lon = self._resolve_coordinates(location)
+        key = forecast_key(lat, lon, variables)
+
+        entry = forecast_cache.get(key)
+        count_forecast_lookup(entry)
+        if entry is not None:
+            if is_stale(entry):
+                # Serve the stale copy now and refresh it in the background
+                self._refresh_in_background(key, lat, lon, variables)
+            return entry
+
+        # Concurrent misses for the same grid cell share one upstream call
+        return forecast_flight.do(key, self._fetch_and_store, key, lat, lon, variables)
+
+    def fetch_weather_batch(self, locations, variables=DEFAULT_VARIABLES):
+        # Returns one raw forecast per location, or a WeatherError in its
+        # place. Cache misses are fetched with one multi-location request
+        # per FORECAST_BATCH_SIZE locations.
+        coordinates = [self._resolve_coordinates(location) for location in locations]
+        keys = [forecast_key(lat, lon, variables) for lat, lon in coordinates]
+        found = {}
+        missing = {}
+        for key, (lat, lon) in zip(keys, coordinates):
+            if key in found or key in missing:
+                continue
+            entry = forecast_cache.get(key)
+            count_forecast_lookup(entry)
+            if entry is None:
+                missing[key] = (lat, lon)
+                continue
+            if is_stale(entry):
+                self._refresh_in_background(key, lat, lon, variables)
+            found[key] = entry["data"]
+
+        found.update(self._fetch_many(missing, variables))
+        return [found[key] for key in keys]
+
+    def refresh_batch(self, locations, variables=DEFAULT_VARIABLES, as_of=None):
+        # Re-fetches every location regardless of what is cached, batched
+        # like fetch_weather_batch; returns {forecast key: data or WeatherError}
+        coordinates = [self._resolve_coordinates(location) for location in locations]
+        pending = {forecast_key(lat, lon, variables): (lat, lon) for lat, lon in coordinates}
+        return self._fetch_many(pending, variables, as_of)
+
+    def _fetch_many(self, missing, variables=DEFAULT_VARIABLES, as_of=None):
+        # `missing` maps forecast keys to coordinates; one multi-location
+        # request per FORECAST_BATCH_SIZE of them
+        found = {}
+        pending = list(missing.items())
+        for start in range(0, len(pending), FORECAST_BATCH_SIZE):
+            chunk = pending[start:start + FORECAST_BATCH_SIZE]
+            try:
+                responses = WeatherModel.split_response(
+                    self._request_forecast(
+                        ",".join(str(lat) for _, (lat, _lon) in chunk),
+                        ",".join(str(lon) for _, (_lat, lon) in chunk),
+                        multi_location=True,
+                        variables=variables,
+                    ),
+                    len(chunk),
                 )
-        except requests.exceptions.ConnectionError:
+            except WeatherError as e:
+                found.update((key, e) for key, _ in chunk)
+                continue
+            for (key, _), data in zip(chunk, responses):
+                if isinstance(data, dict):
+                    store_forecast(key, data, as_of)
+                    found[key] = data
+                else:
+                    found[key] = WeatherError(WeatherErrorType.INVALID_DATA, "Invalid location data format")
+        return found
+
+    def _fetch_and_store(self, key, lat, lon, variables=DEFAULT_VARIABLES):
+        return store_forecast(key, self._request_forecast(lat, lon, variables=variables))
+
+    def _refresh_in_background(self, key, lat, lon, variables=DEFAULT_VARIABLES):
+        with _refreshing_lock:
+            if key in _refreshing:
+                return
+            _refreshing.add(key)
+
+        def refresh():
+            try:
+                with rate_limiter.priority(rate_limiter.BATCH):
+                    forecast_flight.do(key, self._fetch_and_store, key, lat, lon, variables)
+            except WeatherError as e:
+                logger.warning(f"Background forecast refresh for {key} failed: {e}")
+            finally:
+                with _refreshing_lock:
+                    _refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _request_forecast(self, lat, lon, multi_location=False, variables=DEFAULT_VARIABLES):
+        # While the circuit is open this fails fast; callers holding a
+        # cached (even stale) forecast keep serving it
+        return circuit_breaker.forecast.call(self._send_request, lat, lon, multi_location, variables)
+
+    def _send_request(self, lat, lon, multi_location=False, variables=DEFAULT_VARIABLES):
+        params = self._build_params(lat, lon, variables)
+
+        rate_limiter.upstream.acquire()
+        try:
+            response = http_client.get(self.base_url, upstream="forecast", params=params)
+        except http_client.NETWORK_EXCEPTIONS:
             raise WeatherError(WeatherErrorType.NETWORK_ERROR)
+        if response.status_code == 429:
+            rate_limiter.upstream.throttled(response.headers.get("Retry-After"))
+        return self.handle_response(response, multi_location)
+
+    @staticmethod
+    def handle_response(response, multi_location=False):
+        if response.status_code == 200:
+            try:
+                data = response.json()
+                if not isinstance(data, (dict, list) if multi_location else dict):
+                    raise WeatherError(WeatherErrorType.INVALID_DATA, "Invalid JSON response format")
+                return data
+            except json.JSONDecodeError:
+                raise WeatherError(WeatherErrorType.INVALID_DATA, "Invalid JSON response")
+        elif response.status_code == 404:
+            raise WeatherError(WeatherErrorType.CITY_NOT_FOUND)
+        elif response.status_code == 429:
+            raise WeatherError(WeatherErrorType.RATE_LIMITED, "Weather API rate limit exceeded")
+        else:
+            raise WeatherError(
+                WeatherErrorType.API_ERROR,
+                f"Weather API error: {response.status_code}"
+            )
+
+def build_weather_data(geo, weather_response, variables=DEFAULT_VARIABLES):
+    geo_data = geo.to_dict()
+    model = WeatherModel()
+    try:
+        with metrics.timed("parse"):
+            if variables.daily:
+                geo_data["weather"] = model.parse_response(weather_response, variables=variables)
+            if variables.hourly:
+                geo_data["hourly"] = model.parse_hourly(weather_response, variables=variables)
+    except WeatherError:
+        raise
+    except Exception as e:
+        raise WeatherError(WeatherErrorType.INVALID_DATA, str(e))
+    return geo_data
+
+def get_weather(city, variables=DEFAULT_VARIABLES):
+    return _get_weather(city, variables, with_entry=False)
 
-def get_weather(city):
+def get_weather_entry(city, variables=DEFAULT_VARIABLES):
+    # Returns the weather data together with the forecast cache entry it was
+    # built from, whose timestamps drive HTTP caching
+    return _get_weather(city, variables, with_entry=True)
+
+def _get_weather(city, variables, with_entry):
     if not city or len(city.strip()) == 0:
         raise WeatherError(WeatherErrorType.CITY_NOT_FOUND)
     
     try:
         weather_service = WeatherService()
-        weather_model = WeatherModel()
         
-        # Get location data
-        geo_data = get_geo(city).__dict__
+        # Resolve the location once and reuse it for the forecast request
+        with metrics.timed("geocode"):
+            geo = geo_service.get_geo(city)
+        if geo is None:
+            raise WeatherError(WeatherErrorType.CITY_NOT_FOUND)
         
         # Fetch and process weather data
-        weather_response = weather_service.fetch_weather(city)
-        try:
-            geo_data["weather"] = weather_model.parse_response(weather_response)
-        except WeatherError:
-            raise
-        except Exception as e:
-            raise WeatherError(WeatherErrorType.INVALID_DATA, str(e))
-        return geo_data
+        with metrics.timed("forecast"):
+            if with_entry:
+                entry = weather_service.fetch_weather_entry(geo, variables)
+                weather_response = entry["data"]
+            else:
+                weather_response = weather_service.fetch_weather(geo, variables)
+        data = build_weather_data(geo, weather_response, variables)
+        return (data, entry) if with_entry else data
         
     except WeatherError:
         raise
     except Exception as e:
         raise WeatherError(WeatherErrorType.SERVER_ERROR, str(e))
 
+def error_entry(error):
+    metrics.ERRORS.inc(type=error.error_type.value)
+    return {"type": error.error_type.value, **get_user_message(error.error_type)}
+
+def _geocode(city):
+    try:
+        with rate_limiter.priority(rate_limiter.BATCH):
+            geo = geo_service.get_geo(city)
+        if geo is None:
+            raise WeatherError(WeatherErrorType.CITY_NOT_FOUND)
+        return geo
+    except WeatherError as e:
+        return e
+    except Exception as e:
+        return WeatherError(WeatherErrorType.SERVER_ERROR, str(e))
+
+def get_weather_batch(cities, variables=DEFAULT_VARIABLES):
+    # Geocodes the cities concurrently, then fetches every forecast with
+    # multi-location requests. Each result is {"city", "data"} or, when that
+    # city failed, {"city", "error"}; the batch as a whole never fails.
+    unique = list(dict.fromkeys(cities))
+    with ThreadPoolExecutor(max_workers=BATCH_GEO_CONCURRENCY) as executor:
+        resolved = dict(zip(unique, executor.map(_geocode, unique)))
+
+    geos = {city: geo for city, geo in resolved.items() if isinstance(geo, GeoModel)}
+    with rate_limiter.priority(rate_limiter.BATCH):
+        forecasts = dict(zip(geos, WeatherService().fetch_weather_batch(list(geos.values()), variables)))
+
+    results = []
+    for city in cities:
+        entry = {"city": city}
+        try:
+            outcome = resolved[city]
+            if isinstance(outcome, WeatherError):
+                raise outcome
+            forecast = forecasts[city]
+            if isinstance(forecast, WeatherError):
+                raise forecast
+            entry["data"] = build_weather_data(outcome, forecast, variables)
+        except WeatherError as e:
+            entry["error"] = error_entry(e)
+        results.append(entry)
+    return results
+
+def _weather_entry(city, variables):
+    entry = {"city": city}
+    try:
+        with rate_limiter.priority(rate_limiter.BATCH):
+            entry["data"] = get_weather(city, variables)
+    except WeatherError as e:
+        entry["error"] = error_entry(e)
+    except Exception as e:
+        logger.error(f"Unexpected error exporting {city}: {str(e)}", exc_info=True)
+        entry["error"] = error_entry(WeatherError(WeatherErrorType.SERVER_ERROR, str(e)))
+    return entry
+
+def iter_weather(cities, variables=DEFAULT_VARIABLES, concurrency=EXPORT_CONCURRENCY):
+    # Yields one batch-style entry per city as soon as it is ready, so in
+    # completion order. Cities are read lazily and at most `concurrency`
+    # lookups are in flight, so memory stays flat for any input size.
+    cities = iter(cities)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < concurrency:
+                city = next(cities, None)
+                if city is None:
+                    exhausted = True
+                else:
+                    pending.add(executor.submit(_weather_entry, city, variables))
+            if pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+def read_cities(lines):
+    # Newline-delimited city list; blank lines are skipped
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        city = line.strip()
+        if city:
+            yield city
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Weather lookups from the command line")
+    commands = parser.add_subparsers(dest="command")
+    export = commands.add_parser("export", help="stream NDJSON forecasts for cities read from stdin")
+    export.add_argument("--concurrency", type=int, default=EXPORT_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        for entry in iter_weather(read_cities(sys.stdin), concurrency=args.concurrency):
+            sys.stdout.write(json.dumps(entry, default=json_default) + "\n")
+            sys.stdout.flush()
+    else:
+        print("today", get_weather("haifa")["name"])
+
 if __name__ == "__main__":
-    print("today", get_weather("haifa")["name"])
+    main()
@@ -0,0 +1,341 @@
+import asyncio
+import json
+import mimetypes
+import os
+from urllib.parse import parse_qs
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from app import client_limits, health as health_checks, http_cache, metrics
+from app.config import setup_logging, BATCH_MAX_CITIES, SUGGEST_MAX_RESULTS
+from app.page_cache import PageCache, negotiate
+from app.errors import WeatherError, WeatherErrorType, get_http_status, get_user_message
+from app.services import async_weather, geo_service, prefetcher
+from app.services.forecast_variables import DEFAULT_VARIABLES, VariableSet
+from app.services.records import json_default
+from app.services.weather_service import read_cities
+
+# Native ASGI entry point serving the same routes as main.py, backed by the
+# asyncio services so one process can keep many lookups in flight:
+#   uvicorn asgi:app --host 0.0.0.0 --port 8080
+
+project_root = os.path.dirname(os.path.abspath(__file__))
+static_root = os.path.join(project_root, "app", "static")
+
+templates = Environment(
+    loader=FileSystemLoader(os.path.join(project_root, "app", "templates")),
+    autoescape=select_autoescape(["html"]),
+)
+templates.globals["url_for"] = lambda endpoint, filename: f"/static/{filename}"
+
+logger = setup_logging()
+
+page_cache = PageCache(
+    lambda **context: templates.get_template("index.html").render(**context),
+    os.path.join(project_root, "app", "templates", "index.html"),
+)
+page_cache.prerender()
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+def form_data(body):
+    # Invalid UTF-8 is replaced rather than failing the request
+    return parse_qs(body.decode("utf-8", errors="replace"))
+
+
+def query_params(scope):
+    # First value of each query parameter, like Flask's request.args.get
+    args = parse_qs(scope["query_string"].decode("utf-8", errors="replace"))
+    return {name: values[0] for name, values in args.items()}
+
+
+async def request_cities(receive):
+    # Newline-delimited request body, read chunk by chunk
+    pending = b""
+    while True:
+        message = await receive()
+        lines = (pending + message.get("body", b"")).split(b"\n")
+        pending = lines.pop()
+        for city in read_cities(lines):
+            yield city
+        if not message.get("more_body"):
+            break
+    for city in read_cities([pending]):
+        yield city
+
+
+async def send_response(send, status, body, content_type, headers=None):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", content_type.encode()),
+            (b"content-length", str(len(body)).encode()),
+            *((name.lower().encode(), value.encode()) for name, value in (headers or {}).items()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def request_header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def send_json(send, status, data, headers=None):
+    await send_response(send, status, json.dumps(data, default=json_default).encode(), "application/json", headers)
+
+
+async def send_page(scope, send, page, status=200, headers=None):
+    encoding, body = page.select(request_header(scope, b"accept-encoding"))
+    headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    await send_response(send, status, body, "text/html; charset=utf-8", headers)
+
+
+def client_identity(scope):
+    address = scope.get("client") or (None,)
+    return client_limits.identify(address[0], request_header(scope, b"x-api-key"),
+                                  request_header(scope, b"x-forwarded-for"))
+
+
+def log_weather_error(e):
+    logger.error(f"Weather error: {str(e)} of type {e.error_type}", exc_info=True)
+    metrics.ERRORS.inc(type=e.error_type.value)
+
+
+async def home(scope, receive, send):
+    if scope["method"] != "POST":
+        return await send_page(scope, send, page_cache.home_page())
+    form = form_data(await read_body(receive))
+    city = form.get("country", [None])[0]
+    try:
+        data, entry = await async_weather.get_weather_entry(city)
+        page = page_cache.weather_page(data, entry, DEFAULT_VARIABLES)
+    except WeatherError as e:
+        log_weather_error(e)
+        return await send_error_page(scope, send, e.error_type)
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        metrics.ERRORS.inc(type=WeatherErrorType.SERVER_ERROR.value)
+        return await send_error_page(scope, send, WeatherErrorType.SERVER_ERROR)
+    await send_page(scope, send, page)
+
+
+async def send_error_page(scope, send, error_type):
+    await send_page(scope, send, page_cache.error_page(error_type), get_http_status(error_type),
+                    http_cache.error_headers(error_type))
+
+
+async def weather_page(scope, receive, send):
+    city = query_params(scope).get("city", "")
+    try:
+        data, entry = await async_weather.get_weather_entry(city)
+    except WeatherError as e:
+        log_weather_error(e)
+        return await send_error_page(scope, send, e.error_type)
+
+    etag = http_cache.forecast_etag("html", data, entry, DEFAULT_VARIABLES, page_cache.version)
+    etag = http_cache.encoded_etag(etag, negotiate(request_header(scope, b"accept-encoding")))
+    headers = http_cache.cache_headers(etag, entry)
+    if http_cache.is_not_modified(etag, entry, request_header(scope, b"if-none-match"),
+                                  request_header(scope, b"if-modified-since")):
+        return await send_response(send, 304, b"", "text/html; charset=utf-8",
+                                   {**headers, "Vary": "Accept-Encoding"})
+    await send_page(scope, send, page_cache.weather_page(data, entry, DEFAULT_VARIABLES), headers=headers)
+
+
+async def weather_api(scope, receive, send):
+    args = query_params(scope)
+    try:
+        variables = VariableSet.from_query(args)
+    except ValueError as e:
+        return await send_json(send, 400, {"error": str(e)})
+    try:
+        data, entry = await async_weather.get_weather_entry(args.get("city", ""), variables)
+    except WeatherError as e:
+        log_weather_error(e)
+        return await send_json(send, get_http_status(e.error_type),
+                               {"error": {"type": e.error_type.value, **get_user_message(e.error_type)}},
+                               http_cache.error_headers(e.error_type))
+
+    etag = http_cache.forecast_etag("json", data, entry, variables)
+    headers = http_cache.cache_headers(etag, entry)
+    if http_cache.is_not_modified(etag, entry, request_header(scope, b"if-none-match"),
+                                  request_header(scope, b"if-modified-since")):
+        return await send_response(send, 304, b"", "application/json", headers)
+    await send_json(send, 200, data, headers)
+
+
+async def weather_batch(scope, receive, send):
+    try:
+        payload = json.loads(await read_body(receive))
+    except ValueError:
+        payload = None
+    cities = payload.get("cities") if isinstance(payload, dict) else None
+    if not isinstance(cities, list) or not all(isinstance(city, str) for city in cities):
+        return await send_json(send, 400, {"error": 'Expected a JSON body like {"cities": ["Haifa", ...]}'})
+    if len(cities) > BATCH_MAX_CITIES:
+        return await send_json(send, 413, {"error": f"At most {BATCH_MAX_CITIES} cities per batch"})
+    try:
+        variables = VariableSet.create(
+            daily=payload.get("daily"),
+            hourly=payload.get("hourly"),
+            forecast_days=payload.get("forecast_days"),
+        )
+    except (TypeError, ValueError) as e:
+        return await send_json(send, 400, {"error": str(e)})
+
+    try:
+        results = await async_weather.get_weather_batch(cities, variables)
+    except Exception as e:
+        logger.error(f"Unexpected batch error: {str(e)}", exc_info=True)
+        return await send_json(send, 500, {"error": get_user_message(WeatherErrorType.SERVER_ERROR)})
+    await send_json(send, 200, {"results": results})
+
+
+async def weather_export(scope, receive, send):
+    # Streams one JSON line per city as soon as it is ready
+    try:
+        variables = VariableSet.from_query(query_params(scope))
+    except ValueError as e:
+        return await send_json(send, 400, {"error": str(e)})
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"application/x-ndjson")],
+    })
+    async for entry in async_weather.iter_weather(request_cities(receive), variables):
+        line = json.dumps(entry, default=json_default) + "\n"
+        await send({"type": "http.response.body", "body": line.encode(), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def suggest_cities(scope, receive, send):
+    args = query_params(scope)
+    try:
+        limit = int(args.get("limit", SUGGEST_MAX_RESULTS))
+    except ValueError:
+        return await send_json(send, 400, {"error": "limit must be an integer"})
+    query = args.get("q", "")
+    body = json.dumps({
+        "query": query,
+        "suggestions": geo_service.suggest_cities(query, max(1, min(limit, SUGGEST_MAX_RESULTS))),
+    })
+    await send_response(send, 200, body.encode(), "application/json", {"Cache-Control": "public, max-age=60"})
+
+
+async def health(scope, receive, send):
+    await send_response(send, 200, json.dumps(health_checks.liveness()).encode(), "application/json")
+
+
+async def ready(scope, receive, send):
+    body, status = health_checks.readiness(async_weather.pool_stats())
+    await send_response(send, status, json.dumps(body).encode(), "application/json")
+
+
+async def metrics_endpoint(scope, receive, send):
+    await send_response(send, 200, metrics.render().encode(), "text/plain; version=0.0.4")
+
+
+async def static(scope, receive, send):
+    relative = scope["path"][len("/static/"):]
+    path = os.path.realpath(os.path.join(static_root, relative))
+    if not path.startswith(static_root + os.sep) or not os.path.isfile(path):
+        return await not_found(scope, receive, send)
+    with open(path, "rb") as f:
+        body = f.read()
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    await send_response(send, 200, body, content_type)
+
+
+async def not_found(scope, receive, send):
+    await send_response(send, 404, b"Not Found", "text/plain")
+
+
+def method_not_allowed(allowed):
+    async def handler(scope, receive, send):
+        await send_response(send, 405, b"Method Not Allowed", "text/plain", {"Allow": ", ".join(sorted(allowed))})
+    return handler
+
+
+def without_body(send):
+    # HEAD: the GET response's status and headers, no body
+    async def send_head(message):
+        if message["type"] == "http.response.body":
+            message = {**message, "body": b""}
+        await send(message)
+    return send_head
+
+
+# path -> (handler, methods); HEAD is served wherever GET is
+ROUTES = {
+    "/": (home, {"GET", "POST"}),
+    "/weather": (weather_page, {"GET"}),
+    "/api/weather": (weather_api, {"GET"}),
+    "/api/weather/batch": (weather_batch, {"POST"}),
+    "/api/weather/export": (weather_export, {"POST"}),
+    "/api/cities/suggest": (suggest_cities, {"GET"}),
+    "/health": (health, {"GET"}),
+    "/ready": (ready, {"GET"}),
+    "/metrics": (metrics_endpoint, {"GET"}),
+}
+# Routes that run the weather pipeline; "/" only when the form is posted
+LIMITED_HANDLERS = {weather_page, weather_api, weather_batch, weather_export}
+PAGE_HANDLERS = {home, weather_page}
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await asyncio.to_thread(geo_service.warm_suggestions)
+            prefetcher.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await async_weather.close_client()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(scope, receive, send)
+
+    path = scope["path"]
+    method = scope["method"]
+    if method == "HEAD":
+        send = without_body(send)
+        scope = {**scope, "method": "GET"}
+        method = "GET"
+    if path in ROUTES:
+        handler, methods = ROUTES[path]
+        if method not in methods:
+            handler = method_not_allowed(methods | ({"HEAD"} if "GET" in methods else set()))
+    elif path.startswith("/static/") and method == "GET":
+        handler = static
+    else:
+        handler = not_found
+
+    if handler in LIMITED_HANDLERS or (handler is home and method == "POST"):
+        retry_after = client_limits.check(*client_identity(scope))
+        if retry_after:
+            headers = {"Retry-After": str(retry_after), "Cache-Control": "no-store"}
+            if handler in PAGE_HANDLERS:
+                return await send_page(scope, send, page_cache.error_page(WeatherErrorType.RATE_LIMITED), 429,
+                                       headers)
+            return await send_json(send, 429, {"error": {"type": WeatherErrorType.RATE_LIMITED.value,
+                                                         **get_user_message(WeatherErrorType.RATE_LIMITED)}},
+                                   headers)
+    await handler(scope, receive, send)
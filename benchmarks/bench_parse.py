@@ -0,0 +1,102 @@
+import os
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.forecast_variables import HourlyColumn, VariableSet, WeatherColumn
+from app.services.weather_service import WeatherModel
+
+# Per-response parse time of WeatherModel.parse_response for the payload
+# sizes we serve, against the previous per-day loop.
+#   python benchmarks/bench_parse.py
+
+DAILY_PAYLOADS = {
+    "7-day": 7,
+    "16-day": 16,
+    "90-day": 90,
+}
+HOURLY_PAYLOADS = {
+    "hourly 7-day (168 rows)": 7 * 24,
+    "hourly 16-day (384 rows)": 16 * 24,
+}
+HOURLY_VARIABLES = VariableSet.create(daily=[], hourly=[column.value for column in HourlyColumn])
+
+
+def make_payload(rows):
+    start = date(2024, 1, 1)
+    days = [(start + timedelta(days=i % 366)).isoformat() for i in range(rows)]
+    return {
+        "daily": {
+            "time": days,
+            "temperature_2m_max": [20.5 + i % 7 for i in range(rows)],
+            "temperature_2m_min": [10.2 + i % 5 for i in range(rows)],
+            "sunrise": [f"{d}T06:00" for d in days],
+            "sunset": [f"{d}T18:00" for d in days],
+            "showers_sum": [0.1 * (i % 3) for i in range(rows)],
+            "snowfall_sum": [0.0] * rows,
+            "precipitation_probability_max": [i % 100 for i in range(rows)],
+        }
+    }
+
+
+def make_hourly_payload(rows):
+    return {
+        "hourly": {
+            "time": [f"2024-01-{1 + i // 24:02d}T{i % 24:02d}:00" for i in range(rows)],
+            "temperature_2m": [12.5 + i % 9 for i in range(rows)],
+            "wind_speed_10m": [3.2 + i % 4 for i in range(rows)],
+            "precipitation": [0.1 * (i % 2) for i in range(rows)],
+            "precipitation_probability": [i % 100 for i in range(rows)],
+        }
+    }
+
+
+def legacy_parse(data):
+    daily = data["daily"]
+    time = daily["time"]
+    formatted_data = []
+    for i in range(len(time)):
+        formatted_data.append({
+            'date': datetime.strptime(time[i], '%Y-%m-%d').strftime('%B %d'),
+            'temp_max': round(daily[WeatherColumn.TEMP_MAX.value][i]),
+            'temp_min': round(daily[WeatherColumn.TEMP_MIN.value][i]),
+            'sunrise': daily[WeatherColumn.SUNRISE.value][i],
+            'sunset': daily[WeatherColumn.SUNSET.value][i],
+            'showers': daily[WeatherColumn.SHOWERS.value][i],
+            'snowfall': daily[WeatherColumn.SNOWFALL.value][i],
+            'precipitation_prob': daily[WeatherColumn.PRECIP_PROB.value][i]
+        })
+    return formatted_data
+
+
+def best_of(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    model = WeatherModel()
+    print(f"{'payload':<26}{'legacy µs':>12}{'rows µs':>12}{'columnar µs':>14}")
+    for label, rows in DAILY_PAYLOADS.items():
+        payload = make_payload(rows)
+        assert model.parse_response(payload) == legacy_parse(payload)
+        number = max(50, 20000 // rows)
+        legacy = best_of(lambda: legacy_parse(payload), number)
+        row_based = best_of(lambda: model.parse_response(payload), number)
+        columnar = best_of(lambda: model.parse_response(payload, columnar=True), number)
+        print(f"{label:<26}{legacy:>12.1f}{row_based:>12.1f}{columnar:>14.1f}")
+
+    # The old parser had no hourly support
+    for label, rows in HOURLY_PAYLOADS.items():
+        payload = make_hourly_payload(rows)
+        number = max(50, 20000 // rows)
+        row_based = best_of(lambda: model.parse_hourly(payload, variables=HOURLY_VARIABLES), number)
+        columnar = best_of(
+            lambda: model.parse_hourly(payload, columnar=True, variables=HOURLY_VARIABLES), number
+        )
+        print(f"{label:<26}{'-':>12}{row_based:>12.1f}{columnar:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-in for the Open-Meteo geocoding and forecast APIs, with
+# configurable latency and error rate. Point the app at it with
+#   GEO_API_URL=http://127.0.0.1:8900/v1/search
+#   FORECAST_API_URL=http://127.0.0.1:8900/v1/forecast
+# Names containing "unknown" resolve to no results.
+
+DAILY_VALUES = {
+    "temperature_2m_max": lambda i: 20.5 + i % 7,
+    "temperature_2m_min": lambda i: 10.2 + i % 5,
+    "showers_sum": lambda i: 0.1 * (i % 3),
+    "snowfall_sum": lambda i: 0.0,
+    "precipitation_probability_max": lambda i: (i * 13) % 100,
+    "precipitation_sum": lambda i: 0.2 * (i % 4),
+    "wind_speed_10m_max": lambda i: 12.0 + i % 6,
+}
+HOURLY_VALUES = {
+    "temperature_2m": lambda i: 12.5 + i % 9,
+    "wind_speed_10m": lambda i: 3.2 + i % 4,
+    "precipitation": lambda i: 0.1 * (i % 2),
+    "precipitation_probability": lambda i: (i * 7) % 100,
+}
+
+
+def coordinates_for(name):
+    digest = hashlib.sha1(name.casefold().encode()).digest()
+    lat = digest[0] / 255 * 140 - 70
+    lon = digest[1] / 255 * 340 - 170
+    return round(lat, 4), round(lon, 4)
+
+
+def geocode(query):
+    name = query.get("name", [""])[0].replace("+", " ").strip()
+    if not name or "unknown" in name.casefold():
+        return {"generationtime_ms": 0.1}
+    lat, lon = coordinates_for(name)
+    return {"results": [{"name": name.title(), "country": "Benchmarkland", "latitude": lat, "longitude": lon}]}
+
+
+def forecast_for(lat, lon, daily, hourly, days):
+    start = date.today()
+    dates = [(start + timedelta(days=i)).isoformat() for i in range(days)]
+    payload = {"latitude": float(lat), "longitude": float(lon), "timezone": "GMT"}
+    if daily:
+        block = {"time": dates}
+        for column in daily:
+            if column == "sunrise":
+                block[column] = [f"{d}T06:00" for d in dates]
+            elif column == "sunset":
+                block[column] = [f"{d}T18:00" for d in dates]
+            else:
+                block[column] = [DAILY_VALUES.get(column, lambda i: 0)(i) for i in range(days)]
+        payload["daily"] = block
+    if hourly:
+        hours = [f"{d}T{h:02d}:00" for d in dates for h in range(24)]
+        block = {"time": hours}
+        for column in hourly:
+            block[column] = [HOURLY_VALUES.get(column, lambda i: 0)(i) for i in range(len(hours))]
+        payload["hourly"] = block
+    return payload
+
+
+def forecast(query):
+    lats = query.get("latitude", [""])[0].split(",")
+    lons = query.get("longitude", [""])[0].split(",")
+    daily = [c for c in query.get("daily", [""])[0].split(",") if c]
+    hourly = [c for c in query.get("hourly", [""])[0].split(",") if c]
+    days = int(query.get("forecast_days", ["7"])[0])
+    payloads = [forecast_for(lat, lon, daily, hourly, days) for lat, lon in zip(lats, lons)]
+    return payloads if len(payloads) > 1 else payloads[0]
+
+
+class FakeUpstream:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.counts = {"geocoding": 0, "forecast": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                routes = {"/v1/search": ("geocoding", geocode), "/v1/forecast": ("forecast", forecast)}
+                if parsed.path not in routes:
+                    return self._send(404, {"error": True, "reason": "Not found"})
+                counter, handler = routes[parsed.path]
+
+                delay = upstream.latency + random.uniform(0, upstream.jitter)
+                if delay:
+                    time.sleep(delay)
+                with upstream._lock:
+                    upstream.counts[counter] += 1
+                    failed = random.random() < upstream.error_rate
+                    if failed:
+                        upstream.counts["errors"] += 1
+                if failed:
+                    return self._send(500, {"error": True, "reason": "Injected failure"})
+                self._send(200, handler(parse_qs(parsed.query)))
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Open-Meteo for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.05, help="base latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra random latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(args.host, args.port, args.latency, args.jitter, args.error_rate)
+    print(f"Fake upstream on {upstream.url}")
+    try:
+        upstream.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
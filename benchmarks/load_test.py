@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.client import HTTPConnection
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_upstream import FakeUpstream
+
+# Replays a request log against the WSGI app running under gunicorn, with
+# Open-Meteo replaced by a local fake, and reports throughput and latency.
+#
+#   python benchmarks/load_test.py --workers 3 --concurrency 32 --requests 2000
+#   python benchmarks/load_test.py --log requests.jsonl --latency 0.1 --error-rate 0.02
+#   python benchmarks/load_test.py --config gunicorn.conf.py --mix cold --requests 1500
+#
+# A log line is either a plain city name or a JSON object with a "city" key
+# and optional "method" ("POST" by default) and "path" ("/" by default).
+# Lines without a city are skipped. Without a log, a skewed mix of cities
+# is generated and sent to the form, or to /api/weather with --route api:
+# a skewed mix of a couple dozen cities, or with --mix cold a different
+# town on every request so each one goes upstream.
+#
+# The fake upstream has no quota, so the app's upstream budget is pinned
+# high (--upstream-rate, --upstream-burst) and the run measures the server;
+# pass the production values to see the rate limiter shed instead.
+#
+# Every route answers a failed lookup with its real status, so the report's
+# error count is the 5xx and 429 responses plus connection errors. A 404 for
+# an unknown city is a normal answer and isn't counted.
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CITIES = [
+    "London", "Paris", "New York", "Tokyo", "Haifa", "Tel Aviv", "Berlin", "Madrid",
+    "Rome", "Sydney", "Toronto", "Mumbai", "Cairo", "Lagos", "Lima", "Seoul",
+    "Bangkok", "Istanbul", "Moscow", "Dubai", "Chicago", "Nairobi", "Oslo", "Unknownville",
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def load_log(path):
+    requests = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                entry = {"city": line}
+            if isinstance(entry, dict) and isinstance(entry.get("city"), str):
+                requests.append((entry.get("method", "POST"), entry.get("path", "/"), entry["city"]))
+    return requests
+
+
+ROUTES = {"form": ("POST", "/"), "api": ("GET", "/api/weather")}
+
+
+def generate_log(count, route="form", mix="skewed", seed=1):
+    method, path = ROUTES[route]
+    if mix == "cold":
+        return [(method, path, f"Benchmark Town {i}") for i in range(count)]
+    # Zipf-like skew: a few cities get most of the traffic
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(CITIES))]
+    return [(method, path, city) for city in rng.choices(CITIES, weights, k=count)]
+
+
+def is_error(status):
+    return status == "connection error" or status == 429 or status >= 500
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def cache_path(port):
+    return os.path.join(PROJECT_ROOT, "cache", f"bench_{port}.db")
+
+
+def start_server(args, upstream_url, port):
+    env = dict(
+        os.environ,
+        GEO_API_URL=f"{upstream_url}/v1/search",
+        FORECAST_API_URL=f"{upstream_url}/v1/forecast",
+        CACHE_BACKEND=args.cache_backend,
+        CACHE_PATH=cache_path(port),
+        # The per-client limit is off by default; keep it off even if the
+        # caller's environment enables it, every simulated client shares
+        # one address
+        INBOUND_LIMIT="0",
+        UPSTREAM_RATE=str(args.upstream_rate),
+        UPSTREAM_BURST=str(args.upstream_burst),
+    )
+    command = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "--log-level", "warning"]
+    if args.config:
+        # Flags would override the file, so leave worker sizing to it
+        command += ["--config", args.config]
+    else:
+        command += ["--workers", str(args.workers), "--worker-class", args.worker_class, "--threads", str(args.threads)]
+    command.append(args.app)
+    server = subprocess.Popen(command, cwd=PROJECT_ROOT, env=env)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            conn = HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("gunicorn did not become healthy")
+
+
+def replay(port, requests, concurrency, timeout):
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    position = iter(range(len(requests)))
+
+    def client():
+        conn = HTTPConnection("127.0.0.1", port, timeout=timeout)
+        while True:
+            with lock:
+                index = next(position, None)
+            if index is None:
+                break
+            method, path, city = requests[index]
+            body = urlencode({"country": city}) if method == "POST" else None
+            headers = {"Content-Type": "application/x-www-form-urlencoded"} if body else {}
+            if method == "GET":
+                path = f"{path}?{urlencode({'city': city})}"
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except OSError:
+                conn.close()
+                conn = HTTPConnection("127.0.0.1", port, timeout=timeout)
+                status = "connection error"
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+        conn.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, sorted(latencies), statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the weather app against a fake upstream")
+    parser.add_argument("--log", help="request log to replay (default: generated)")
+    parser.add_argument("--requests", type=int, default=1000, help="requests to send (log is cycled)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--worker-class", default="sync")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--config", help="gunicorn config file, used instead of the three flags above")
+    parser.add_argument("--app", default="wsgi:app")
+    parser.add_argument("--route", default="form", choices=sorted(ROUTES), help="route for the generated mix")
+    parser.add_argument("--mix", default="skewed", choices=["skewed", "cold"], help="generated city mix")
+    parser.add_argument("--upstream-rate", type=float, default=1000, help="app's upstream calls per second")
+    parser.add_argument("--upstream-burst", type=int, default=1000, help="app's upstream burst")
+    parser.add_argument("--cache-backend", default="memory", choices=["memory", "sqlite", "redis"])
+    parser.add_argument("--latency", type=float, default=0.05, help="fake upstream base latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.02, help="fake upstream random extra latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake upstream failure fraction")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    log = load_log(args.log) if args.log else generate_log(args.requests, args.route, args.mix)
+    if not log:
+        parser.error(f"no replayable requests in {args.log}")
+    requests = [log[i % len(log)] for i in range(args.requests)]
+
+    upstream = FakeUpstream(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate).start()
+    port = free_port()
+    server = start_server(args, upstream.url, port)
+    try:
+        elapsed, latencies, statuses = replay(port, requests, args.concurrency, args.timeout)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+        upstream.stop()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(cache_path(port) + suffix):
+                os.remove(cache_path(port) + suffix)
+
+    errors = sum(count for status, count in statuses.items() if is_error(status))
+    report = {
+        "requests": len(latencies),
+        "concurrency": args.concurrency,
+        "server": args.config or f"{args.workers} x {args.worker_class} workers, {args.threads} threads",
+        "upstream_budget": f"{args.upstream_rate:g}/s, burst {args.upstream_burst}",
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "errors": errors,
+        "error_rate": round(errors / len(latencies), 4),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1),
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        "upstream_calls": upstream.counts,
+    }
+    if args.json:
+        print(json.dumps(report))
+        return
+    for key, value in report.items():
+        print(f"{key:<16}{value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import math
+import os
+
+# Gunicorn settings. Gunicorn reads ./gunicorn.conf.py by itself, so
+#   gunicorn wsgi:app
+# from the project root uses them. WEB_PROFILE picks the worker model:
+#   gthread  (default) a few processes with a pool of threads each; requests
+#            mostly wait on the upstream or the cache, which threads do well
+#   sync     one request at a time per process
+#   gevent   one process per CPU serving many requests as greenlets
+# Process, thread and connection counts are derived from the CPUs available
+# to the container; WEB_CONCURRENCY, WEB_THREADS and WEB_CONNECTIONS pin them.
+#
+# The app is preloaded in the master so workers share its memory
+# copy-on-write; per-process threads (log listener, prefetcher) are started
+# in each worker instead. Workers are recycled after MAX_REQUESTS requests,
+# with jitter so they don't all restart at once.
+
+
+def _env_int(name, default):
+    value = os.getenv(name, "")
+    return int(value) if value.strip() else default
+
+
+def cpu_count():
+    # CPUs this process may use: the cgroup v2 quota when one is set,
+    # otherwise the scheduler's affinity mask
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cores = min(cores, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cores
+
+
+profile = os.getenv("WEB_PROFILE", "gthread")
+cores = cpu_count()
+
+if profile == "sync":
+    worker_class = "sync"
+    workers = 2 * cores + 1
+    threads = 1
+elif profile == "gthread":
+    worker_class = "gthread"
+    workers = cores + 1
+    threads = 8
+elif profile == "gevent":
+    # Patched before the app is preloaded, so the master already imports it
+    # with cooperative sockets and locks
+    from gevent import monkey
+    monkey.patch_all()
+    worker_class = "gevent"
+    workers = cores
+    threads = 1
+    worker_connections = _env_int("WEB_CONNECTIONS", 256)
+else:
+    raise ValueError(f"Unknown WEB_PROFILE: {profile}")
+
+workers = _env_int("WEB_CONCURRENCY", workers)
+threads = _env_int("WEB_THREADS", threads)
+
+bind = f"0.0.0.0:{_env_int('PORT', 8080)}"
+preload_app = True
+max_requests = _env_int("MAX_REQUESTS", 2000)
+max_requests_jitter = _env_int("MAX_REQUESTS_JITTER", max_requests // 10)
+timeout = _env_int("WEB_TIMEOUT", 30)
+keepalive = 5
+errorlog = "-"
+accesslog = os.getenv("WEB_ACCESS_LOG") or None
+
+
+def on_starting(server):
+    from app import metrics
+    metrics.clear_metrics_dir()
+
+
+def post_worker_init(worker):
+    from app.services import geo_service, prefetcher
+    geo_service.warm_suggestions()
+    prefetcher.start()
+
+
+def worker_exit(server, worker):
+    from app import metrics
+    metrics.flush()
+
+
+def child_exit(server, worker):
+    from app import metrics
+    metrics.retire_worker(worker.pid)
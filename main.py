@@ -1,44 +1,228 @@
-from flask import Flask, render_template, request
-from dotenv import load_dotenv
+from flask import Flask, Response, g, jsonify, render_template, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+import json
 import logging
-from app.services.weather_service import get_weather
-from app.errors import WeatherError, WeatherErrorType, get_user_message
-from app.config import setup_logging
-from datetime import datetime
-import platform
+import os
+from app.services.weather_service import get_weather_batch, get_weather_entry, iter_weather, read_cities
+from app.services.forecast_variables import DEFAULT_VARIABLES, VariableSet
+from app.services import geo_service, http_client
+from app.services.records import Record, json_default
+from app import client_limits, health as health_checks, http_cache, metrics, request_context
+from app.page_cache import PageCache, negotiate
+from app.errors import WeatherError, WeatherErrorType, get_http_status, get_user_message
+from app.config import setup_logging, BATCH_MAX_CITIES, SUGGEST_MAX_RESULTS
+
+class WeatherJSONProvider(DefaultJSONProvider):
+    # Parsed forecast rows are compact records; they become dicts only here
+    @staticmethod
+    def default(o):
+        if isinstance(o, Record):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
 
 app = Flask(__name__, template_folder="app/templates", static_folder="app/static")
-load_dotenv()
+app.json = WeatherJSONProvider(app)
 
 # Configure logging
 logger = setup_logging()
 
+page_cache = PageCache(
+    lambda **context: render_template("index.html", **context),
+    os.path.join(app.root_path, app.template_folder, "index.html"),
+)
+with app.test_request_context("/"):
+    page_cache.prerender()
+
+
+@app.before_request
+def start_request():
+    g.request_id = request_context.start_request(request.headers.get("X-Request-ID"))
+
+# Routes that run the weather pipeline; "/" only when the form is posted
+LIMITED_ENDPOINTS = {"home", "weather_page", "weather_api", "weather_batch", "weather_export"}
+PAGE_ENDPOINTS = {"home", "weather_page"}
+
+@app.before_request
+def limit_clients():
+    if request.endpoint not in LIMITED_ENDPOINTS or (request.endpoint == "home" and request.method != "POST"):
+        return None
+    g.client, limit = client_limits.identify(request.remote_addr, request.headers.get("X-API-Key"),
+                                             request.headers.get("X-Forwarded-For"))
+    retry_after = client_limits.check(g.client, limit)
+    if not retry_after:
+        return None
+    if request.endpoint in PAGE_ENDPOINTS:
+        response = page_response(page_cache.error_page(WeatherErrorType.RATE_LIMITED), status=429)
+    else:
+        response = jsonify({"error": {"type": WeatherErrorType.RATE_LIMITED.value,
+                                      **get_user_message(WeatherErrorType.RATE_LIMITED)}})
+        response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    response.cache_control.no_store = True
+    return response
+
+@app.after_request
+def finish_request(response):
+    response.headers["X-Request-ID"] = g.get("request_id", "")
+    logger.info(
+        f"{request.method} {request.path} {response.status_code}",
+        extra={
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": request_context.elapsed_ms(),
+        },
+    )
+    return response
+
+@app.teardown_request
+def clear_request(exc):
+    request_context.end_request()
+
+def page_response(page, status=200):
+    # Serves the pre-compressed variant the client accepts
+    encoding, body = page.select(request.headers.get("Accept-Encoding"))
+    response = Response(body, status=status, mimetype="text/html")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
 
 @app.route("/", methods=["GET", "POST"])
 def home():
-    data = None
-    error = None
-    if request.method == "POST":
-        city = request.form.get("country")
-        try:
-            data = get_weather(city)
-        except WeatherError as e:
-            logger.error(
-                f"Weather error: {str(e)} of type {e.error_type}", exc_info=True
-            )
-            error = get_user_message(e.error_type)
-        except Exception as e:
-            logger.error(f"Unexpected error: {str(e)}", exc_info=True)
-            error = get_user_message(WeatherErrorType.SERVER_ERROR)
-    return render_template("index.html", data=data, error=error)
+    if request.method != "POST":
+        return page_response(page_cache.home_page())
+    city = request.form.get("country")
+    try:
+        data, entry = get_weather_entry(city)
+        page = page_cache.weather_page(data, entry, DEFAULT_VARIABLES)
+    except WeatherError as e:
+        log_weather_error(e)
+        return error_page_response(e.error_type)
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        metrics.ERRORS.inc(type=WeatherErrorType.SERVER_ERROR.value)
+        return error_page_response(WeatherErrorType.SERVER_ERROR)
+    return page_response(page)
+
+def error_page_response(error_type):
+    response = page_response(page_cache.error_page(error_type), status=get_http_status(error_type))
+    response.headers.update(http_cache.error_headers(error_type))
+    return response
+
+def cached_response(kind, city, variables, render, version="", encoding=None):
+    # A conditional request that still matches the cached forecast gets a
+    # 304 before anything is rendered
+    data, entry = get_weather_entry(city, variables)
+    etag = http_cache.encoded_etag(http_cache.forecast_etag(kind, data, entry, variables, version), encoding)
+    not_modified = http_cache.is_not_modified(
+        etag, entry, request.headers.get("If-None-Match"), request.headers.get("If-Modified-Since")
+    )
+    response = Response(status=304) if not_modified else render(data, entry)
+    response.headers.update(http_cache.cache_headers(etag, entry))
+    return response
+
+def log_weather_error(e):
+    logger.error(f"Weather error: {str(e)} of type {e.error_type}", exc_info=True)
+    metrics.ERRORS.inc(type=e.error_type.value)
+
+@app.route("/weather")
+def weather_page():
+    def render(data, entry):
+        return page_response(page_cache.weather_page(data, entry, DEFAULT_VARIABLES))
+
+    try:
+        encoding = negotiate(request.headers.get("Accept-Encoding"))
+        response = cached_response("html", request.args.get("city", ""), DEFAULT_VARIABLES, render,
+                                   page_cache.version, encoding)
+        response.vary.add("Accept-Encoding")
+        return response
+    except WeatherError as e:
+        log_weather_error(e)
+        return error_page_response(e.error_type)
+
+@app.route("/api/weather")
+def weather_api():
+    try:
+        variables = VariableSet.from_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        return cached_response("json", request.args.get("city", ""), variables, lambda data, entry: jsonify(data))
+    except WeatherError as e:
+        log_weather_error(e)
+        response = jsonify({"error": {"type": e.error_type.value, **get_user_message(e.error_type)}})
+        response.status_code = get_http_status(e.error_type)
+        response.headers.update(http_cache.error_headers(e.error_type))
+        return response
+
+@app.route("/api/cities/suggest")
+def suggest_cities():
+    # Served from memory on every keystroke, never from the upstream
+    try:
+        limit = int(request.args.get("limit", SUGGEST_MAX_RESULTS))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    query = request.args.get("q", "")
+    response = jsonify({
+        "query": query,
+        "suggestions": geo_service.suggest_cities(query, max(1, min(limit, SUGGEST_MAX_RESULTS))),
+    })
+    response.cache_control.public = True
+    response.cache_control.max_age = 60
+    return response
+
+@app.route("/api/weather/batch", methods=["POST"])
+def weather_batch():
+    payload = request.get_json(silent=True)
+    cities = payload.get("cities") if isinstance(payload, dict) else None
+    if not isinstance(cities, list) or not all(isinstance(city, str) for city in cities):
+        return jsonify({"error": 'Expected a JSON body like {"cities": ["Haifa", ...]}'}), 400
+    if len(cities) > BATCH_MAX_CITIES:
+        return jsonify({"error": f"At most {BATCH_MAX_CITIES} cities per batch"}), 413
+    try:
+        variables = VariableSet.create(
+            daily=payload.get("daily"),
+            hourly=payload.get("hourly"),
+            forecast_days=payload.get("forecast_days"),
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        results = get_weather_batch(cities, variables)
+    except Exception as e:
+        logger.error(f"Unexpected batch error: {str(e)}", exc_info=True)
+        return jsonify({"error": get_user_message(WeatherErrorType.SERVER_ERROR)}), 500
+    return jsonify({"results": results})
+
+@app.route("/api/weather/export", methods=["POST"])
+def weather_export():
+    # Body is a newline-delimited city list; each city is answered with one
+    # JSON line as soon as it is ready
+    try:
+        variables = VariableSet.from_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        for entry in iter_weather(read_cities(request.stream), variables):
+            yield json.dumps(entry, default=json_default) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route("/health")
 def health():
-    return {
-        "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
-        "version": platform.python_version(),
-    }
+    return health_checks.liveness()
+
+@app.route("/ready")
+def ready():
+    return health_checks.readiness(http_client.pool_stats())
 
 if __name__ == "__main__":
     app.run("0.0.0.0", port=8080)
@@ -1,12 +1,6 @@
 #!/bin/bash
 
-# Number of workers = (2 * CPU cores) + 1
-WORKERS=3
-
-# Start Gunicorn
-gunicorn --workers $WORKERS \
-         --bind 0.0.0.0:8080 \
-         --access-logfile - \
-         --error-logfile - \
-         --reload \
-         wsgi:app
+# Start Gunicorn; worker model and sizing come from gunicorn.conf.py
+# (WEB_PROFILE, WEB_CONCURRENCY, WEB_THREADS). For development with code
+# reloading use `flask --app main run --debug` instead.
+exec gunicorn --config gunicorn.conf.py wsgi:app
@@ -1,6 +1,50 @@
 import os
 import sys
+import pytest
 
 # Add the project root directory to Python path
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    # A settable stand-in for time.time / time.monotonic
+    return FakeClock()
+
+
+@pytest.fixture
+def redis_server():
+    # In-process Redis; clients made with fakeredis.FakeRedis(server=...)
+    # share its data
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture(autouse=True)
+def clear_service_caches():
+    from app import client_limits
+    from app.services import circuit_breaker, rate_limiter
+    from app.services.geo_service import geo_cache
+    from app.services.weather_service import forecast_cache
+    geo_cache.clear()
+    forecast_cache.clear()
+    circuit_breaker.geocoding.reset()
+    circuit_breaker.forecast.reset()
+    rate_limiter.upstream.reset()
+    client_limits.clear()
+    yield
+    geo_cache.clear()
+    forecast_cache.clear()
+    circuit_breaker.geocoding.reset()
+    circuit_breaker.forecast.reset()
+    rate_limiter.upstream.reset()
+    client_limits.clear()
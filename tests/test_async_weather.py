@@ -0,0 +1,223 @@
+import asyncio
+import json
+import time
+import httpx
+import pytest
+from unittest.mock import patch
+from app.services import async_weather
+from app.services.weather_service import forecast_cache
+from app.errors import WeatherError, WeatherErrorType
+
+GEO_RESPONSE = {
+    "results": [{
+        "name": "Test City",
+        "country": "Test Country",
+        "latitude": 32.0,
+        "longitude": 34.0
+    }]
+}
+
+WEATHER_RESPONSE = {
+    'daily': {
+        'time': ['2023-12-01'],
+        'temperature_2m_max': [25.5],
+        'temperature_2m_min': [15.2],
+        'sunrise': ['2023-12-01T06:00'],
+        'sunset': ['2023-12-01T18:00'],
+        'showers_sum': [0.5],
+        'snowfall_sum': [0],
+        'precipitation_probability_max': [30]
+    }
+}
+
+
+class FakeUpstream:
+    def __init__(self, geo=GEO_RESPONSE, weather=WEATHER_RESPONSE, delay=0):
+        self.geo = geo
+        self.weather = weather
+        self.delay = delay
+        self.calls = {"geo": 0, "forecast": 0}
+
+    async def handler(self, request):
+        await asyncio.sleep(self.delay)
+        if request.url.host.startswith("geocoding"):
+            self.calls["geo"] += 1
+            return httpx.Response(200, json=self.geo)
+        self.calls["forecast"] += 1
+        return httpx.Response(200, json=self.weather)
+
+    def client(self):
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+
+@pytest.fixture
+def upstream():
+    fake = FakeUpstream()
+    with patch('app.services.async_weather.get_client', side_effect=lambda: fake.client()):
+        yield fake
+
+
+class TestAsyncWeather:
+    def test_get_weather(self, upstream):
+        result = asyncio.run(async_weather.get_weather("Test City"))
+
+        assert result['name'] == 'Test City'
+        assert result['weather'][0]['temp_max'] == 26
+        assert upstream.calls == {"geo": 1, "forecast": 1}
+
+    def test_shares_caches_with_sync_services(self, upstream):
+        asyncio.run(async_weather.get_weather("Test City"))
+        asyncio.run(async_weather.get_weather(" test city"))
+
+        assert upstream.calls == {"geo": 1, "forecast": 1}
+
+    def test_slow_cache_does_not_block_the_loop(self, upstream):
+        def slow_get(key, default=None):
+            time.sleep(0.2)
+            return default
+
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.ensure_future(ticker())
+            await async_weather.get_weather("Test City")
+            task.cancel()
+            return ticks
+
+        with patch.object(async_weather, 'CACHE_BACKEND', "sqlite"), \
+                patch.object(forecast_cache, 'get', side_effect=slow_get):
+            assert asyncio.run(run()) >= 10
+
+    def test_empty_city(self):
+        with pytest.raises(WeatherError) as exc_info:
+            asyncio.run(async_weather.get_weather(""))
+        assert exc_info.value.error_type == WeatherErrorType.CITY_NOT_FOUND
+
+    def test_not_found(self, upstream):
+        upstream.geo = {"results": []}
+
+        with pytest.raises(WeatherError) as exc_info:
+            asyncio.run(async_weather.get_weather("Nowhere"))
+        assert exc_info.value.error_type == WeatherErrorType.CITY_NOT_FOUND
+
+    def test_network_error(self):
+        def fail(request):
+            raise httpx.ConnectTimeout("timed out")
+        client = httpx.AsyncClient(transport=httpx.MockTransport(fail))
+
+        with patch('app.services.async_weather.get_client', return_value=client):
+            with pytest.raises(WeatherError) as exc_info:
+                asyncio.run(async_weather.get_weather("Test City"))
+        assert exc_info.value.error_type == WeatherErrorType.NETWORK_ERROR
+
+    def test_concurrent_lookups_are_coalesced(self, upstream):
+        upstream.delay = 0.05
+
+        async def many():
+            return await asyncio.gather(*[async_weather.get_weather("Test City") for _ in range(20)])
+
+        results = asyncio.run(many())
+        assert len(results) == 20
+        assert upstream.calls == {"geo": 1, "forecast": 1}
+
+
+class TestAsgiApp:
+    def request(self, method, path, **kwargs):
+        from asgi import app
+
+        async def send():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.request(method, path, **kwargs)
+        return asyncio.run(send())
+
+    def test_health(self):
+        response = self.request("GET", "/health")
+        assert response.status_code == 200
+        assert response.json()["status"] == "healthy"
+
+    def test_ready(self):
+        response = self.request("GET", "/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+
+    def test_home_get(self):
+        response = self.request("GET", "/")
+        assert response.status_code == 200
+        assert b"Enter City" in response.content
+
+    def test_home_post(self, upstream):
+        response = self.request("POST", "/", data={"country": "Test City"})
+        assert response.status_code == 200
+        assert b"Test City, Test Country" in response.content
+
+    def test_home_post_error(self, upstream):
+        upstream.geo = {"results": []}
+        response = self.request("POST", "/", data={"country": "Nowhere"})
+        assert response.status_code == 404
+        assert b"City Not Found" in response.content
+
+    def test_home_head(self):
+        response = self.request("HEAD", "/")
+        assert response.status_code == 200
+        assert response.content == b""
+        assert int(response.headers["content-length"]) > 0
+
+    def test_home_post_invalid_utf8(self, upstream):
+        response = self.request("POST", "/", content=b"country=Test%20City&x=\xff\xfe",
+                                headers={"Content-Type": "application/x-www-form-urlencoded"})
+        assert response.status_code == 200
+        assert b"Test City, Test Country" in response.content
+
+    def test_method_not_allowed(self):
+        response = self.request("POST", "/weather")
+        assert response.status_code == 405
+        assert response.headers["allow"] == "GET, HEAD"
+
+    def test_weather_api(self, upstream):
+        response = self.request("GET", "/api/weather", params={"city": "Test City"})
+        assert response.status_code == 200
+        assert response.json()["name"] == "Test City"
+
+        again = self.request("GET", "/api/weather", params={"city": "Test City"},
+                             headers={"If-None-Match": response.headers["etag"]})
+        assert again.status_code == 304
+
+    def test_weather_api_errors(self, upstream):
+        assert self.request("GET", "/api/weather", params={"city": "X", "daily": "bogus"}).status_code == 400
+        upstream.geo = {"results": []}
+        response = self.request("GET", "/api/weather", params={"city": "Nowhere"})
+        assert response.status_code == 404
+        assert response.json()["error"]["type"] == WeatherErrorType.CITY_NOT_FOUND.value
+
+    def test_weather_batch(self):
+        results = [{"city": "Test City", "data": {"name": "Test City"}}]
+        with patch('app.services.async_weather.get_weather_batch_sync', return_value=results) as batch:
+            response = self.request("POST", "/api/weather/batch", json={"cities": ["Test City"]})
+        assert response.status_code == 200
+        assert response.json() == {"results": results}
+        assert batch.call_args.args[0] == ["Test City"]
+        assert self.request("POST", "/api/weather/batch", content=b"not json").status_code == 400
+
+    def test_weather_export(self, upstream):
+        response = self.request("POST", "/api/weather/export", content=b"Test City\n\nTest City")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        entries = [json.loads(line) for line in response.text.splitlines()]
+        assert [entry["city"] for entry in entries] == ["Test City", "Test City"]
+        assert all(entry["data"]["name"] == "Test City" for entry in entries)
+
+    def test_static(self):
+        response = self.request("GET", "/static/css/styles.css")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "text/css"
+
+    def test_static_traversal(self):
+        response = self.request("GET", "/static/../../main.py")
+        assert response.status_code == 404
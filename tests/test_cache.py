@@ -0,0 +1,313 @@
+import sqlite3
+import time
+import pytest
+from unittest.mock import patch
+from app.services.cache import RedisCache, TTLCache, SQLiteCache, create_cache
+from app.services.codec import BinaryCodec, JSONCodec, MAGIC
+
+
+class TestTTLCache:
+    def test_get_set(self, clock):
+        cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+        cache.set("a", 1)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_expiry(self, clock):
+        cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=30)
+
+        clock.now += 11
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+        assert len(cache) == 1
+
+    def test_lru_eviction(self, clock):
+        cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" is now least recently used
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_incr(self, clock):
+        cache = TTLCache(maxsize=2, ttl=10, clock=clock, codec=BinaryCodec)
+
+        assert cache.incr("a") == 1
+        assert cache.incr("a", 2, ttl=30) == 3
+        clock.now += 11
+        # Expiry is set by the first increment only
+        assert cache.get("a") is None
+        assert cache.incr("a") == 1
+
+    def test_values_skips_expired(self, clock):
+        cache = TTLCache(maxsize=3, ttl=10, clock=clock, codec=BinaryCodec)
+        cache.set("a", {"name": "A"})
+        cache.set("b", {"name": "B"}, ttl=30)
+
+        clock.now += 11
+        assert cache.values() == [{"name": "B"}]
+        assert cache.stats()["hits"] == 0
+
+    def test_clear_resets_counters(self, clock):
+        cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+        cache.set("a", 1)
+        cache.get("a")
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.stats() == {"hits": 0, "misses": 0, "evictions": 0, "size": 0, "maxsize": 2}
+
+
+class TestSQLiteCache:
+    @pytest.fixture
+    def path(self, tmp_path):
+        return str(tmp_path / "cache.db")
+
+    def test_get_set_roundtrip(self, path, clock):
+        cache = SQLiteCache(path, "geo", maxsize=10, ttl=10, clock=clock)
+        cache.set("haifa", {"name": "Haifa", "latitude": 32.8})
+
+        assert cache.get("haifa") == {"name": "Haifa", "latitude": 32.8}
+        assert cache.get("missing") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_shared_between_instances(self, path, clock):
+        worker_a = SQLiteCache(path, "geo", ttl=10, clock=clock)
+        worker_b = SQLiteCache(path, "geo", ttl=10, clock=clock)
+        worker_a.set("haifa", {"name": "Haifa"})
+
+        assert worker_b.get("haifa") == {"name": "Haifa"}
+
+    def test_namespaces_are_isolated(self, path, clock):
+        geo = SQLiteCache(path, "geo", ttl=10, clock=clock)
+        forecast = SQLiteCache(path, "forecast", ttl=10, clock=clock)
+        geo.set("key", 1)
+
+        assert forecast.get("key") is None
+
+    def test_expiry(self, path, clock):
+        cache = SQLiteCache(path, "geo", ttl=10, clock=clock)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=30)
+
+        clock.now += 11
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+
+    def test_lru_eviction(self, path, clock):
+        cache = SQLiteCache(path, "geo", maxsize=2, ttl=10, clock=clock, touch_interval=1)
+        cache.set("a", 1)
+        clock.now += 1
+        cache.set("b", 2)
+        clock.now += 1
+        cache.get("a")
+        clock.now += 1
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["size"] == 2
+
+    def test_recent_hits_are_not_written(self, path, clock):
+        cache = SQLiteCache(path, "geo", ttl=100, clock=clock, touch_interval=30)
+        cache.set("a", 1)
+        conn = cache._connection()
+        writes = conn.total_changes
+
+        clock.now += 10
+        assert cache.get("a") == 1
+        assert conn.total_changes == writes
+        clock.now += 30
+        assert cache.get("a") == 1
+        assert conn.total_changes == writes + 1
+
+    def test_row_count_is_maintained(self, path, clock):
+        worker_a = SQLiteCache(path, "geo", maxsize=10, ttl=10, clock=clock)
+        worker_b = SQLiteCache(path, "geo", maxsize=10, ttl=10, clock=clock)
+        worker_a.set("a", 1)
+        worker_b.set("b", 2)
+        worker_b.set("a", 3)
+        assert worker_a.stats()["size"] == 2
+
+        worker_a.delete("b")
+        clock.now += 11
+        assert worker_b.get("a") is None
+        worker_a.set("c", 1)
+        assert worker_b.stats()["size"] == 1
+        worker_a.clear()
+        assert worker_b.stats()["size"] == 0
+
+    def test_count_starts_from_existing_rows(self, path, clock):
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE cache_geo (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                     "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+        conn.executemany("INSERT INTO cache_geo VALUES (?, '1', 2000, 1000)", [("a",), ("b",)])
+        conn.commit()
+        conn.close()
+
+        cache = SQLiteCache(path, "geo", maxsize=2, ttl=10, clock=clock)
+        assert cache.stats()["size"] == 2
+        cache.set("c", 3)
+        assert cache.stats() == {"hits": 0, "misses": 0, "evictions": 1, "size": 2, "maxsize": 2}
+
+    def test_incr_is_shared(self, path, clock):
+        worker_a = SQLiteCache(path, "inbound", ttl=10, clock=clock, codec=BinaryCodec)
+        worker_b = SQLiteCache(path, "inbound", ttl=10, clock=clock, codec=BinaryCodec)
+
+        assert worker_a.incr("client") == 1
+        assert worker_b.incr("client") == 2
+        assert worker_a.get("client") == 2
+        clock.now += 11
+        assert worker_b.incr("client") == 1
+
+    def test_binary_codec_reads_json_rows(self, path, clock):
+        # Rows written before codecs existed stay readable
+        SQLiteCache(path, "geo", ttl=10, clock=clock).set("haifa", {"name": "Haifa"})
+        cache = SQLiteCache(path, "geo", ttl=10, clock=clock, codec=BinaryCodec)
+        cache.set("tel aviv", {"name": "Tel Aviv"})
+
+        assert cache.get("haifa") == {"name": "Haifa"}
+        assert cache.get("tel aviv") == {"name": "Tel Aviv"}
+
+    def test_unreadable_value_is_miss(self, path, clock):
+        cache = SQLiteCache(path, "geo", ttl=10, clock=clock, codec=BinaryCodec)
+        cache.set("haifa", {"name": "Haifa"})
+
+        with patch('app.services.codec.msgpack', None):
+            assert cache.get("haifa", "default") == "default"
+        assert cache.stats()["misses"] == 1
+
+    def test_values(self, path, clock):
+        cache = SQLiteCache(path, "geo", ttl=10, clock=clock)
+        cache.set("a", {"name": "A"})
+        cache.set("b", {"name": "B"}, ttl=30)
+        with sqlite3.connect(path) as conn:
+            conn.execute("INSERT INTO cache_geo VALUES ('c', 'not json', 100, 0)")
+
+        clock.now += 11
+        assert cache.values() == [{"name": "B"}]
+
+    def test_invalid_namespace(self, path):
+        with pytest.raises(ValueError):
+            SQLiteCache(path, "geo; DROP TABLE x")
+
+
+class TestRedisCache:
+    @pytest.fixture
+    def make(self, redis_server):
+        import fakeredis
+        return lambda namespace="geo", **kwargs: RedisCache(
+            None, namespace, client=fakeredis.FakeRedis(server=redis_server), **kwargs)
+
+    def test_get_set_roundtrip(self, make):
+        cache = make(ttl=10, codec=BinaryCodec)
+        cache.set("haifa", {"name": "Haifa", "latitude": 32.8})
+
+        assert cache.get("haifa") == {"name": "Haifa", "latitude": 32.8}
+        assert cache.get("nowhere", "default") == "default"
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_shared_between_clients(self, make):
+        make().set("haifa", {"name": "Haifa"})
+        assert make().get("haifa") == {"name": "Haifa"}
+
+    def test_namespaces_are_isolated(self, make):
+        make("geo").set("haifa", 1)
+        assert make("forecast").get("haifa") is None
+
+    def test_expiry(self, make):
+        cache = make(ttl=10)
+        cache.set("a", 1, ttl=0.05)
+        cache.set("b", 2)
+
+        time.sleep(0.1)
+        assert cache.get("a") is None
+        assert cache.values() == [2]
+
+    def test_incr(self, make):
+        first, second = make(codec=BinaryCodec), make(codec=JSONCodec)
+
+        assert first.incr("count") == 1
+        assert second.incr("count", 2) == 3
+        assert first.get("count") == 3
+
+    def test_unreadable_value_is_skipped(self, make):
+        cache = make(codec=BinaryCodec)
+        cache.set("good", {"name": "Haifa"})
+        cache._client.set(cache.prefix + "bad", b"not json")
+
+        assert cache.get("bad", "default") == "default"
+        assert cache.values() == [{"name": "Haifa"}]
+
+    def test_clear(self, make):
+        cache = make()
+        other = make("forecast")
+        cache.set("a", 1)
+        other.set("a", 1)
+        cache.clear()
+
+        assert cache.stats()["size"] == 0
+        assert other.get("a") == 1
+
+
+class TestCodecs:
+    ENTRY = {
+        "data": {"daily": {"time": ["2026-10-18"], "temperature_2m_max": [21.3], "weather_code": [3]}},
+        "generated_at": 1792300000.25,
+        "fresh_until": None,
+    }
+
+    @pytest.mark.parametrize("codec", [JSONCodec, BinaryCodec])
+    def test_roundtrip(self, codec):
+        assert codec.loads(codec.dumps(self.ENTRY)) == self.ENTRY
+
+    def test_binary_is_tagged_and_smaller(self):
+        encoded = BinaryCodec.dumps(self.ENTRY)
+        assert encoded.startswith(MAGIC)
+        assert len(encoded) < len(JSONCodec.dumps(self.ENTRY))
+
+    def test_binary_without_msgpack_writes_json(self):
+        with patch('app.services.codec.msgpack', None):
+            encoded = BinaryCodec.dumps(self.ENTRY)
+        assert BinaryCodec.loads(encoded) == self.ENTRY
+
+    def test_memory_cache_stores_encoded_copies(self, clock):
+        cache = TTLCache(ttl=10, clock=clock, codec=BinaryCodec)
+        value = {"temps": [21.3]}
+        cache.set("a", value)
+        value["temps"].append(0.0)
+
+        assert cache.get("a") == {"temps": [21.3]}
+        assert cache.get("a") is not cache.get("a")
+
+
+class TestCreateCache:
+    def test_memory_backend(self):
+        assert isinstance(create_cache("geo", maxsize=10, ttl=10, backend="memory"), TTLCache)
+
+    def test_sqlite_backend(self, tmp_path):
+        with patch('app.services.cache.CACHE_PATH', str(tmp_path / "cache.db")):
+            cache = create_cache("geo", maxsize=10, ttl=10, backend="sqlite")
+        assert isinstance(cache, SQLiteCache)
+
+    def test_codec(self):
+        assert create_cache("geo", maxsize=10, ttl=10, backend="memory").codec is BinaryCodec
+        assert create_cache("geo", maxsize=10, ttl=10, backend="memory", codec="json").codec is JSONCodec
+        with pytest.raises(ValueError):
+            create_cache("geo", maxsize=10, ttl=10, backend="memory", codec="pickle")
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            create_cache("geo", maxsize=10, ttl=10, backend="memcached")
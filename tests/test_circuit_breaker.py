@@ -0,0 +1,146 @@
+import pytest
+import requests
+from unittest.mock import Mock, patch
+from app import metrics
+from app.errors import WeatherError, WeatherErrorType
+from app.services import circuit_breaker
+from app.services.circuit_breaker import CircuitBreaker, CLOSED, HALF_OPEN, OPEN
+from app.services.weather_service import WeatherService, forecast_key, store_forecast, forecast_cache
+from main import app
+
+
+def network_error():
+    raise WeatherError(WeatherErrorType.NETWORK_ERROR)
+
+
+def make_breaker(clock):
+    return CircuitBreaker("test", failure_rate=0.5, min_requests=4, window=10, open_seconds=5, clock=clock)
+
+
+def trip(breaker, count=4):
+    for _ in range(count):
+        with pytest.raises(WeatherError):
+            breaker.call(network_error)
+
+
+class TestCircuitBreaker:
+    def test_opens_at_failure_rate(self, clock):
+        breaker = make_breaker(clock)
+        breaker.call(lambda: "ok")
+        breaker.call(lambda: "ok")
+        trip(breaker, 1)
+        assert breaker.state == CLOSED
+        trip(breaker, 1)
+        assert breaker.state == OPEN
+
+    def test_open_fails_fast(self, clock):
+        breaker = make_breaker(clock)
+        trip(breaker)
+        fn = Mock()
+        with pytest.raises(WeatherError) as exc_info:
+            breaker.call(fn)
+        assert exc_info.value.error_type == WeatherErrorType.NETWORK_ERROR
+        fn.assert_not_called()
+
+    def test_reports_last_error_type(self, clock):
+        breaker = make_breaker(clock)
+
+        def api_error():
+            raise WeatherError(WeatherErrorType.API_ERROR)
+
+        for _ in range(4):
+            with pytest.raises(WeatherError):
+                breaker.call(api_error)
+        with pytest.raises(WeatherError) as exc_info:
+            breaker.call(Mock())
+        assert exc_info.value.error_type == WeatherErrorType.API_ERROR
+
+    def test_ignores_non_upstream_errors(self, clock):
+        breaker = make_breaker(clock)
+
+        def not_found():
+            raise WeatherError(WeatherErrorType.CITY_NOT_FOUND)
+
+        for _ in range(10):
+            with pytest.raises(WeatherError):
+                breaker.call(not_found)
+        assert breaker.state == CLOSED
+
+    def test_old_failures_leave_window(self, clock):
+        breaker = make_breaker(clock)
+        trip(breaker, 3)
+        clock.now += 11
+        trip(breaker, 1)
+        assert breaker.state == CLOSED
+
+    def test_half_open_probe_closes(self, clock):
+        breaker = make_breaker(clock)
+        trip(breaker)
+        clock.now += 5
+        assert breaker.state == HALF_OPEN
+
+        breaker.before_call()
+        # Only one probe at a time
+        with pytest.raises(WeatherError):
+            breaker.before_call()
+        breaker.record_success()
+        assert breaker.state == CLOSED
+        assert breaker.call(lambda: "ok") == "ok"
+
+    def test_half_open_probe_failure_reopens(self, clock):
+        breaker = make_breaker(clock)
+        trip(breaker)
+        clock.now += 5
+        trip(breaker, 1)
+        assert breaker.state == OPEN
+        clock.now += 4
+        assert breaker.state == OPEN
+
+    def test_state_gauge(self, clock):
+        breaker = make_breaker(clock)
+        trip(breaker)
+        assert 'weather_circuit_state{upstream="test"} 2' in metrics.render()
+
+
+class TestServiceIntegration:
+    @patch('requests.Session.get')
+    def test_forecast_circuit_fails_fast(self, mock_get):
+        mock_get.side_effect = requests.exceptions.ConnectionError()
+        service = WeatherService()
+        for i in range(circuit_breaker.forecast.min_requests):
+            with pytest.raises(WeatherError):
+                service.fetch_weather((10.0 + i, 20.0))
+        calls = mock_get.call_count
+
+        with pytest.raises(WeatherError) as exc_info:
+            service.fetch_weather((50.0, 20.0))
+        assert exc_info.value.error_type == WeatherErrorType.NETWORK_ERROR
+        assert mock_get.call_count == calls
+
+    @patch('requests.Session.get')
+    def test_open_circuit_serves_stale_forecast(self, mock_get):
+        mock_get.side_effect = requests.exceptions.ConnectionError()
+        for i in range(circuit_breaker.forecast.min_requests):
+            with pytest.raises(WeatherError):
+                WeatherService().fetch_weather((10.0 + i, 20.0))
+
+        key = forecast_key(50.0, 20.0)
+        store_forecast(key, {"daily": {}})
+        entry = forecast_cache.get(key)
+        entry["fresh_until"] = 0
+        forecast_cache.set(key, entry)
+
+        assert WeatherService().fetch_weather((50.0, 20.0)) == {"daily": {}}
+
+    def test_readiness_reports_circuits(self):
+        client = app.test_client()
+        data = client.get("/ready").get_json()
+        assert data["status"] == "ready"
+        assert data["circuits"] == {"geocoding": CLOSED, "forecast": CLOSED}
+
+        trip(circuit_breaker.geocoding, circuit_breaker.geocoding.min_requests)
+        response = client.get("/ready")
+        data = response.get_json()
+        assert response.status_code == 200
+        assert data["status"] == "degraded"
+        assert data["circuits"]["geocoding"] == OPEN
@@ -0,0 +1,109 @@
+import asyncio
+import ipaddress
+from unittest.mock import patch
+from app import client_limits
+from app.errors import WeatherError, WeatherErrorType
+from asgi import app as asgi_app
+from main import app
+
+WINDOW_START = 60 * 1000.0
+
+
+class TestSlidingWindow:
+    def test_limit_within_window(self):
+        assert [client_limits.check("ip:a", 3, now=WINDOW_START + i) for i in range(3)] == [0, 0, 0]
+        assert client_limits.check("ip:a", 3, now=WINDOW_START + 3) > 0
+        # Other clients have their own count
+        assert client_limits.check("ip:b", 3, now=WINDOW_START + 3) == 0
+
+    def test_previous_window_slides_out(self):
+        for _ in range(4):
+            client_limits.check("ip:a", 4, now=WINDOW_START)
+
+        # Half of the previous window still overlaps: 4 * 0.5 + 2 <= 4
+        assert client_limits.check("ip:a", 4, now=WINDOW_START + 90) == 0
+        assert client_limits.check("ip:a", 4, now=WINDOW_START + 90) == 0
+        retry_after = client_limits.check("ip:a", 4, now=WINDOW_START + 90)
+        assert 0 < retry_after <= 30
+
+    def test_zero_disables(self):
+        assert all(client_limits.check("ip:a", 0) == 0 for _ in range(100))
+
+    def test_identify(self):
+        with patch('app.client_limits.API_KEYS', frozenset({"secret"})):
+            assert client_limits.identify("10.0.0.1", "secret")[0].startswith("key:")
+            assert client_limits.identify("10.0.0.1", "secret")[1] == client_limits.INBOUND_API_KEY_LIMIT
+            assert client_limits.identify("10.0.0.1", "guess") == ("ip:10.0.0.1", client_limits.INBOUND_LIMIT)
+
+    def test_off_by_default(self):
+        assert client_limits.INBOUND_LIMIT == 0
+
+    @patch('app.client_limits._trusted', (ipaddress.ip_network("10.0.0.0/8"),))
+    def test_forwarded_for_from_trusted_proxy(self):
+        # Load balancer 10.0.0.2 forwarding for 203.0.113.7 via proxy 10.0.0.9
+        assert client_limits.client_address("10.0.0.2", "203.0.113.7, 10.0.0.9") == "203.0.113.7"
+        # Whatever the client itself put in the header is ignored
+        assert client_limits.client_address("10.0.0.2", "1.2.3.4, 203.0.113.7") == "203.0.113.7"
+        # An untrusted peer can't pick its address
+        assert client_limits.client_address("198.51.100.1", "203.0.113.7") == "198.51.100.1"
+        assert client_limits.client_address("10.0.0.2", None) == "10.0.0.2"
+
+
+class TestRoutes:
+    @patch('app.client_limits.INBOUND_LIMIT', 1)
+    @patch('app.client_limits._trusted', (ipaddress.ip_network("127.0.0.1/32"),))
+    @patch('main.get_weather_entry', side_effect=WeatherError(WeatherErrorType.CITY_NOT_FOUND))
+    def test_clients_behind_proxy_have_own_limits(self, mock_get_weather):
+        client = app.test_client()
+        first = {"X-Forwarded-For": "203.0.113.7"}
+        second = {"X-Forwarded-For": "203.0.113.8"}
+
+        assert client.get("/api/weather?city=X", headers=first).status_code == 404
+        assert client.get("/api/weather?city=X", headers=second).status_code == 404
+        assert client.get("/api/weather?city=X", headers=first).status_code == 429
+
+    @patch('app.client_limits.INBOUND_LIMIT', 2)
+    @patch('main.get_weather_entry', side_effect=WeatherError(WeatherErrorType.CITY_NOT_FOUND))
+    def test_api_limited_per_address(self, mock_get_weather):
+        client = app.test_client()
+        statuses = [client.get("/api/weather?city=Nowhere").status_code for _ in range(3)]
+
+        assert statuses == [404, 404, 429]
+        response = client.get("/api/weather?city=Nowhere")
+        assert response.get_json()["error"]["type"] == "RATE_LIMITED"
+        assert int(response.headers["Retry-After"]) > 0
+        other = client.get("/api/weather?city=Nowhere", environ_base={"REMOTE_ADDR": "10.0.0.2"})
+        assert other.status_code == 404
+
+    @patch('app.client_limits.INBOUND_LIMIT', 1)
+    def test_home_page_itself_is_not_limited(self):
+        client = app.test_client()
+        assert [client.get("/").status_code for _ in range(3)] == [200, 200, 200]
+
+    @patch('app.client_limits.INBOUND_LIMIT', 1)
+    @patch('main.get_weather_entry', side_effect=WeatherError(WeatherErrorType.CITY_NOT_FOUND))
+    def test_limited_form_gets_error_page(self, mock_get_weather):
+        client = app.test_client()
+        client.post("/", data={"country": "Nowhere"})
+        response = client.post("/", data={"country": "Elsewhere"})
+
+        assert response.status_code == 429
+        assert b"Too Many Requests" in response.data
+
+    @patch('app.client_limits.INBOUND_LIMIT', 1)
+    def test_asgi_weather_page(self):
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": "/weather", "query_string": b"city=Nowhere",
+                 "headers": [], "client": ("10.0.0.3", 5000)}
+        with patch('app.services.async_weather.fetch', return_value={"results": []}):
+            asyncio.run(asgi_app(scope, receive, send))
+            asyncio.run(asgi_app(scope, receive, send))
+
+        assert [message["status"] for message in sent if "status" in message] == [404, 429]
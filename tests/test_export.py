@@ -0,0 +1,85 @@
+import io
+import json
+import threading
+import time
+from unittest.mock import patch
+from app.services import weather_service
+from app.services.weather_service import iter_weather, read_cities
+from app.errors import WeatherError, WeatherErrorType
+from main import app
+
+
+def fake_get_weather(city, variables=None):
+    if city == "Nowhere":
+        raise WeatherError(WeatherErrorType.CITY_NOT_FOUND)
+    return {"name": city, "weather": []}
+
+
+class TestIterWeather:
+    @patch('app.services.weather_service.get_weather', side_effect=fake_get_weather)
+    def test_yields_every_city(self, mock_get_weather):
+        entries = list(iter_weather(["Haifa", "Nowhere", "Paris"], concurrency=2))
+
+        by_city = {entry["city"]: entry for entry in entries}
+        assert set(by_city) == {"Haifa", "Nowhere", "Paris"}
+        assert by_city["Haifa"]["data"]["name"] == "Haifa"
+        assert by_city["Nowhere"]["error"]["type"] == "CITY_NOT_FOUND"
+
+    @patch('app.services.weather_service.get_weather')
+    def test_bounded_concurrency_and_lazy_input(self, mock_get_weather):
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0, "read": 0}
+
+        def slow(city, variables):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.01)
+            with lock:
+                state["active"] -= 1
+            return {"name": city}
+        mock_get_weather.side_effect = slow
+
+        def cities():
+            for i in range(50):
+                state["read"] += 1
+                yield f"city-{i}"
+
+        stream = iter_weather(cities(), concurrency=3)
+        next(stream)
+        assert state["read"] <= 4
+        assert len(list(stream)) == 49
+        assert state["peak"] <= 3
+
+    @patch('app.services.weather_service.get_weather', side_effect=RuntimeError("boom"))
+    def test_unexpected_error_is_reported_inline(self, mock_get_weather):
+        entries = list(iter_weather(["Haifa"]))
+        assert entries[0]["error"]["type"] == "SERVER_ERROR"
+
+    def test_read_cities(self):
+        assert list(read_cities([b"Haifa\n", b"\n", "  Paris \n"])) == ["Haifa", "Paris"]
+
+
+class TestExportEndpoint:
+    @patch('app.services.weather_service.get_weather', side_effect=fake_get_weather)
+    def test_streams_ndjson(self, mock_get_weather):
+        response = app.test_client().post("/api/weather/export", data="Haifa\nNowhere\n\nParis\n")
+
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert sorted(entry["city"] for entry in lines) == ["Haifa", "Nowhere", "Paris"]
+
+    def test_invalid_variables(self):
+        response = app.test_client().post("/api/weather/export?forecast_days=abc", data="Haifa\n")
+        assert response.status_code == 400
+
+
+class TestExportCli:
+    @patch('app.services.weather_service.get_weather', side_effect=fake_get_weather)
+    def test_export_command(self, mock_get_weather, capsys):
+        with patch('sys.stdin', io.StringIO("Haifa\nParis\n")):
+            weather_service.main(["export", "--concurrency", "2"])
+
+        lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert sorted(entry["city"] for entry in lines) == ["Haifa", "Paris"]
@@ -0,0 +1,59 @@
+import pytest
+from app.services.forecast_variables import (
+    DEFAULT_DAILY,
+    DEFAULT_VARIABLES,
+    HourlyColumn,
+    VariableSet,
+    WeatherColumn,
+)
+
+
+class TestVariableSet:
+    def test_defaults(self):
+        variables = VariableSet.create()
+        assert variables == DEFAULT_VARIABLES
+        assert variables.daily == DEFAULT_DAILY
+        assert variables.hourly == ()
+        assert variables.forecast_days == 7
+
+    def test_canonical_order_and_duplicates(self):
+        a = VariableSet.create(daily=["sunset", "temperature_2m_max", "sunset"])
+        b = VariableSet.create(daily=["temperature_2m_max", "sunset"])
+        assert a == b
+        assert a.daily == (WeatherColumn.TEMP_MAX.value, WeatherColumn.SUNSET.value)
+        assert a.key == b.key
+
+    def test_hourly_only(self):
+        variables = VariableSet.create(daily=[], hourly=["wind_speed_10m", "temperature_2m"])
+        assert variables.daily == ()
+        assert variables.hourly == (HourlyColumn.TEMPERATURE.value, HourlyColumn.WIND_SPEED.value)
+        assert variables.params == {"forecast_days": 7, "hourly": "temperature_2m,wind_speed_10m"}
+
+    @pytest.mark.parametrize("kwargs", [
+        {"daily": ["temperature_2m"]},
+        {"hourly": ["sunrise"]},
+        {"daily": [], "hourly": []},
+        {"forecast_days": 0},
+        {"forecast_days": 17},
+        {"forecast_days": "7"},
+        {"forecast_days": True},
+    ])
+    def test_invalid(self, kwargs):
+        with pytest.raises(ValueError):
+            VariableSet.create(**kwargs)
+
+    def test_params_are_precomputed(self):
+        variables = VariableSet.create(hourly=["precipitation"], forecast_days=3)
+        assert variables.params is VariableSet.create(hourly=["precipitation"], forecast_days=3).params
+        assert variables.params["daily"] == ",".join(DEFAULT_DAILY)
+        assert variables.params["hourly"] == "precipitation"
+        assert variables.params["forecast_days"] == 3
+
+    def test_keys_differ_by_variables(self):
+        keys = {
+            DEFAULT_VARIABLES.key,
+            VariableSet.create(forecast_days=3).key,
+            VariableSet.create(hourly=["precipitation"]).key,
+            VariableSet.create(daily=["sunrise"]).key,
+        }
+        assert len(keys) == 4
@@ -0,0 +1,110 @@
+import pytest
+from unittest.mock import patch
+from app.services import geo_service
+from app.services.gazetteer import Gazetteer, build_index, load_country_names, normalize, main
+
+ROWS = [
+    # geonameid, name, asciiname, alternatenames, lat, lon, class, code, cc, ..., population
+    ["294801", "Haifa", "Haifa", "Hefa,Haïfa", "32.81841", "34.9885", "P", "PPLA", "IL", "", "", "", "", "", "267300"],
+    ["2988507", "Paris", "Paris", "Lutetia", "48.85341", "2.3488", "P", "PPLC", "FR", "", "", "", "", "", "2138551"],
+    ["4717560", "Paris", "Paris", "", "33.66094", "-95.55551", "P", "PPLA2", "US", "", "", "", "", "", "24782"],
+    ["3448439", "São Paulo", "Sao Paulo", "", "-23.5475", "-46.63611", "P", "PPLA", "BR", "", "", "", "", "", "10021295"],
+    ["2643743", "London", "London", "", "51.50853", "-0.12574", "P", "PPLC", "GB", "", "", "", "", "", "8961989"],
+    ["6058560", "London", "London", "", "42.98339", "-81.23304", "P", "PPL", "CA", "", "", "", "", "", "346765"],
+    ["2635167", "Thames", "Thames", "", "51.5", "0.5", "H", "STM", "GB", "", "", "", "", "", "0"],
+]
+
+COUNTRIES = "#ISO\tISO3\tISO-Numeric\tfips\tCountry\n" + "\n".join(
+    f"{code}\t\t\t\t{name}" for code, name in
+    [("IL", "Israel"), ("FR", "France"), ("US", "United States"), ("BR", "Brazil"), ("GB", "United Kingdom")]
+)
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    dump = tmp_path / "cities.txt"
+    dump.write_text("\n".join("\t".join(row) for row in ROWS) + "\n", encoding="utf-8")
+    countries = tmp_path / "countryInfo.txt"
+    countries.write_text(COUNTRIES, encoding="utf-8")
+
+    path = tmp_path / "gazetteer.idx"
+    build_index(str(dump), str(path), load_country_names(str(countries)), alternate_names=True)
+    return str(path)
+
+
+@pytest.fixture
+def gazetteer(index_path):
+    gazetteer = Gazetteer(index_path)
+    yield gazetteer
+    gazetteer.close()
+
+
+class TestNormalize:
+    def test_case_accents_and_spaces(self):
+        assert normalize("  São   PAULO ") == "sao paulo"
+        assert normalize("Haïfa") == "haifa"
+
+
+class TestGazetteer:
+    def test_lookup_exact(self, gazetteer):
+        record = gazetteer.lookup("haifa")
+        assert record["name"] == "Haifa"
+        assert record["country"] == "Israel"
+        assert record["latitude"] == 32.81841
+
+    def test_lookup_prefers_most_populous(self, gazetteer):
+        assert gazetteer.lookup("Paris")["country"] == "France"
+        assert gazetteer.lookup("london")["country"] == "United Kingdom"
+
+    def test_lookup_accent_insensitive(self, gazetteer):
+        assert gazetteer.lookup("sao paulo")["name"] == "São Paulo"
+        assert gazetteer.lookup("SÃO PAULO")["name"] == "São Paulo"
+
+    def test_lookup_alternate_names(self, gazetteer):
+        assert gazetteer.lookup("Hefa")["name"] == "Haifa"
+
+    def test_lookup_miss(self, gazetteer):
+        assert gazetteer.lookup("Atlantis") is None
+        assert gazetteer.lookup("Thames") is None  # not a populated place
+
+    def test_prefix(self, gazetteer):
+        results = gazetteer.prefix("pa")
+        assert [(r["name"], r["country"]) for r in results] == [
+            ("Paris", "France"), ("Paris", "United States")
+        ]
+        assert gazetteer.prefix("lo", limit=1)[0]["country"] == "United Kingdom"
+        assert gazetteer.prefix("") == []
+        assert gazetteer.prefix("zz") == []
+
+    def test_invalid_index(self, tmp_path):
+        path = tmp_path / "bad.idx"
+        path.write_bytes(b"nope" + b"\0" * 8)
+        with pytest.raises(ValueError):
+            Gazetteer(str(path))
+
+    def test_cli_lookup(self, index_path, capsys):
+        main(["lookup", index_path, "sao"])
+        assert "São Paulo, Brazil" in capsys.readouterr().out
+
+
+class TestGetGeoWithGazetteer:
+    @pytest.fixture(autouse=True)
+    def use_gazetteer(self, gazetteer):
+        with patch.object(geo_service, '_gazetteer', gazetteer), \
+                patch.object(geo_service, '_gazetteer_loaded', True):
+            yield
+
+    @patch('app.services.geo_service.fetch')
+    def test_hit_skips_network(self, mock_fetch):
+        geo = geo_service.get_geo("Haïfa")
+
+        assert geo.name == "Haifa"
+        assert geo.country == "Israel"
+        assert not mock_fetch.called
+
+    @patch('app.services.geo_service.fetch')
+    def test_miss_falls_back_to_api(self, mock_fetch):
+        mock_fetch.return_value = {"results": [{"name": "Eilat", "country": "Israel", "latitude": 29.5, "longitude": 34.9}]}
+
+        assert geo_service.get_geo("Eilat").name == "Eilat"
+        assert mock_fetch.call_count == 1
@@ -1,7 +1,7 @@
 import pytest
 import requests
 from unittest.mock import Mock, patch
-from app.services.geo_service import GeoModel, fetch, get_geo
+from app.services.geo_service import GeoModel, fetch, get_geo, geo_cache
 from app.errors import WeatherError, WeatherErrorType
 
 @pytest.fixture
@@ -40,6 +40,9 @@ class TestGeoModel:
         url = GeoModel.get_url("San Francisco")
         assert "name=San+Francisco" in url
 
+    def test_cache_key(self):
+        assert GeoModel.cache_key("  New   York ") == GeoModel.cache_key("new york")
+
     def test_save_country_geo(self, geo_model):
         data = {
             "name": "Test City",
@@ -55,7 +58,7 @@ class TestGeoModel:
         assert geo_model.longitude == 34.0
 
 class TestFetch:
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_fetch_success(self, mock_get, mock_geo_response):
         mock_response = Mock()
         mock_response.status_code = 200
@@ -65,7 +68,7 @@ class TestFetch:
         result = fetch("test_url")
         assert result == mock_geo_response
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_fetch_city_not_found(self, mock_get):
         mock_response = Mock()
         mock_response.status_code = 404
@@ -75,7 +78,7 @@ class TestFetch:
             fetch("test_url")
         assert exc_info.value.error_type == WeatherErrorType.CITY_NOT_FOUND
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_fetch_network_error(self, mock_get):
         mock_get.side_effect = requests.exceptions.ConnectionError()
 
@@ -83,7 +86,7 @@ class TestFetch:
             fetch("test_url")
         assert exc_info.value.error_type == WeatherErrorType.NETWORK_ERROR
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_fetch_invalid_json(self, mock_get):
         mock_response = Mock()
         mock_response.status_code = 200
@@ -127,3 +130,36 @@ class TestGetGeo:
         with pytest.raises(WeatherError) as exc_info:
             get_geo("Test City")
         assert exc_info.value.error_type == WeatherErrorType.SERVER_ERROR
+
+class TestGeoCache:
+    @patch('app.services.geo_service.fetch')
+    def test_repeated_lookup_hits_cache(self, mock_fetch, mock_geo_response):
+        mock_fetch.return_value = mock_geo_response
+
+        first = get_geo("Test City")
+        second = get_geo("  test city ")
+
+        assert mock_fetch.call_count == 1
+        assert second.name == first.name
+        assert second.latitude == 32.0
+        assert geo_cache.stats()["hits"] == 1
+
+    @patch('app.services.geo_service.fetch')
+    def test_not_found_is_negatively_cached(self, mock_fetch):
+        mock_fetch.return_value = {"results": []}
+
+        for _ in range(3):
+            with pytest.raises(WeatherError) as exc_info:
+                get_geo("Atlantiss")
+            assert exc_info.value.error_type == WeatherErrorType.CITY_NOT_FOUND
+
+        assert mock_fetch.call_count == 1
+
+    @patch('app.services.geo_service.fetch')
+    def test_upstream_errors_are_not_cached(self, mock_fetch, mock_geo_response):
+        mock_fetch.side_effect = [WeatherError(WeatherErrorType.NETWORK_ERROR), mock_geo_response]
+
+        with pytest.raises(WeatherError):
+            get_geo("Test City")
+        assert get_geo("Test City").name == "Test City"
+        assert mock_fetch.call_count == 2
@@ -0,0 +1,58 @@
+import os
+import runpy
+import pytest
+from unittest.mock import patch
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gunicorn.conf.py")
+
+
+def load_config(cores=2, **env):
+    with patch.dict(os.environ, env), patch('os.sched_getaffinity', return_value=set(range(cores))), \
+            patch('builtins.open', side_effect=OSError):
+        return runpy.run_path(CONFIG_PATH)
+
+
+class TestProfiles:
+    def test_gthread_is_default(self):
+        config = load_config(WEB_PROFILE="gthread")
+        assert config["worker_class"] == "gthread"
+        assert (config["workers"], config["threads"]) == (3, 8)
+        assert config["preload_app"] is True
+
+    def test_sync(self):
+        config = load_config(cores=4, WEB_PROFILE="sync")
+        assert (config["worker_class"], config["workers"], config["threads"]) == ("sync", 9, 1)
+
+    def test_gevent(self):
+        pytest.importorskip("gevent")
+        with patch('gevent.monkey.patch_all') as patch_all:
+            config = load_config(WEB_PROFILE="gevent", WEB_CONNECTIONS="100")
+        patch_all.assert_called_once()
+        assert (config["worker_class"], config["workers"], config["worker_connections"]) == ("gevent", 2, 100)
+
+    def test_overrides(self):
+        config = load_config(WEB_PROFILE="gthread", WEB_CONCURRENCY="5", WEB_THREADS="2", PORT="9000")
+        assert (config["workers"], config["threads"], config["bind"]) == (5, 2, "0.0.0.0:9000")
+
+    def test_unknown_profile(self):
+        with pytest.raises(ValueError):
+            load_config(WEB_PROFILE="eventlet")
+
+    def test_max_requests_jitter(self):
+        config = load_config(WEB_PROFILE="gthread", MAX_REQUESTS="1000")
+        assert (config["max_requests"], config["max_requests_jitter"]) == (1000, 100)
+
+
+def test_cgroup_quota_limits_workers(tmp_path):
+    with patch.dict(os.environ, {"WEB_PROFILE": "sync"}):
+        config = runpy.run_path(CONFIG_PATH)
+    real_open = open
+
+    def fake_open(path, *args, **kwargs):
+        if path == "/sys/fs/cgroup/cpu.max":
+            return real_open(tmp_path / "cpu.max", *args, **kwargs)
+        return real_open(path, *args, **kwargs)
+
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    with patch('os.sched_getaffinity', return_value=set(range(8))), patch('builtins.open', fake_open):
+        assert config["cpu_count"]() == 2
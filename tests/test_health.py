@@ -0,0 +1,82 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+from app.services import http_client
+from app.services.weather_service import forecast_cache
+from main import app
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Wall time for a fresh interpreter to import the app and answer /ready; a
+# warm laptop does it in well under a second
+COLD_START_BUDGET = 5.0
+
+
+class TestLiveness:
+    def test_health(self):
+        response = app.test_client().get("/health")
+        data = response.get_json()
+        assert response.status_code == 200
+        assert data["status"] == "healthy"
+        assert data["timestamp"].endswith("+00:00")
+
+    def test_health_ignores_dependencies(self):
+        with patch.object(forecast_cache, 'get', side_effect=sqlite3.OperationalError("disk I/O error")):
+            assert app.test_client().get("/health").status_code == 200
+
+
+class TestReadiness:
+    def test_ready(self):
+        response = app.test_client().get("/ready")
+        data = response.get_json()
+        assert response.status_code == 200
+        assert data["status"] == "ready"
+        assert data["cache"] == {"backend": "memory", "reachable": True, "warm": True}
+        assert data["pools"]["saturated"] == []
+
+    def test_cache_unreachable(self):
+        with patch.object(forecast_cache, 'get', side_effect=sqlite3.OperationalError("disk I/O error")):
+            response = app.test_client().get("/ready")
+        assert response.status_code == 503
+        assert response.get_json()["status"] == "unavailable"
+
+    def test_saturated_pool_degrades(self):
+        pools = {"api.open-meteo.com": {"size": 2, "in_use": 2, "idle": 0}}
+        with patch.object(http_client, 'pool_stats', return_value=pools):
+            response = app.test_client().get("/ready")
+        data = response.get_json()
+        assert response.status_code == 200
+        assert data["status"] == "degraded"
+        assert data["pools"] == {"saturated": ["api.open-meteo.com"], "hosts": pools}
+
+
+def run_cold(code):
+    env = {**os.environ, "CACHE_BACKEND": "memory", "HOT_CITIES": "", "HOT_CITIES_FILE": ""}
+    env.pop("METRICS_DIR", None)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1]), time.perf_counter() - start
+
+
+class TestColdStart:
+    def test_ready_within_budget(self):
+        output, elapsed = run_cold(
+            "import json, main\n"
+            "response = main.app.test_client().get('/ready')\n"
+            "print(json.dumps(response.status_code))"
+        )
+        assert output == 200
+        assert elapsed < COLD_START_BUDGET
+
+    def test_wsgi_import_skips_async_and_cli_modules(self):
+        loaded, _ = run_cold(
+            "import json, sys, main\n"
+            "print(json.dumps([m for m in ('asyncio', 'argparse', 'httpx') if m in sys.modules]))"
+        )
+        assert loaded == []
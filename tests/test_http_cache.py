@@ -0,0 +1,196 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import Mock, patch
+from werkzeug.http import http_date
+from app import http_cache
+from app.services.forecast_variables import DEFAULT_VARIABLES
+from app.services.weather_service import forecast_key, store_forecast
+from asgi import app as asgi_app
+from main import app
+
+GEO = {"results": [{"name": "Test City", "country": "Test Country", "latitude": 32.0, "longitude": 34.0}]}
+
+FORECAST = {
+    'daily': {
+        'time': ['2023-12-01'],
+        'temperature_2m_max': [25.5],
+        'temperature_2m_min': [15.2],
+        'sunrise': ['06:00'],
+        'sunset': ['18:00'],
+        'showers_sum': [0.5],
+        'snowfall_sum': [0],
+        'precipitation_probability_max': [30]
+    }
+}
+
+
+@pytest.fixture
+def upstream():
+    with patch('app.services.geo_service.fetch', return_value=GEO) as mock_fetch, \
+            patch('requests.Session.get') as mock_get:
+        mock_get.return_value = Mock(status_code=200, json=lambda: FORECAST)
+        yield mock_fetch, mock_get
+
+
+class TestValidators:
+    def test_etag_follows_generation_time(self):
+        data = {"name": "Haifa", "country": "Israel"}
+        first = http_cache.forecast_etag("html", data, {"generated_at": 1.0}, DEFAULT_VARIABLES)
+        assert first == http_cache.forecast_etag("html", data, {"generated_at": 1.0}, DEFAULT_VARIABLES)
+        assert first != http_cache.forecast_etag("html", data, {"generated_at": 2.0}, DEFAULT_VARIABLES)
+        assert first != http_cache.forecast_etag("json", data, {"generated_at": 1.0}, DEFAULT_VARIABLES)
+        # A new template changes the page's ETag
+        assert first != http_cache.forecast_etag("html", data, {"generated_at": 1.0}, DEFAULT_VARIABLES, "v2")
+
+    def test_max_age_is_remaining_freshness(self):
+        headers = http_cache.cache_headers("abc", {"generated_at": time.time(), "fresh_until": time.time() + 120})
+        assert headers["ETag"] == '"abc"'
+        assert headers["Cache-Control"] in ("public, max-age=119", "public, max-age=120")
+
+    def test_stale_forecast_has_zero_max_age(self):
+        headers = http_cache.cache_headers("abc", {"generated_at": 0, "fresh_until": time.time() - 10})
+        assert headers["Cache-Control"] == "public, max-age=0"
+
+    def test_conditions(self):
+        entry = {"generated_at": 1_700_000_000.5}
+        assert http_cache.is_not_modified("abc", entry, '"abc"')
+        assert http_cache.is_not_modified("abc", entry, 'W/"abc", "other"')
+        assert http_cache.is_not_modified("abc", entry, "*")
+        assert not http_cache.is_not_modified("abc", entry, '"other"')
+        assert http_cache.is_not_modified("abc", entry, if_modified_since=http_date(1_700_000_000))
+        assert not http_cache.is_not_modified("abc", entry, if_modified_since=http_date(1_699_999_999))
+        assert not http_cache.is_not_modified("abc", entry)
+
+
+class TestWeatherRoutes:
+    def test_page_is_cacheable(self, upstream):
+        response = app.test_client().get("/weather?city=Test+City")
+
+        assert response.status_code == 200
+        assert b"Test City" in response.data
+        assert response.headers["ETag"]
+        assert response.headers["Last-Modified"]
+        assert response.headers["Cache-Control"].startswith("public, max-age=")
+
+    def test_if_none_match_skips_rendering(self, upstream):
+        client = app.test_client()
+        etag = client.get("/weather?city=Test+City").headers["ETag"]
+
+        with patch('main.render_template') as mock_render:
+            response = client.get("/weather?city=Test+City", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.data == b""
+        assert response.headers["ETag"] == etag
+        mock_render.assert_not_called()
+
+    def test_if_modified_since(self, upstream):
+        client = app.test_client()
+        last_modified = client.get("/api/weather?city=Test+City").headers["Last-Modified"]
+
+        response = client.get("/api/weather?city=Test+City", headers={"If-Modified-Since": last_modified})
+        assert response.status_code == 304
+
+    def test_new_forecast_changes_etag(self, upstream):
+        client = app.test_client()
+        etag = client.get("/api/weather?city=Test+City").headers["ETag"]
+
+        with patch('app.services.weather_service.time.time', return_value=time.time() + 60):
+            store_forecast(forecast_key(32.0, 34.0), FORECAST)
+        response = client.get("/api/weather?city=Test+City", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    def test_etag_differs_per_content_coding(self, upstream):
+        client = app.test_client()
+        identity = client.get("/weather?city=Test+City")
+        gzipped = client.get("/weather?city=Test+City", headers={"Accept-Encoding": "gzip"})
+
+        assert gzipped.headers["Content-Encoding"] == "gzip"
+        assert gzipped.headers["ETag"] == identity.headers["ETag"][:-1] + '-gzip"'
+        # The identity validator doesn't match the gzip representation
+        response = client.get("/weather?city=Test+City",
+                              headers={"Accept-Encoding": "gzip", "If-None-Match": identity.headers["ETag"]})
+        assert response.status_code == 200
+
+    def test_not_modified_keeps_vary(self, upstream):
+        client = app.test_client()
+        etag = client.get("/weather?city=Test+City", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+
+        response = client.get("/weather?city=Test+City",
+                              headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["Vary"] == "Accept-Encoding"
+
+    def test_new_template_changes_etag(self, upstream):
+        from main import page_cache
+        client = app.test_client()
+        etag = client.get("/weather?city=Test+City").headers["ETag"]
+
+        with patch.object(page_cache, 'version', "deployed"):
+            response = client.get("/weather?city=Test+City", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    def test_json_twin(self, upstream):
+        response = app.test_client().get("/api/weather?city=Test+City&daily=temperature_2m_max")
+
+        assert response.status_code == 200
+        assert response.get_json()["weather"][0]["temp_max"] == 26
+        assert response.headers["Cache-Control"].startswith("public, max-age=")
+
+    def test_json_and_html_have_different_etags(self, upstream):
+        client = app.test_client()
+        assert client.get("/weather?city=Test+City").headers["ETag"] != \
+            client.get("/api/weather?city=Test+City").headers["ETag"]
+
+    def test_errors_are_not_cached(self):
+        with patch('app.services.geo_service.fetch', return_value={}):
+            client = app.test_client()
+            page = client.get("/weather?city=Nowhere")
+            api = client.get("/api/weather?city=Nowhere")
+
+        assert page.status_code == 404
+        assert b"City Not Found" in page.data
+        assert api.status_code == 404
+        assert api.get_json()["error"]["type"] == "CITY_NOT_FOUND"
+        assert page.headers["Cache-Control"] == "no-store"
+        assert api.headers["Cache-Control"] == "no-store"
+
+    def test_invalid_variables(self):
+        response = app.test_client().get("/api/weather?city=Haifa&forecast_days=many")
+        assert response.status_code == 400
+
+
+class TestAsgiWeatherPage:
+    def call(self, path, query, headers=()):
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": path, "query_string": query, "headers": list(headers)}
+        asyncio.run(asgi_app(scope, receive, send))
+        return sent[0]["status"], dict(sent[0]["headers"]), sent[1]["body"]
+
+    def test_conditional_get(self):
+        with patch('app.services.async_weather.fetch', return_value=GEO), \
+                patch('app.services.async_weather._request_forecast', return_value=FORECAST):
+            status, headers, body = self.call("/weather", b"city=Test+City")
+            assert status == 200
+            assert b"Test City" in body
+
+            status, not_modified, body = self.call("/weather", b"city=Test+City",
+                                                   [(b"if-none-match", headers[b"etag"])])
+            assert status == 304
+            assert body == b""
+            assert not_modified[b"vary"] == b"Accept-Encoding"
+
+            _, gzipped, _ = self.call("/weather", b"city=Test+City", [(b"accept-encoding", b"gzip")])
+            assert gzipped[b"etag"] == headers[b"etag"][:-1] + b'-gzip"'
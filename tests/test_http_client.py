@@ -0,0 +1,73 @@
+import pytest
+import requests
+from unittest.mock import patch
+from app.services import http_client
+from app.services.geo_service import fetch
+from app.services.weather_service import WeatherService
+from app.errors import WeatherError, WeatherErrorType
+
+
+@pytest.fixture(autouse=True)
+def fresh_session():
+    http_client._session = None
+    yield
+    http_client._session = None
+
+
+class TestSession:
+    def test_session_is_reused(self):
+        assert http_client.get_session() is http_client.get_session()
+
+    def test_session_rebuilt_after_fork(self):
+        session = http_client.get_session()
+        with patch('os.getpid', return_value=http_client._session_pid + 1):
+            assert http_client.get_session() is not session
+
+    def test_adapter_pool_and_retry(self):
+        adapter = http_client.get_session().get_adapter("https://api.open-meteo.com")
+        assert adapter._pool_maxsize == http_client.HTTP_POOL_SIZE
+        assert adapter.max_retries.total == http_client.HTTP_RETRIES
+        assert adapter.max_retries.allowed_methods == frozenset(["GET"])
+        assert adapter.max_retries.backoff_jitter == http_client.HTTP_BACKOFF_JITTER
+
+    def test_pool_stats(self):
+        assert http_client.pool_stats() == {}
+        pool = http_client.get_session().get_adapter("https://").poolmanager.connection_from_url(
+            "https://api.open-meteo.com")
+        conn = pool._get_conn()
+
+        assert http_client.pool_stats() == {
+            "api.open-meteo.com": {"size": http_client.HTTP_POOL_SIZE, "in_use": 1, "idle": 0},
+        }
+        pool._put_conn(conn)
+        assert http_client.pool_stats()["api.open-meteo.com"]["in_use"] == 0
+
+    @patch('requests.Session.get')
+    def test_get_applies_default_timeout(self, mock_get):
+        http_client.get("https://example.com")
+        assert mock_get.call_args.kwargs['timeout'] == (
+            http_client.HTTP_CONNECT_TIMEOUT, http_client.HTTP_READ_TIMEOUT
+        )
+
+    @patch('requests.Session.get')
+    def test_get_keeps_explicit_timeout(self, mock_get):
+        http_client.get("https://example.com", timeout=1)
+        assert mock_get.call_args.kwargs['timeout'] == 1
+
+
+class TestTimeouts:
+    @patch('requests.Session.get')
+    def test_geo_read_timeout_is_network_error(self, mock_get):
+        mock_get.side_effect = requests.exceptions.ReadTimeout()
+
+        with pytest.raises(WeatherError) as exc_info:
+            fetch("test_url")
+        assert exc_info.value.error_type == WeatherErrorType.NETWORK_ERROR
+
+    @patch('requests.Session.get')
+    def test_forecast_connect_timeout_is_network_error(self, mock_get):
+        mock_get.side_effect = requests.exceptions.ConnectTimeout()
+
+        with pytest.raises(WeatherError) as exc_info:
+            WeatherService().fetch_weather((32.0, 34.0))
+        assert exc_info.value.error_type == WeatherErrorType.NETWORK_ERROR
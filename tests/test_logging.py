@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import queue
+import sys
+from app import config, request_context
+from app.config import setup_logging
+from app.logging_utils import ContextQueueHandler, JsonFormatter, RequestContextFilter, SamplingFilter
+from main import app
+
+
+def make_record(level=logging.INFO, msg="hello %s", args=("world",), exc_info=None, **extra):
+    record = logging.LogRecord("weather", level, __file__, 1, msg, args, exc_info)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+class TestSetupLogging:
+    def test_idempotent(self):
+        setup_logging()
+        setup_logging()
+        root = logging.getLogger()
+        assert sum(isinstance(h, ContextQueueHandler) for h in root.handlers) == 1
+
+    def test_listener_restarts_after_fork(self):
+        setup_logging()
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            alive = config._log_listener._thread is not None and config._log_listener._thread.is_alive()
+            os.write(write_end, b"1" if alive else b"0")
+            os._exit(0)
+        os.close(write_end)
+        os.waitpid(pid, 0)
+        assert os.read(read_end, 1) == b"1"
+        os.close(read_end)
+
+
+class TestFilters:
+    def test_sampling_keeps_warnings(self):
+        never = SamplingFilter(0.0)
+        assert not never.filter(make_record(logging.INFO))
+        assert never.filter(make_record(logging.WARNING))
+        assert never.filter(make_record(logging.ERROR))
+        assert SamplingFilter(1.0).filter(make_record(logging.INFO))
+
+    def test_request_context(self):
+        request_context.start_request("abc123")
+        request_context.record_timing("geocode", 0.0125)
+        record = make_record()
+        RequestContextFilter().filter(record)
+        request_context.end_request()
+
+        assert record.request_id == "abc123"
+        assert record.timings == {"geocode": 12.5}
+
+    def test_no_request_context(self):
+        record = make_record()
+        RequestContextFilter().filter(record)
+        assert record.request_id is None
+        assert record.timings == {}
+
+
+class TestQueuePipeline:
+    def test_prepare_keeps_traceback_separate(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = make_record(logging.ERROR, exc_info=sys.exc_info())
+
+        log_queue = queue.SimpleQueue()
+        ContextQueueHandler(log_queue).emit(record)
+        queued = log_queue.get_nowait()
+
+        assert queued.getMessage() == "hello world"
+        assert queued.exc_info is None
+        assert "ValueError: boom" in queued.exc_text
+
+
+class TestJsonFormatter:
+    def test_format(self):
+        record = make_record(request_id="abc123", timings={"parse": 0.5}, status=200)
+        entry = json.loads(JsonFormatter().format(record))
+
+        assert entry["message"] == "hello world"
+        assert entry["level"] == "INFO"
+        assert entry["request_id"] == "abc123"
+        assert entry["timings_ms"] == {"parse": 0.5}
+        assert entry["status"] == 200
+        assert "exception" not in entry
+
+    def test_format_exception(self):
+        record = make_record(logging.ERROR)
+        record.exc_text = "Traceback ..."
+        assert json.loads(JsonFormatter().format(record))["exception"] == "Traceback ..."
+
+
+class TestRequestIds:
+    def test_generated(self):
+        response = app.test_client().get("/health")
+        assert len(response.headers["X-Request-ID"]) == 32
+
+    def test_propagated(self):
+        response = app.test_client().get("/health", headers={"X-Request-ID": "from-proxy"})
+        assert response.headers["X-Request-ID"] == "from-proxy"
@@ -77,7 +77,7 @@ def test_get_weather_empty_city():
         get_weather("")
     assert exc_info.value.error_type == WeatherErrorType.CITY_NOT_FOUND
 
-@patch('requests.get')
+@patch('requests.Session.get')
 def test_get_weather_city_not_found(mock_get, create_mock_response):
     mock_get.return_value = create_mock_response(200, {"results": []})
     
@@ -85,7 +85,7 @@ def test_get_weather_city_not_found(mock_get, create_mock_response):
         get_weather("NonexistentCity")
     assert exc_info.value.error_type == WeatherErrorType.CITY_NOT_FOUND
 
-@patch('requests.get')
+@patch('requests.Session.get')
 def test_get_weather_network_error(mock_get):
     mock_get.side_effect = Exception("Network error")
     
@@ -112,3 +112,69 @@ def test_get_weather_invalid_weather_response(mock_fetch, mock_fetch_weather):
     with pytest.raises(WeatherError) as exc_info:
         get_weather("Test City")
     assert exc_info.value.error_type == WeatherErrorType.INVALID_DATA  # Changed to INVALID_DATA
+
+@patch('requests.Session.get')
+@patch('app.services.geo_service.fetch')
+def test_home_post_geocodes_once(mock_fetch, mock_get, mock_weather_data, create_mock_response):
+    from main import app
+
+    mock_fetch.return_value = {
+        "results": [{
+            "name": "Test City",
+            "country": "Test Country",
+            "latitude": 32.0,
+            "longitude": 34.0
+        }]
+    }
+    mock_get.return_value = create_mock_response(200, mock_weather_data)
+
+    response = app.test_client().post("/", data={"country": "Test City"})
+
+    assert response.status_code == 200
+    assert b"Test City" in response.data
+    assert mock_fetch.call_count == 1
+    assert mock_get.call_count == 1
+
+
+@patch('app.services.weather_service.WeatherService.fetch_weather_batch')
+@patch('app.services.geo_service.fetch')
+def test_weather_batch_endpoint(mock_fetch, mock_fetch_batch, mock_weather_data):
+    from main import app
+
+    mock_fetch.return_value = {
+        "results": [{
+            "name": "Test City",
+            "country": "Test Country",
+            "latitude": 32.0,
+            "longitude": 34.0
+        }]
+    }
+    mock_fetch_batch.return_value = [mock_weather_data]
+
+    response = app.test_client().post("/api/weather/batch", json={"cities": ["Test City"]})
+
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert results[0]["city"] == "Test City"
+    assert results[0]["data"]["weather"][0]["temp_max"] == 26
+
+@pytest.mark.parametrize("payload", [
+    None,
+    {},
+    {"cities": "Haifa"},
+    {"cities": [1, 2]},
+    {"cities": ["Haifa"], "hourly": ["not_a_variable"]},
+    {"cities": ["Haifa"], "forecast_days": 99},
+])
+def test_weather_batch_endpoint_bad_request(payload):
+    from main import app
+
+    response = app.test_client().post("/api/weather/batch", json=payload)
+    assert response.status_code == 400
+
+@patch('main.BATCH_MAX_CITIES', 2)
+def test_weather_batch_endpoint_too_many_cities():
+    from main import app
+
+    response = app.test_client().post("/api/weather/batch", json={"cities": ["a", "b", "c"]})
+    assert response.status_code == 413
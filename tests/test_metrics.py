@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+import time
+import pytest
+from unittest.mock import Mock, patch
+from app import metrics
+from main import app
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.fixture
+def metrics_dir(tmp_path):
+    with patch('app.metrics.METRICS_DIR', str(tmp_path)):
+        yield tmp_path
+
+
+class TestRender:
+    def test_counter(self):
+        metrics.ERRORS.inc(type="CITY_NOT_FOUND")
+        metrics.ERRORS.inc(type="CITY_NOT_FOUND")
+        metrics.ERRORS.inc(type="API_ERROR")
+
+        text = metrics.render()
+        assert "# TYPE weather_errors_total counter" in text
+        assert 'weather_errors_total{type="CITY_NOT_FOUND"} 2' in text
+        assert 'weather_errors_total{type="API_ERROR"} 1' in text
+
+    def test_histogram(self):
+        metrics.STAGE_SECONDS.observe(0.003, stage="parse")
+        metrics.STAGE_SECONDS.observe(0.2, stage="parse")
+        metrics.STAGE_SECONDS.observe(60, stage="parse")
+
+        text = metrics.render()
+        assert "# TYPE weather_stage_seconds histogram" in text
+        assert 'weather_stage_seconds_bucket{stage="parse",le="0.0025"} 0' in text
+        assert 'weather_stage_seconds_bucket{stage="parse",le="0.005"} 1' in text
+        assert 'weather_stage_seconds_bucket{stage="parse",le="0.25"} 2' in text
+        assert 'weather_stage_seconds_bucket{stage="parse",le="+Inf"} 3' in text
+        assert 'weather_stage_seconds_count{stage="parse"} 3' in text
+        assert 'weather_stage_seconds_sum{stage="parse"} 60.203' in text
+
+    def test_label_escaping(self):
+        metrics.ERRORS.inc(type='a"b\\c')
+        assert 'weather_errors_total{type="a\\"b\\\\c"} 1' in metrics.render()
+
+
+class TestAggregation:
+    def test_merges_worker_snapshots(self, metrics_dir):
+        metrics.ERRORS.inc(type="API_ERROR")
+        metrics.STAGE_SECONDS.observe(0.003, stage="parse")
+        metrics.flush()
+
+        # Another worker's snapshot is the same shape under its own pid
+        other = json.loads((metrics_dir / f"metrics_{os.getpid()}.json").read_text())
+        (metrics_dir / "metrics_999999.json").write_text(json.dumps(other))
+        metrics.ERRORS.inc(type="API_ERROR")
+
+        text = metrics.render()
+        assert 'weather_errors_total{type="API_ERROR"} 3' in text
+        assert 'weather_stage_seconds_count{stage="parse"} 2' in text
+
+    def test_gauges_take_max(self, metrics_dir):
+        gauge = metrics.Gauge("test_gauge", "Test gauge")
+        gauge.set(1, name="x")
+        metrics.flush()
+        other = json.loads((metrics_dir / f"metrics_{os.getpid()}.json").read_text())
+        other["test_gauge"]["samples"] = {json.dumps([["name", "x"]]): 5}
+        (metrics_dir / "metrics_999999.json").write_text(json.dumps(other))
+
+        assert 'test_gauge{name="x"} 5' in metrics.render()
+        del metrics._registry["test_gauge"]
+
+    def test_retire_worker(self, metrics_dir):
+        gauge = metrics.Gauge("test_gauge", "Test gauge")
+        gauge.set(7)
+        metrics.ERRORS.inc(type="API_ERROR")
+        metrics.flush()
+        os.replace(metrics_dir / f"metrics_{os.getpid()}.json", metrics_dir / "metrics_999999.json")
+        metrics.retire_worker(999999)
+        (metrics_dir / "metrics_999998.json").write_text((metrics_dir / "metrics_retired.json").read_text())
+        metrics.retire_worker(999998)
+        metrics.reset()
+        del metrics._registry["test_gauge"]
+
+        assert sorted(path.name for path in metrics_dir.iterdir()) == ["metrics_retired.json"]
+        text = metrics.render()
+        # Counts of exited workers are kept, their gauges are not
+        assert 'weather_errors_total{type="API_ERROR"} 2' in text
+        assert "test_gauge" not in text
+
+    def test_idle_worker_catches_up(self, metrics_dir):
+        path = metrics_dir / f"metrics_{os.getpid()}.json"
+        with patch('app.metrics.METRICS_FLUSH_INTERVAL', 0.01), patch.object(metrics, '_flusher_pid', None):
+            for _ in range(5):
+                metrics.ERRORS.inc(type="API_ERROR")
+            deadline = time.monotonic() + 2
+            while time.monotonic() < deadline and not path.exists():
+                time.sleep(0.01)
+            time.sleep(0.05)
+        assert json.loads(path.read_text())["weather_errors_total"]["samples"] == {'[["type", "API_ERROR"]]': 5}
+
+    def test_scrape_flushes(self, metrics_dir):
+        metrics.ERRORS.inc(type="API_ERROR")
+        metrics.render()
+        snapshot = json.loads((metrics_dir / f"metrics_{os.getpid()}.json").read_text())
+        assert snapshot["weather_errors_total"]["samples"] == {'[["type", "API_ERROR"]]': 1}
+
+    def test_concurrent_flushes(self, metrics_dir):
+        def flush_many():
+            for _ in range(50):
+                metrics.ERRORS.inc(type="API_ERROR")
+                metrics.flush()
+
+        threads = [threading.Thread(target=flush_many) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert [path.name for path in metrics_dir.iterdir()] == [f"metrics_{os.getpid()}.json"]
+        snapshot = json.loads((metrics_dir / f"metrics_{os.getpid()}.json").read_text())
+        assert snapshot["weather_errors_total"]["samples"] == {'[["type", "API_ERROR"]]': 200}
+
+    def test_clear_metrics_dir(self, metrics_dir):
+        metrics.flush()
+        metrics.clear_metrics_dir()
+        assert list(metrics_dir.iterdir()) == []
+
+
+class TestInstrumentation:
+    @patch('requests.Session.get')
+    @patch('app.services.geo_service.fetch')
+    def test_home_records_stages_and_cache(self, mock_fetch, mock_get):
+        mock_fetch.return_value = {"results": [{"name": "Test City", "country": "X", "latitude": 1.0, "longitude": 2.0}]}
+        mock_get.return_value = Mock(status_code=200, json=lambda: {"daily": {
+            'time': ['2023-12-01'], 'temperature_2m_max': [25.5], 'temperature_2m_min': [15.2],
+            'sunrise': ['2023-12-01T06:00'], 'sunset': ['2023-12-01T18:00'], 'showers_sum': [0.5],
+            'snowfall_sum': [0], 'precipitation_probability_max': [30]
+        }})
+
+        client = app.test_client()
+        client.post("/", data={"country": "Test City"})
+        client.get("/weather", query_string={"city": "Test City"})
+        text = client.get("/metrics").get_data(as_text=True)
+
+        for stage in ("geocode", "forecast", "parse"):
+            assert f'weather_stage_seconds_count{{stage="{stage}"}} 2' in text
+        # The second page comes from the rendered-page cache
+        assert 'weather_stage_seconds_count{stage="render"} 1' in text
+        assert 'weather_cache_requests_total{cache="page",result="hit"} 1' in text
+        assert 'weather_cache_requests_total{cache="geo",result="miss"} 1' in text
+        assert 'weather_cache_requests_total{cache="geo",result="hit"} 1' in text
+        assert 'weather_cache_requests_total{cache="forecast",result="hit"} 1' in text
+        assert 'weather_upstream_responses_total{status="200",upstream="forecast"} 1' in text
+
+    @patch('app.services.geo_service.fetch')
+    def test_home_counts_errors(self, mock_fetch):
+        mock_fetch.return_value = {"results": []}
+
+        client = app.test_client()
+        client.post("/", data={"country": "Nowhere"})
+        response = client.get("/metrics")
+
+        assert response.mimetype == "text/plain"
+        assert 'weather_errors_total{type="CITY_NOT_FOUND"} 1' in response.get_data(as_text=True)
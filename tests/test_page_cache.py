@@ -0,0 +1,106 @@
+import gzip
+import pytest
+from unittest.mock import Mock, patch
+from app.errors import WeatherErrorType
+from app.page_cache import PageCache, RenderedPage
+from app.services.forecast_variables import DEFAULT_VARIABLES
+from main import app
+
+DATA = {"name": "Test City", "country": "Test Country", "latitude": 32.0, "longitude": 34.0}
+
+
+@pytest.fixture
+def template(tmp_path):
+    path = tmp_path / "index.html"
+    path.write_text("<html>{{ data }}</html>")
+    return path
+
+
+def make_cache(template):
+    render = Mock(side_effect=lambda data, error: f"<html>{data or error}</html>" * 50)
+    return PageCache(render, str(template)), render
+
+
+class TestRenderedPage:
+    def test_select_encoding(self):
+        page = RenderedPage("<p>hello</p>" * 100)
+
+        assert page.select(None) == (None, page.bodies["identity"])
+        assert page.select("gzip, deflate")[0] == "gzip"
+        assert page.select("gzip;q=0, identity")[0] is None
+        assert page.select("deflate")[0] is None
+        assert gzip.decompress(page.bodies["gzip"]) == page.bodies["identity"]
+        assert len(page.bodies["gzip"]) < len(page.bodies["identity"])
+
+
+class TestPageCache:
+    def test_renders_each_forecast_once(self, template):
+        cache, render = make_cache(template)
+        entry = {"generated_at": 100.0}
+
+        first = cache.weather_page(DATA, entry, DEFAULT_VARIABLES)
+        second = cache.weather_page(dict(DATA), entry, DEFAULT_VARIABLES)
+
+        assert first is second
+        assert render.call_count == 1
+
+    def test_new_forecast_renders_again(self, template):
+        cache, render = make_cache(template)
+        cache.weather_page(DATA, {"generated_at": 100.0}, DEFAULT_VARIABLES)
+        cache.weather_page(DATA, {"generated_at": 200.0}, DEFAULT_VARIABLES)
+        assert render.call_count == 2
+
+    def test_same_grid_cell_different_city(self, template):
+        cache, render = make_cache(template)
+        entry = {"generated_at": 100.0}
+        cache.weather_page(DATA, entry, DEFAULT_VARIABLES)
+        cache.weather_page({**DATA, "name": "Neighbour"}, entry, DEFAULT_VARIABLES)
+        assert render.call_count == 2
+
+    def test_template_change_changes_key(self, template):
+        entry = {"generated_at": 100.0}
+        before = make_cache(template)[0].page_key(DATA, entry, DEFAULT_VARIABLES)
+        template.write_text("<html>{{ data }}!</html>")
+        assert make_cache(template)[0].page_key(DATA, entry, DEFAULT_VARIABLES) != before
+
+    def test_prerenders_fixed_pages(self, template):
+        cache, render = make_cache(template)
+        cache.prerender()
+        calls = render.call_count
+
+        assert calls == len(WeatherErrorType) + 1
+        cache.home_page()
+        cache.error_page(WeatherErrorType.NETWORK_ERROR)
+        assert render.call_count == calls
+
+
+class TestRoutes:
+    def test_home_is_compressed(self):
+        response = app.test_client().get("/", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert b"weather-form" in gzip.decompress(response.data)
+
+    def test_error_page_is_not_rendered_per_request(self):
+        with patch('app.services.geo_service.fetch', return_value={}), \
+                patch('main.render_template') as mock_render:
+            response = app.test_client().post("/", data={"country": "Nowhere"})
+
+        assert b"City Not Found" in response.data
+        mock_render.assert_not_called()
+
+    @patch('requests.Session.get')
+    @patch('app.services.geo_service.fetch')
+    def test_weather_page_identity_without_accept_encoding(self, mock_fetch, mock_get):
+        mock_fetch.return_value = {"results": [DATA]}
+        mock_get.return_value = Mock(status_code=200, json=lambda: {"daily": {
+            'time': ['2023-12-01'], 'temperature_2m_max': [25.5], 'temperature_2m_min': [15.2],
+            'sunrise': ['06:00'], 'sunset': ['18:00'], 'showers_sum': [0.5],
+            'snowfall_sum': [0], 'precipitation_probability_max': [30]
+        }})
+
+        response = app.test_client().get("/weather?city=Test+City")
+
+        assert "Content-Encoding" not in response.headers
+        assert b"Test City" in response.data
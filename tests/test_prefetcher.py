@@ -0,0 +1,171 @@
+import time
+import pytest
+import requests
+from unittest.mock import Mock, patch
+from app.services import prefetcher
+from app.services.prefetcher import Prefetcher
+from app.services.weather_service import forecast_cache, forecast_key, next_forecast_update
+from main import app
+
+FORECAST = {"daily": {"time": ["2023-12-01"]}}
+
+CITIES = {
+    "alpha": {"name": "Alpha", "country": "A", "latitude": 10.0, "longitude": 20.0},
+    "beta": {"name": "Beta", "country": "B", "latitude": 30.0, "longitude": 40.0},
+}
+
+
+def geocode(url):
+    name = url.split("name=")[1].split("&")[0].lower()
+    return {"results": [CITIES[name]]} if name in CITIES else {}
+
+
+@pytest.fixture
+def hot():
+    with patch('app.services.geo_service.fetch', side_effect=geocode) as mock_fetch, \
+            patch('requests.Session.get') as mock_get:
+        mock_get.return_value = Mock(status_code=200, json=lambda: [FORECAST, FORECAST])
+        yield Prefetcher(["Alpha", "Beta"], shared=False), mock_fetch, mock_get
+
+
+class TestPrefetcher:
+    def test_warms_with_one_batch_request(self, hot):
+        worker, mock_fetch, mock_get = hot
+
+        delay = worker.run_once()
+
+        assert mock_fetch.call_count == 2
+        assert mock_get.call_count == 1
+        assert mock_get.call_args.kwargs['params']['latitude'] == "10.0,30.0"
+        assert forecast_cache.get(forecast_key(10.0, 20.0))["data"] == FORECAST
+        assert forecast_cache.get(forecast_key(30.0, 40.0))["data"] == FORECAST
+        assert 1 <= delay <= 3600 + 600
+
+    def test_skips_fresh_forecasts(self, hot):
+        worker, mock_fetch, mock_get = hot
+        worker.run_once()
+        worker.run_once()
+
+        assert mock_get.call_count == 1
+        # Geocodes come from the cache until they near expiry
+        assert mock_fetch.call_count == 2
+
+    def test_refreshes_stale_forecasts(self, hot):
+        worker, _, mock_get = hot
+        worker.run_once()
+        key = forecast_key(10.0, 20.0)
+        entry = forecast_cache.get(key)
+        entry["fresh_until"] = time.time() - 1
+        forecast_cache.set(key, entry)
+        mock_get.return_value = Mock(status_code=200, json=lambda: FORECAST)
+
+        worker.run_once()
+
+        assert mock_get.call_count == 2
+        assert mock_get.call_args.kwargs['params']['latitude'] == "10.0"
+
+    def test_refreshes_ahead_of_staleness(self, hot):
+        worker, _, mock_get = hot
+        worker.run_once()
+        key = forecast_key(10.0, 20.0)
+        entry = forecast_cache.get(key)
+        entry["fresh_until"] = time.time() + prefetcher.LEAD_TIME / 2
+        forecast_cache.set(key, entry)
+        mock_get.return_value = Mock(status_code=200, json=lambda: FORECAST)
+
+        worker.run_once()
+
+        assert mock_get.call_count == 2
+        # Fresh through the coming publication, so it never shows as stale
+        assert forecast_cache.get(key)["fresh_until"] > time.time() + prefetcher.LEAD_TIME
+
+    def test_wakes_before_publication(self, hot):
+        worker, _, _ = hot
+        delay = worker.run_once()
+
+        publication = next_forecast_update(time.time() + prefetcher.LEAD_TIME)
+        assert abs(time.time() + delay - (publication - prefetcher.LEAD_TIME)) < 2
+
+    def test_unknown_city_does_not_block(self, hot):
+        worker, _, mock_get = hot
+        worker.cities = ["Alpha", "Nowhere"]
+        mock_get.return_value = Mock(status_code=200, json=lambda: FORECAST)
+
+        worker.run_once()
+
+        assert forecast_cache.get(forecast_key(10.0, 20.0)) is not None
+
+    def test_upstream_failure_retries_sooner(self, hot):
+        worker, _, mock_get = hot
+        mock_get.side_effect = requests.exceptions.ConnectionError()
+
+        with patch('app.services.prefetcher.PREFETCH_RETRY_INTERVAL', 5):
+            assert worker.run_once() == 5
+
+    def test_warm_after_first_pass(self, hot):
+        worker, _, _ = hot
+        worker.start()
+        try:
+            assert worker.warm.wait(timeout=5)
+        finally:
+            worker.stop()
+
+
+    def test_not_warm_after_failed_pass(self, hot):
+        worker, _, mock_get = hot
+        mock_get.side_effect = requests.exceptions.ConnectionError()
+        with patch('app.services.prefetcher.PREFETCH_WARMUP_TIMEOUT', 0.5):
+            worker.start()
+            try:
+                assert not worker.warm.wait(timeout=0.2)
+                # Reports ready once the warm-up times out
+                assert worker.warm.wait(timeout=5)
+            finally:
+                worker.stop()
+
+
+class TestReadiness:
+    def test_ready_after_warming(self):
+        worker = Prefetcher(["Alpha"], shared=False)
+        with patch.object(prefetcher, '_prefetcher', worker):
+            response = app.test_client().get("/ready")
+            assert response.status_code == 503
+            assert response.get_json()["status"] == "warming"
+            # Still alive while warming
+            assert app.test_client().get("/health").status_code == 200
+
+            worker.warm.set()
+            response = app.test_client().get("/ready")
+            assert response.status_code == 200
+            assert response.get_json()["status"] == "ready"
+
+    def test_not_configured_is_ready(self):
+        assert prefetcher.is_ready()
+
+    def test_one_leader_per_lock(self, tmp_path):
+        lock_path = str(tmp_path / "prefetch.lock")
+        first = Prefetcher(["Alpha"], shared=True, lock_path=lock_path)
+        second = Prefetcher(["Alpha"], shared=True, lock_path=lock_path)
+        try:
+            assert first._acquire_leadership()
+            assert not second._acquire_leadership()
+            first.stop()
+            assert second._acquire_leadership()
+        finally:
+            first.stop()
+            second.stop()
+
+    def test_one_leader_per_redis_lease(self, redis_server):
+        import fakeredis
+        first = Prefetcher(["Alpha"], shared=True, client=fakeredis.FakeRedis(server=redis_server))
+        second = Prefetcher(["Alpha"], shared=True, client=fakeredis.FakeRedis(server=redis_server))
+        try:
+            assert first._acquire_leadership()
+            # Renewing is taking it again
+            assert first._acquire_leadership()
+            assert not second._acquire_leadership()
+            first.stop()
+            assert second._acquire_leadership()
+        finally:
+            first.stop()
+            second.stop()
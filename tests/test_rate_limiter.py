@@ -0,0 +1,235 @@
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import Mock, patch
+from app.errors import WeatherError, WeatherErrorType
+from app.services import circuit_breaker, geo_service, rate_limiter
+from app.services.rate_limiter import (
+    BATCH, INTERACTIVE, RateLimiter, RedisTokenBucket, SQLiteTokenBucket, TokenBucket,
+)
+from main import app
+
+
+def make_limiter(rate=10, capacity=1, max_queue=4, max_wait=(0.5, 0.5)):
+    return RateLimiter(TokenBucket(rate, capacity), max_queue=max_queue, max_wait=max_wait)
+
+
+def assert_shed(fn, *args):
+    with pytest.raises(WeatherError) as exc_info:
+        fn(*args)
+    assert exc_info.value.error_type == WeatherErrorType.RATE_LIMITED
+
+
+class TestTokenBucket:
+    def test_burst_then_refill(self, clock):
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+
+        assert bucket.take() == 0
+        assert bucket.take() == 0
+        assert bucket.take() == pytest.approx(0.5)
+        clock.now += 0.5
+        assert bucket.take() == 0
+
+    def test_drain(self, clock):
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+        bucket.drain(3)
+
+        assert bucket.take() == pytest.approx(3.5)
+        clock.now += 3.5
+        assert bucket.take() == 0
+
+    def test_sqlite_bucket_is_shared(self, tmp_path, clock):
+        path = str(tmp_path / "cache.db")
+        worker_a = SQLiteTokenBucket(path, "upstream", rate=1, capacity=2, clock=clock)
+        worker_b = SQLiteTokenBucket(path, "upstream", rate=1, capacity=2, clock=clock)
+
+        assert worker_a.take() == 0
+        assert worker_b.take() == 0
+        assert worker_a.take() == pytest.approx(1)
+        worker_b.drain(5)
+        assert worker_a.take() == pytest.approx(6)
+
+    def test_redis_bucket_is_shared(self, redis_server, clock):
+        import fakeredis
+        host_a = RedisTokenBucket(fakeredis.FakeRedis(server=redis_server), "upstream", rate=1, capacity=2, clock=clock)
+        host_b = RedisTokenBucket(fakeredis.FakeRedis(server=redis_server), "upstream", rate=1, capacity=2, clock=clock)
+
+        assert host_a.take() == 0
+        assert host_b.take() == 0
+        assert host_a.take() == pytest.approx(1)
+        host_b.drain(5)
+        assert host_a.take() == pytest.approx(6)
+        clock.now += 6
+        assert host_b.take() == 0
+        host_a.reset()
+        assert host_b.take() == 0
+
+
+class TestRateLimiter:
+    def test_waits_for_a_token(self):
+        limiter = make_limiter(rate=20)
+        limiter.acquire()
+
+        start = time.perf_counter()
+        limiter.acquire()
+        assert 0.03 < time.perf_counter() - start < 0.5
+
+    def test_sheds_when_token_is_too_far(self):
+        limiter = make_limiter(rate=0.1)
+        limiter.acquire()
+
+        start = time.perf_counter()
+        assert_shed(limiter.acquire)
+        assert time.perf_counter() - start < 0.05
+
+    def test_interactive_goes_first(self):
+        limiter = make_limiter(rate=20, max_wait=(2, 2))
+        limiter.acquire()
+        order = []
+
+        def call(level):
+            limiter.acquire(level)
+            order.append(level)
+
+        batch = threading.Thread(target=call, args=(BATCH,))
+        batch.start()
+        time.sleep(0.01)
+        interactive = threading.Thread(target=call, args=(INTERACTIVE,))
+        interactive.start()
+        batch.join()
+        interactive.join()
+
+        assert order == [INTERACTIVE, BATCH]
+
+    def test_full_queue_sheds_batch_first(self):
+        limiter = make_limiter(rate=1, max_queue=1, max_wait=(2, 2))
+        limiter.acquire()
+        errors = []
+
+        def batch_call():
+            try:
+                limiter.acquire(BATCH)
+            except WeatherError as e:
+                errors.append(e.error_type)
+
+        batch = threading.Thread(target=batch_call)
+        batch.start()
+        time.sleep(0.01)
+        # A second batch call finds the queue full; a page request doesn't
+        assert_shed(limiter.acquire, BATCH)
+        interactive = threading.Thread(target=limiter.acquire, args=(INTERACTIVE,))
+        interactive.start()
+        batch.join()
+        limiter.reset()
+        interactive.join()
+
+        assert errors == [WeatherErrorType.RATE_LIMITED]
+
+    def test_priority_from_context(self):
+        limiter = make_limiter(rate=1, max_queue=1, max_wait=(2, 2))
+        limiter._enter(INTERACTIVE)
+
+        with rate_limiter.priority(BATCH):
+            assert_shed(limiter.acquire)
+
+    def test_acquire_async_with_shared_bucket_keeps_loop_free(self, tmp_path):
+        limiter = RateLimiter(SQLiteTokenBucket(str(tmp_path / "cache.db"), "upstream", rate=10, capacity=1),
+                              max_queue=4, max_wait=(2, 2))
+
+        def hold_condition():
+            # A sync caller busy with the bucket
+            with limiter._cond:
+                time.sleep(0.2)
+
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.ensure_future(ticker())
+            await limiter.acquire_async()
+            task.cancel()
+            return ticks
+
+        holder = threading.Thread(target=hold_condition)
+        holder.start()
+        time.sleep(0.01)
+        ticks = asyncio.run(run())
+        holder.join()
+        assert ticks >= 10
+
+    def test_acquire_async(self):
+        limiter = make_limiter(rate=20)
+
+        async def run():
+            await limiter.acquire_async()
+            await limiter.acquire_async()
+
+        start = time.perf_counter()
+        asyncio.run(run())
+        assert 0.03 < time.perf_counter() - start < 0.5
+
+
+class TestUpstreamIntegration:
+    @patch('app.services.http_client.get')
+    def test_shed_call_never_reaches_upstream(self, mock_get):
+        with patch.object(rate_limiter, 'upstream', make_limiter(rate=0.1, capacity=0)):
+            assert_shed(geo_service.fetch, "https://geo.example/search")
+
+        mock_get.assert_not_called()
+        assert circuit_breaker.geocoding.state == circuit_breaker.CLOSED
+
+    @patch('app.services.http_client.get')
+    def test_upstream_429_drains_bucket(self, mock_get):
+        mock_get.return_value = Mock(status_code=429, headers={"Retry-After": "30"})
+        limiter = make_limiter(rate=10, capacity=5)
+
+        with patch.object(rate_limiter, 'upstream', limiter):
+            assert_shed(geo_service.fetch, "https://geo.example/search")
+            assert_shed(geo_service.fetch, "https://geo.example/search")
+
+        assert mock_get.call_count == 1
+        assert limiter.bucket.take() > 29
+
+    def test_half_open_probe_is_released(self):
+        breaker = circuit_breaker.CircuitBreaker("test", min_requests=1, open_seconds=0)
+        breaker.record_failure(WeatherErrorType.NETWORK_ERROR)
+
+        with pytest.raises(WeatherError):
+            breaker.call(Mock(side_effect=WeatherError(WeatherErrorType.RATE_LIMITED)))
+        assert breaker.call(lambda: "ok") == "ok"
+        assert breaker.state == circuit_breaker.CLOSED
+
+    @patch('main.get_weather_entry')
+    def test_page_reports_rate_limit(self, mock_get_weather):
+        mock_get_weather.side_effect = WeatherError(WeatherErrorType.RATE_LIMITED)
+
+        response = app.test_client().get('/weather?city=Haifa')
+
+        assert response.status_code == 503
+        assert b"Too Many Requests" in response.data
+        assert int(response.headers["Retry-After"]) >= 1
+
+    @patch('main.get_weather_entry')
+    def test_form_reports_rate_limit(self, mock_get_weather):
+        mock_get_weather.side_effect = WeatherError(WeatherErrorType.RATE_LIMITED)
+
+        with patch.object(rate_limiter, 'upstream', make_limiter(rate=0.5, capacity=0)):
+            response = app.test_client().post('/', data={"country": "Haifa"})
+
+        assert response.status_code == 503
+        assert b"Too Many Requests" in response.data
+        assert response.headers["Retry-After"] == "2"
+        assert response.headers["Cache-Control"] == "no-store"
+
+    def test_retry_after_counts_queue(self, clock):
+        limiter = RateLimiter(TokenBucket(rate=2, capacity=1, clock=clock))
+        assert limiter.retry_after() == 1
+        limiter.bucket.take()
+        limiter.bucket.drain(3)
+        assert limiter.retry_after() == 4
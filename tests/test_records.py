@@ -0,0 +1,65 @@
+import json
+import pytest
+from app.services.forecast_variables import VariableSet
+from app.services.geo_service import GeoModel
+from app.services.records import Record, json_default, record_type
+from app.services.weather_service import WeatherModel
+from main import app
+
+FIELDS = ('date', 'temp_max', 'precipitation')
+
+
+class TestRecord:
+    def test_reads_like_a_dict(self):
+        row = record_type(FIELDS)('December 01', 26, 1.2)
+
+        assert row['temp_max'] == 26
+        assert row.get('precipitation') == 1.2
+        assert row.get('snowfall', 0) == 0
+        assert 'date' in row and 'snowfall' not in row
+        assert list(row.keys()) == list(FIELDS)
+        assert row == {'date': 'December 01', 'temp_max': 26, 'precipitation': 1.2}
+        with pytest.raises(KeyError):
+            row['snowfall']
+
+    def test_slotted_and_shared_per_layout(self):
+        row = record_type(FIELDS)('December 01', 26, 1.2)
+
+        assert not hasattr(row, '__dict__')
+        assert record_type(FIELDS) is type(row)
+        assert isinstance(row, Record)
+
+    def test_invalid_fields(self):
+        with pytest.raises(ValueError):
+            record_type(('date', 'temp max'))
+
+    def test_parsed_rows_are_records(self):
+        variables = VariableSet.create(daily=['temperature_2m_max'])
+        data = {'daily': {'time': ['2023-12-01'], 'temperature_2m_max': [25.5]}}
+        rows = WeatherModel().parse_response(data, variables=variables)
+
+        assert all(isinstance(row, Record) for row in rows)
+
+
+class TestSerialization:
+    def test_json_default(self):
+        row = record_type(FIELDS)('December 01', 26, 1.2)
+
+        assert json.loads(json.dumps({'days': [row]}, default=json_default)) == {
+            'days': [{'date': 'December 01', 'temp_max': 26, 'precipitation': 1.2}]
+        }
+        with pytest.raises(TypeError):
+            json.dumps(object(), default=json_default)
+
+    def test_flask_provider(self):
+        row = record_type(FIELDS)('December 01', 26, 1.2)
+
+        assert json.loads(app.json.dumps([row])) == [row.to_dict()]
+
+
+def test_geo_model_is_slotted():
+    geo = GeoModel()
+    geo.save_country_geo({'name': 'Haifa', 'country': 'Israel', 'latitude': 32.8, 'longitude': 35.0})
+
+    assert not hasattr(geo, '__dict__')
+    assert geo.name == 'Haifa'
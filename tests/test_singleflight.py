@@ -0,0 +1,142 @@
+import threading
+import time
+from unittest.mock import Mock, patch
+from app.services.singleflight import SingleFlight
+from app.services.geo_service import get_geo
+from app.services.weather_service import WeatherService
+from app.errors import WeatherError, WeatherErrorType
+
+
+def run_concurrently(target, count):
+    results = [None] * count
+    errors = [None] * count
+
+    def worker(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def wait_for_waiters(flight, release, threads):
+    # Give every thread time to join the in-flight call before releasing it
+    time.sleep(0.05)
+    assert flight.in_flight() == 1
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_share_result(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        fn = Mock(side_effect=lambda: release.wait() and "result")
+
+        threads, results, errors = run_concurrently(lambda: flight.do("key", fn), 10)
+        wait_for_waiters(flight, release, threads)
+
+        assert fn.call_count == 1
+        assert results == ["result"] * 10
+        assert errors == [None] * 10
+        assert flight.in_flight() == 0
+
+    def test_concurrent_calls_share_error(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fail():
+            release.wait()
+            raise WeatherError(WeatherErrorType.API_ERROR, "boom")
+        fn = Mock(side_effect=fail)
+
+        threads, results, errors = run_concurrently(lambda: flight.do("key", fn), 5)
+        wait_for_waiters(flight, release, threads)
+
+        assert fn.call_count == 1
+        assert all(isinstance(e, WeatherError) for e in errors)
+        assert all(e.error_type == WeatherErrorType.API_ERROR for e in errors)
+
+    def test_killed_leader_makes_waiters_retry(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        class Killed(BaseException):
+            pass
+
+        def fn():
+            calls.append(threading.current_thread())
+            if len(calls) == 1:
+                release.wait()
+                raise Killed()
+            time.sleep(0.05)
+            return "result"
+
+        def leader():
+            try:
+                flight.do("key", fn)
+            except Killed:
+                pass
+
+        leader_thread = threading.Thread(target=leader)
+        leader_thread.start()
+        time.sleep(0.01)
+        threads, results, errors = run_concurrently(lambda: flight.do("key", fn), 3)
+        wait_for_waiters(flight, release, threads + [leader_thread])
+
+        assert results == ["result"] * 3
+        assert errors == [None] * 3
+        # One waiter took over, the others shared its call
+        assert len(calls) == 2
+
+    def test_different_keys_run_separately(self):
+        flight = SingleFlight()
+        assert flight.do("a", lambda: 1) == 1
+        assert flight.do("b", lambda: 2) == 2
+
+    def test_sequential_calls_run_again(self):
+        flight = SingleFlight()
+        fn = Mock(return_value=1)
+        flight.do("key", fn)
+        flight.do("key", fn)
+        assert fn.call_count == 2
+
+
+class TestServiceCoalescing:
+    @patch('app.services.geo_service.fetch')
+    def test_concurrent_geo_lookups(self, mock_fetch):
+        release = threading.Event()
+
+        def slow_fetch(url):
+            release.wait()
+            return {"results": [{"name": "Haifa", "country": "Israel", "latitude": 32.8, "longitude": 34.9}]}
+        mock_fetch.side_effect = slow_fetch
+
+        from app.services.geo_service import geo_flight
+        threads, results, errors = run_concurrently(lambda: get_geo("Haifa"), 8)
+        wait_for_waiters(geo_flight, release, threads)
+
+        assert mock_fetch.call_count == 1
+        assert all(r.name == "Haifa" for r in results)
+
+    @patch('requests.Session.get')
+    def test_concurrent_forecast_fetches(self, mock_get):
+        release = threading.Event()
+
+        def slow_get(*args, **kwargs):
+            release.wait()
+            return Mock(status_code=503)
+        mock_get.side_effect = slow_get
+
+        from app.services.weather_service import forecast_flight
+        threads, results, errors = run_concurrently(lambda: WeatherService().fetch_weather((32.0, 34.0)), 8)
+        wait_for_waiters(forecast_flight, release, threads)
+
+        assert mock_get.call_count == 1
+        assert all(e.error_type == WeatherErrorType.API_ERROR for e in errors)
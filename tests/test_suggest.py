@@ -0,0 +1,142 @@
+import time
+import pytest
+from unittest.mock import patch
+from app.services import geo_service, suggest
+from app.services.suggest import SuggestIndex, load_seed
+from main import app
+
+PLACES = [
+    {"name": "Haifa", "country": "Israel", "latitude": 32.79, "longitude": 34.99, "population": 280000},
+    {"name": "Hamburg", "country": "Germany", "latitude": 53.55, "longitude": 9.99, "population": 1800000},
+    {"name": "Hamilton", "country": "Canada", "latitude": 43.25, "longitude": -79.87, "population": 570000},
+    {"name": "New York", "country": "United States", "latitude": 40.71, "longitude": -74.01, "population": 8800000},
+    {"name": "São Paulo", "country": "Brazil", "latitude": -23.55, "longitude": -46.63, "population": 12300000},
+]
+
+
+@pytest.fixture
+def index():
+    index = SuggestIndex(max_results=5)
+    for place in PLACES:
+        index.add(place)
+    return index
+
+
+@pytest.fixture
+def fresh_index():
+    with patch.object(suggest, '_index', SuggestIndex()) as index:
+        yield index
+
+
+def names(results):
+    return [result["name"] for result in results]
+
+
+class TestSuggestIndex:
+    def test_prefix_ranked_by_population(self, index):
+        assert names(index.suggest("ha")) == ["Hamburg", "Hamilton", "Haifa"]
+        # Prefix matches come first, near misses fill the remaining slots
+        assert names(index.suggest("HAM")) == ["Hamburg", "Hamilton", "Haifa"]
+
+    def test_lookups_outrank_population(self, index):
+        index.record_hit(PLACES[0])
+        assert names(index.suggest("ha"))[0] == "Haifa"
+
+    def test_later_words_and_accents(self, index):
+        assert names(index.suggest("york")) == ["New York"]
+        assert names(index.suggest("sao pa")) == ["São Paulo"]
+
+    def test_typo_tolerance(self, index):
+        assert names(index.suggest("hiafa")) == []
+        assert "Haifa" in names(index.suggest("haifq"))
+        assert "Hamburg" in names(index.suggest("hanburg"))
+
+    def test_limit_and_empty(self, index):
+        assert len(index.suggest("ha", limit=1)) == 1
+        assert index.suggest("   ") == []
+        assert index.suggest("zz") == []
+
+    def test_results_are_public_fields(self, index):
+        assert index.suggest("haifa") == [
+            {"name": "Haifa", "country": "Israel", "latitude": 32.79, "longitude": 34.99}
+        ]
+
+    def test_same_place_indexed_once(self, index):
+        index.add(dict(PLACES[0]))
+        assert len(index) == len(PLACES)
+
+    def test_load_seed(self, tmp_path):
+        seed = tmp_path / "seed.tsv"
+        seed.write_text("# name\tcountry\tlat\tlon\tpopulation\nHaifa\tIsrael\t32.79\t34.99\t280000\nEilat\tIsrael\t29.55\t34.95\n")
+        index = SuggestIndex()
+        assert load_seed(index, str(seed)) == 2
+        assert names(index.suggest("ei")) == ["Eilat"]
+
+    def test_entry_cap_evicts_least_looked_up(self):
+        index = SuggestIndex(max_results=5, max_entries=10)
+        places = [{"name": f"Town{i:02d}", "country": "X", "latitude": i, "longitude": 0.0, "population": i}
+                  for i in range(11)]
+        for place in places[:10]:
+            index.add(place)
+        index.record_hit(places[0])
+        index.add(places[10])
+
+        assert len(index) == 9
+        assert names(index.suggest("town0"))[:2] == ["Town00", "Town09"]
+        # The two least populous never-looked-up places are gone from every prefix
+        assert not {"Town01", "Town02"} & set(names(index.suggest("town01") + index.suggest("town")))
+
+    def test_unchanged_order_is_not_re_sorted(self, index):
+        index.record_hit(PLACES[4])
+        node = index._find("s")
+        top = node.top
+        index.record_hit(PLACES[4])
+        # Already first, so the node keeps the same list
+        assert node.top is top
+
+    def test_suggest_is_fast(self):
+        index = SuggestIndex()
+        for i in range(5000):
+            index.add({"name": f"City{i:04d} Town", "country": "X", "latitude": i / 100, "longitude": 0.0, "population": i})
+        start = time.perf_counter()
+        for i in range(1000):
+            index.suggest(f"city{i % 100:02d}")
+        assert (time.perf_counter() - start) / 1000 < 0.001
+
+
+class TestGeoIntegration:
+    @patch('app.services.geo_service.fetch')
+    def test_lookup_indexes_alternatives(self, mock_fetch, fresh_index):
+        mock_fetch.return_value = {"results": PLACES[:3]}
+
+        geo = geo_service.get_geo("Ha")
+
+        assert geo.name == "Haifa"
+        assert "count=5" in mock_fetch.call_args.args[0]
+        assert set(names(fresh_index.suggest("ha"))) == {"Haifa", "Hamburg", "Hamilton"}
+        # The chosen result was looked up once, so it ranks first
+        assert names(fresh_index.suggest("ha"))[0] == "Haifa"
+
+    @patch('app.services.geo_service.fetch')
+    def test_endpoint_never_calls_upstream(self, mock_fetch, fresh_index):
+        for place in PLACES:
+            fresh_index.add(place)
+
+        response = app.test_client().get("/api/cities/suggest?q=ham&limit=1")
+
+        assert response.status_code == 200
+        assert response.get_json() == {
+            "query": "ham",
+            "suggestions": [{"name": "Hamburg", "country": "Germany", "latitude": 53.55, "longitude": 9.99}],
+        }
+        mock_fetch.assert_not_called()
+
+    def test_warm_from_geo_cache(self, fresh_index):
+        geo_service.geo_cache.set("haifa", {k: PLACES[0][k] for k in ("name", "country", "latitude", "longitude")})
+        geo_service.geo_cache.set("nowhere", {"error": "CITY_NOT_FOUND"})
+
+        assert geo_service.warm_suggestions() >= 1
+        assert names(fresh_index.suggest("haif")) == ["Haifa"]
+
+    def test_endpoint_invalid_limit(self):
+        assert app.test_client().get("/api/cities/suggest?q=ha&limit=x").status_code == 400
@@ -3,7 +3,9 @@ import requests
 from unittest.mock import Mock, patch
 from datetime import datetime
 from app.services.weather_service import WeatherModel, WeatherService, get_weather, WeatherError, WeatherErrorType
+from app.services.weather_service import forecast_cache, forecast_key, next_forecast_update, get_weather_batch
 from app.services.geo_service import GeoModel
+from app.services.forecast_variables import VariableSet
 
 @pytest.fixture
 def mock_weather_response():
@@ -47,6 +49,72 @@ class TestWeatherModel:
         assert result[0]['snowfall'] == 0
         assert result[0]['precipitation_prob'] == 30
 
+    def test_parse_response_columnar(self, mock_weather_response):
+        result = WeatherModel().parse_response(mock_weather_response, columnar=True)
+
+        assert result == {
+            'date': ['December 01'],
+            'temp_max': [26],
+            'temp_min': [15],
+            'sunrise': ['06:00'],
+            'sunset': ['18:00'],
+            'showers': [0.5],
+            'snowfall': [0],
+            'precipitation_prob': [30]
+        }
+
+    def test_parse_response_short_column(self, mock_weather_response):
+        mock_weather_response['daily']['time'].append('2023-12-02')
+
+        with pytest.raises(WeatherError) as exc_info:
+            WeatherModel().parse_response(mock_weather_response)
+        assert exc_info.value.error_type == WeatherErrorType.INVALID_DATA
+
+    def test_parse_response_bad_value(self, mock_weather_response):
+        mock_weather_response['daily']['temperature_2m_max'] = [None]
+
+        with pytest.raises(WeatherError) as exc_info:
+            WeatherModel().parse_response(mock_weather_response)
+        assert exc_info.value.error_type == WeatherErrorType.INVALID_DATA
+
+    def test_parse_requested_daily_columns_only(self):
+        variables = VariableSet.create(daily=['temperature_2m_max', 'precipitation_sum'])
+        data = {'daily': {'time': ['2023-12-01'], 'temperature_2m_max': [25.5], 'precipitation_sum': [1.2]}}
+
+        result = WeatherModel().parse_response(data, variables=variables)
+
+        assert result == [{'date': 'December 01', 'temp_max': 26, 'precipitation': 1.2}]
+
+    def test_parse_hourly(self):
+        variables = VariableSet.create(daily=[], hourly=['temperature_2m', 'wind_speed_10m'])
+        data = {'hourly': {
+            'time': ['2023-12-01T00:00', '2023-12-01T01:00'],
+            'temperature_2m': [14.1, 13.8],
+            'wind_speed_10m': [5.0, 6.5],
+        }}
+
+        model = WeatherModel()
+        assert model.parse_hourly(data, variables=variables) == [
+            {'time': '2023-12-01T00:00', 'temperature': 14.1, 'wind_speed': 5.0},
+            {'time': '2023-12-01T01:00', 'temperature': 13.8, 'wind_speed': 6.5},
+        ]
+        assert model.parse_hourly(data, columnar=True, variables=variables)['wind_speed'] == [5.0, 6.5]
+
+    def test_parse_hourly_missing_column(self):
+        variables = VariableSet.create(hourly=['precipitation'])
+
+        with pytest.raises(WeatherError) as exc_info:
+            WeatherModel().parse_hourly({'hourly': {'time': ['2023-12-01T00:00']}}, variables=variables)
+        assert exc_info.value.error_type == WeatherErrorType.INVALID_DATA
+
+    def test_split_response(self, mock_weather_response):
+        assert WeatherModel.split_response(mock_weather_response, 1) == [mock_weather_response]
+        assert WeatherModel.split_response([mock_weather_response] * 2, 2) == [mock_weather_response] * 2
+
+        with pytest.raises(WeatherError) as exc_info:
+            WeatherModel.split_response([mock_weather_response], 2)
+        assert exc_info.value.error_type == WeatherErrorType.INVALID_DATA
+
 class TestWeatherService:
     @patch('app.services.geo_service.fetch')  # Mock the fetch function instead
     def test_fetch_weather_success(self, mock_fetch):
@@ -66,7 +134,7 @@ class TestWeatherService:
         assert 'daily' in result
         assert mock_fetch.called
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_fetch_weather_city_not_found(self, mock_get):
         mock_response = Mock()
         mock_response.status_code = 404
@@ -77,7 +145,7 @@ class TestWeatherService:
             service.fetch_weather('NonexistentCity')
         assert exc_info.value.error_type == WeatherErrorType.CITY_NOT_FOUND
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_fetch_weather_network_error(self, mock_get):
         mock_get.side_effect = requests.exceptions.ConnectionError()
 
@@ -86,6 +154,31 @@ class TestWeatherService:
             service.fetch_weather('Test City')
         assert exc_info.value.error_type == WeatherErrorType.NETWORK_ERROR
 
+    @patch('requests.Session.get')
+    @patch('app.services.geo_service.fetch')
+    def test_fetch_weather_with_geo_model(self, mock_fetch, mock_get, mock_geo_data, mock_weather_response):
+        mock_get.return_value = Mock(status_code=200, json=lambda: mock_weather_response)
+
+        service = WeatherService()
+        result = service.fetch_weather(mock_geo_data)
+
+        assert result == mock_weather_response
+        assert not mock_fetch.called
+        params = mock_get.call_args.kwargs['params']
+        assert params['latitude'] == 32.0
+        assert params['longitude'] == 34.0
+
+    @patch('requests.Session.get')
+    def test_fetch_weather_with_coordinates(self, mock_get, mock_weather_response):
+        mock_get.return_value = Mock(status_code=200, json=lambda: mock_weather_response)
+
+        service = WeatherService()
+        service.fetch_weather((12.5, -7.25))
+
+        params = mock_get.call_args.kwargs['params']
+        assert params['latitude'] == 12.5
+        assert params['longitude'] == -7.25
+
     def test_build_params(self):
         service = WeatherService()
         params = service._build_params(32.0, 34.0)
@@ -95,6 +188,164 @@ class TestWeatherService:
         assert 'temperature_2m_max' in params['daily']
         assert 'timezone' in params
 
+class TestVariableSelection:
+    @patch('requests.Session.get')
+    def test_params_follow_variable_set(self, mock_get):
+        mock_get.return_value = Mock(status_code=200, json=lambda: {})
+        variables = VariableSet.create(daily=[], hourly=['temperature_2m'], forecast_days=2)
+
+        WeatherService().fetch_weather((32.0, 34.0), variables)
+
+        params = mock_get.call_args.kwargs['params']
+        assert params['hourly'] == 'temperature_2m'
+        assert params['forecast_days'] == 2
+        assert 'daily' not in params
+
+    @patch('requests.Session.get')
+    def test_variable_sets_cached_separately(self, mock_get, mock_weather_response):
+        mock_get.return_value = Mock(status_code=200, json=lambda: mock_weather_response)
+        narrow = VariableSet.create(daily=['temperature_2m_max'])
+
+        service = WeatherService()
+        service.fetch_weather((32.0, 34.0))
+        service.fetch_weather((32.0, 34.0), narrow)
+        service.fetch_weather((32.0, 34.0), VariableSet.create(daily=['temperature_2m_max']))
+
+        assert mock_get.call_count == 2
+        assert forecast_key(32.0, 34.0) != forecast_key(32.0, 34.0, narrow)
+
+    @patch('requests.Session.get')
+    @patch('app.services.geo_service.fetch')
+    def test_get_weather_with_hourly(self, mock_fetch, mock_get, mock_weather_response):
+        mock_fetch.return_value = {"results": [{"name": "Test City", "country": "X", "latitude": 1.0, "longitude": 2.0}]}
+        mock_weather_response['hourly'] = {'time': ['2023-12-01T00:00'], 'precipitation': [0.4]}
+        mock_get.return_value = Mock(status_code=200, json=lambda: mock_weather_response)
+
+        result = get_weather('Test City', VariableSet.create(hourly=['precipitation']))
+
+        assert result['weather'][0]['temp_max'] == 26
+        assert result['hourly'] == [{'time': '2023-12-01T00:00', 'precipitation': 0.4}]
+
+class TestForecastCache:
+    def test_forecast_key_snaps_to_grid(self):
+        assert forecast_key(32.794, 34.989) == forecast_key(32.81, 35.01)
+        assert forecast_key(32.794, 34.989) != forecast_key(33.5, 34.989)
+
+    def test_next_forecast_update(self):
+        with patch('app.services.weather_service.FORECAST_UPDATE_INTERVAL', 3600), \
+                patch('app.services.weather_service.FORECAST_UPDATE_DELAY', 600):
+            assert next_forecast_update(7200) == 7800
+            assert next_forecast_update(7800) == 11400
+            assert next_forecast_update(7000) == 7800
+
+    @patch('requests.Session.get')
+    def test_nearby_lookups_share_entry(self, mock_get, mock_weather_response):
+        mock_get.return_value = Mock(status_code=200, json=lambda: mock_weather_response)
+
+        service = WeatherService()
+        first = service.fetch_weather((32.794, 34.989))
+        second = service.fetch_weather((32.81, 35.01))
+
+        assert first == second
+        assert mock_get.call_count == 1
+
+    @patch('requests.Session.get')
+    def test_errors_are_not_cached(self, mock_get, mock_weather_response):
+        mock_get.side_effect = [
+            Mock(status_code=500),
+            Mock(status_code=200, json=lambda: mock_weather_response),
+        ]
+
+        service = WeatherService()
+        with pytest.raises(WeatherError):
+            service.fetch_weather((32.0, 34.0))
+        assert service.fetch_weather((32.0, 34.0)) == mock_weather_response
+
+    @patch('app.services.weather_service.WeatherService._refresh_in_background')
+    @patch('requests.Session.get')
+    def test_stale_entry_served_while_refreshing(self, mock_get, mock_refresh):
+        forecast_cache.set(forecast_key(32.0, 34.0), {"data": {"daily": "stale"}, "generated_at": 0, "fresh_until": 0})
+
+        result = WeatherService().fetch_weather((32.0, 34.0))
+
+        assert result == {"daily": "stale"}
+        assert not mock_get.called
+        assert mock_refresh.call_count == 1
+
+    @patch('requests.Session.get')
+    def test_background_refresh_replaces_entry(self, mock_get, mock_weather_response):
+        mock_get.return_value = Mock(status_code=200, json=lambda: mock_weather_response)
+        key = forecast_key(32.0, 34.0)
+        forecast_cache.set(key, {"data": {"daily": "stale"}, "generated_at": 0, "fresh_until": 0})
+
+        with patch('threading.Thread') as mock_thread:
+            WeatherService()._refresh_in_background(key, 32.0, 34.0)
+            WeatherService()._refresh_in_background(key, 32.0, 34.0)
+        assert mock_thread.call_count == 1
+
+        mock_thread.call_args.kwargs['target']()
+        assert forecast_cache.get(key)["data"] == mock_weather_response
+
+class TestWeatherBatch:
+    @patch('requests.Session.get')
+    def test_fetch_weather_batch_single_request(self, mock_get, mock_weather_response):
+        mock_get.return_value = Mock(status_code=200, json=lambda: [mock_weather_response] * 3)
+
+        results = WeatherService().fetch_weather_batch([(10.0, 20.0), (30.0, 40.0), (50.0, 60.0)])
+
+        assert results == [mock_weather_response] * 3
+        assert mock_get.call_count == 1
+        params = mock_get.call_args.kwargs['params']
+        assert params['latitude'] == "10.0,30.0,50.0"
+        assert params['longitude'] == "20.0,40.0,60.0"
+
+    @patch('requests.Session.get')
+    def test_fetch_weather_batch_uses_cache(self, mock_get, mock_weather_response):
+        mock_get.return_value = Mock(status_code=200, json=lambda: mock_weather_response)
+        service = WeatherService()
+        service.fetch_weather((10.0, 20.0))
+
+        results = service.fetch_weather_batch([(10.0, 20.0), (30.0, 40.0), (30.0, 40.0)])
+
+        assert len(results) == 3
+        assert mock_get.call_count == 2
+        assert mock_get.call_args.kwargs['params']['latitude'] == "30.0"
+
+    @patch('app.services.weather_service.FORECAST_BATCH_SIZE', 2)
+    @patch('requests.Session.get')
+    def test_fetch_weather_batch_chunks(self, mock_get, mock_weather_response):
+        mock_get.side_effect = [
+            Mock(status_code=200, json=lambda: [mock_weather_response] * 2),
+            Mock(status_code=500),
+        ]
+
+        results = WeatherService().fetch_weather_batch([(10.0, 20.0), (30.0, 40.0), (50.0, 60.0)])
+
+        assert mock_get.call_count == 2
+        assert results[:2] == [mock_weather_response] * 2
+        assert results[2].error_type == WeatherErrorType.API_ERROR
+
+    @patch('requests.Session.get')
+    @patch('app.services.geo_service.fetch')
+    def test_get_weather_batch(self, mock_fetch, mock_get, mock_weather_response):
+        def geocode(url):
+            if "Nowhere" in url:
+                return {"results": []}
+            name = "Haifa" if "Haifa" in url else "Paris"
+            return {"results": [{"name": name, "country": "X", "latitude": 32.8 if name == "Haifa" else 48.9, "longitude": 1.0}]}
+        mock_fetch.side_effect = geocode
+        mock_get.return_value = Mock(status_code=200, json=lambda: [mock_weather_response] * 2)
+
+        results = get_weather_batch(["Haifa", "Nowhere", "Paris", "Haifa"])
+
+        assert [r["city"] for r in results] == ["Haifa", "Nowhere", "Paris", "Haifa"]
+        assert results[0]["data"]["name"] == "Haifa"
+        assert results[1]["error"]["type"] == "CITY_NOT_FOUND"
+        assert results[2]["data"]["name"] == "Paris"
+        assert results[3]["data"]["name"] == "Haifa"
+        assert mock_fetch.call_count == 3
+        assert mock_get.call_count == 1
+
 class TestGetWeather:
     @patch('app.services.weather_service.WeatherService.fetch_weather')
     @patch('app.services.geo_service.fetch')  # Mock the fetch function
@@ -116,6 +367,42 @@ class TestGetWeather:
         assert 'weather' in result
         assert len(result['weather']) == 1
 
+    @patch('requests.Session.get')
+    @patch('app.services.geo_service.fetch')
+    def test_get_weather_geocodes_once(self, mock_fetch, mock_get, mock_weather_response):
+        mock_fetch.return_value = {
+            "results": [{
+                "name": "Test City",
+                "country": "Test Country",
+                "latitude": 32.0,
+                "longitude": 34.0
+            }]
+        }
+        mock_get.return_value = Mock(status_code=200, json=lambda: mock_weather_response)
+
+        get_weather('Test City')
+
+        assert mock_fetch.call_count == 1
+        assert mock_get.call_count == 1
+
+    @patch('requests.Session.get')
+    @patch('app.services.geo_service.fetch')
+    def test_get_weather_reuses_cached_forecast(self, mock_fetch, mock_get, mock_weather_response):
+        mock_fetch.return_value = {
+            "results": [{
+                "name": "Haifa",
+                "country": "Israel",
+                "latitude": 32.81841,
+                "longitude": 34.9885
+            }]
+        }
+        mock_get.return_value = Mock(status_code=200, json=lambda: mock_weather_response)
+
+        get_weather('Haifa')
+        get_weather('haifa ')
+
+        assert mock_get.call_count == 1
+
     def test_get_weather_empty_city(self):
         with pytest.raises(WeatherError) as exc_info:
             get_weather('')
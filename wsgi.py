@@ -1,4 +1,9 @@
 from main import app
+from app.services import prefetcher
+
+# Under gunicorn the app is preloaded in the master and gunicorn.conf.py
+# starts the prefetcher in each worker
 
 if __name__ == "__main__":
+    prefetcher.start()
     app.run()